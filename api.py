@@ -9,16 +9,33 @@ from datetime import datetime, timedelta
 import os
 import traceback
 from pydantic import BaseModel
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, FileResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 import uuid
 import random
-import re
 import time
+import hashlib
+import threading
+import compression
+import dashboard_builder
+import downsample
+import ingest
+import metrics
+import profiler
+import resumable
+import sniffer
+import upload_storage
+import watcher
+from run_processor import to_jsonable
+# 計測中のリクエストではワーカースレッドもプロファイルする（starlette のものと同じ使い方）
+from profiler import run_in_threadpool
 
 app = FastAPI(title="サウナ分析ダッシュボードAPI")
 
+# トークン付きリクエストのみオンデマンドでプロファイル（SAUNA_PROFILE_TOKEN未設定時は無効）
+app.add_middleware(profiler.ProfilingMiddleware, app_name="api")
+
 # グローバル例外ハンドラの設定
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
@@ -71,11 +88,104 @@ app.add_middleware(
     allow_headers=["*"],  # すべてのヘッダーを許可
 )
 
+# アップロードのリクエスト本文（展開後）のサイズ上限
+app.add_middleware(upload_storage.RequestSizeLimitMiddleware)
+
+# Content-Encoding: gzip / zstd で送られた本文を受信しながら展開
+app.add_middleware(compression.DecompressRequestMiddleware)
+
+# ルート別レイテンシと処理中リクエスト数を計測（最後に追加して最も外側に置き、
+# サイズ上限の 413 や未対応の圧縮形式の 415 で打ち切ったリクエストも数える）
+metrics.instrument_app(app, "api")
+
 # アップロードされたCSVファイルを保存するディレクトリ
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# 取り込み済みファイルの内容ハッシュ（upload_helper.py sync が再送を省くために参照する）
+UPLOAD_REGISTRY_PATH = os.path.join(UPLOAD_DIR, "fingerprints.json")
+_upload_registry_lock = threading.Lock()
+
+def file_fingerprint(fileobj, chunk_size: int = 1024 * 1024) -> str:
+    """ファイルオブジェクトの内容のSHA-256を返す（読み込み位置は先頭に戻す）"""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+def upload_fingerprint(file, chunk_size: int = 1024 * 1024) -> str:
+    """
+    アップロードされたCSVのSHA-256を返す
+
+    .csv.gz などの圧縮ファイルは展開後の内容で計算するため、圧縮して送っても
+    元のCSVと同じハッシュになる（upload_helper.py sync の取り込み済み判定と一致させる）。
+    """
+    file.file.seek(0)
+    stream, encoding = compression.open_decompressed(file.file, file.filename)
+    if encoding is None:
+        return file_fingerprint(file.file, chunk_size)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(chunk)
+    file.file.seek(0)
+    return digest.hexdigest()
+
+def load_upload_registry() -> Dict[str, Dict]:
+    try:
+        with open(UPLOAD_REGISTRY_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def clear_upload_registry() -> None:
+    """取り込み済みとして記録したハッシュをすべて消す"""
+    with _upload_registry_lock:
+        if os.path.exists(UPLOAD_REGISTRY_PATH):
+            os.remove(UPLOAD_REGISTRY_PATH)
+
+def record_upload_fingerprint(fingerprint: str, filename: str, data_type: str, size: int) -> None:
+    """取り込みに成功したファイルのハッシュを記録する"""
+    with _upload_registry_lock:
+        registry = load_upload_registry()
+        registry[fingerprint] = {
+            "filename": filename,
+            "data_type": data_type,
+            "size": size,
+            "uploaded_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        tmp_path = f"{UPLOAD_REGISTRY_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(registry, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, UPLOAD_REGISTRY_PATH)
+
+# 旧来の data_type 名 → 取り込みパイプラインの種類（ingest.PIPELINES のキー）
+UPLOAD_TYPE_ALIASES = {"occupancy": "frame"}
+
+# アップロードで取り込んだデータ（前処理済みのものを uploads/tables に保存し、起動時に読み戻す）
+INGEST_DIR = os.path.join(UPLOAD_DIR, "tables")
+ingest_store = ingest.IngestStore(persist_dir=INGEST_DIR)
+
+# データディレクトリのCSVから組み立てるダッシュボード（アップロードされたデータがない間に使う）。
+# 競合データは dashboard_data のものを使うため、ここでは読み込まない。
+# サーバーのスレッドから fork するとデッドロックしうるため、分析はプロセスに分けず直列に実行する
+dashboard_source = dashboard_builder.DashboardBuilder.from_env(competitors={}, processes=False)
+
+# 分割アップロードのチャンク置き場（uploads/sessions/<upload_id>/）
+upload_sessions = resumable.LocalUploadBackend(os.path.join(UPLOAD_DIR, "sessions"))
+
 # データモデル
+class FingerprintCheck(BaseModel):
+    fingerprints: List[str]
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    size: int
+    data_type: str = "auto"
+    chunk_size: int = resumable.DEFAULT_CHUNK_SIZE
+    sha256: Optional[str] = None
+
 class DashboardData(BaseModel):
     labels: Dict[str, List[str]]
     metrics: Dict[str, Any] = {}
@@ -326,9 +436,24 @@ def read_root():
     )
 
 @app.get("/api/dashboard")
-async def get_dashboard_data():
-    """ダッシュボードデータを取得するエンドポイント"""
+async def get_dashboard_data(reference_date: Optional[str] = None):
+    """
+    ダッシュボードデータを取得するエンドポイント
+
+    アップロードで取り込んだデータがない間は、データディレクトリのCSVから全分析を実行して
+    組み立てた値を返す（reference_date: 基準日 YYYY-MM-DD。データと基準日が同じ間はキャッシュを返す）。
+    """
     try:
+        with ingest_store.lock:
+            ingested = bool(ingest_store.results)
+        built = None
+        if not ingested:
+            try:
+                built = await run_in_threadpool(dashboard_source.build, reference_date)
+            except ValueError as e:
+                return JSONResponse(status_code=400, content={"status": "エラー", "detail": f"基準日の指定が不正です: {e}"},
+                                    headers={"Content-Type": "application/json"})
+
         # 直接辞書として返す
         data_dict = {
             "labels": dict(dashboard_data.labels),
@@ -338,6 +463,10 @@ async def get_dashboard_data():
             "competitors": dict(dashboard_data.competitors),
             "finance": dict(dashboard_data.finance)
         }
+        # ラベルの regions など分析結果にない項目は残し、セクション内をキー単位で上書きする
+        if built is not None:
+            for section, values in to_jsonable(built["dashboard"]).items():
+                data_dict[section] = {**data_dict.get(section, {}), **values}
         # nullや空の辞書を削除
         for key in list(data_dict.keys()):
             if data_dict[key] is None or data_dict[key] == {}:
@@ -355,6 +484,246 @@ async def get_dashboard_data():
             headers={"Content-Type": "application/json"}
         )
 
+@app.get("/api/snapshot")
+async def get_snapshot(request: Request, section: Optional[str] = None):
+    """ウォッチモード（run_processor.py watch）が公開した最新の分析スナップショットを返す"""
+    snapshot = watcher.load_published_snapshot()
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="スナップショットがありません。run_processor.py watch を実行してください")
+
+    # バージョンが変わっていなければ本文を返さない
+    etag = f'"{snapshot.get("version", 0)}-{section or "all"}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    content = snapshot
+    if section:
+        results = snapshot.get("results", {})
+        if section not in results:
+            raise HTTPException(status_code=404, detail=f"スナップショットにセクションがありません: {section}")
+        content = {"version": snapshot.get("version"), "generated_at": snapshot.get("generated_at"),
+                   "reference_date": snapshot.get("reference_date"), "section": section,
+                   "result": results[section]}
+
+    return JSONResponse(
+        content=content,
+        headers={"Content-Type": "application/json", "ETag": etag, "Cache-Control": "no-cache"}
+    )
+
+@app.get("/api/timeseries/{name}")
+async def get_timeseries(name: str, start: Optional[str] = None, end: Optional[str] = None,
+                         width: int = downsample.DEFAULT_WIDTH, method: str = downsample.DEFAULT_METHOD):
+    """
+    取り込み済みデータの長期間の時系列を、グラフの表示幅（ピクセル）に合わせて間引いて返す
+
+    アップロードで取り込んだデータがない間は /api/dashboard と同じく、データディレクトリのCSVから求める。
+    name: occupancy（枠ごとの稼働率） / occupancy_daily（日別稼働率） / sales_daily（日別売上）
+    method: lttb（形を保つ） / minmax（区間ごとの最小・最大を残す）
+    """
+    with ingest_store.lock:
+        ingested = bool(ingest_store.results)
+    try:
+        if ingested:
+            result = await run_in_threadpool(ingest_store.timeseries, name, start, end, width, method)
+        else:
+            ingest.check_timeseries(name, method)
+            result = await run_in_threadpool(dashboard_source.timeseries, name, start, end, width, method)
+    except ingest.IngestError as e:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": str(e)},
+                            headers={"Content-Type": "application/json"})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": f"期間の指定が不正です: {e}"},
+                            headers={"Content-Type": "application/json"})
+    if result is None:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": f"系列 {name} の元になるデータが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    return JSONResponse(content={"status": "成功", "name": name, **result},
+                        headers={"Content-Type": "application/json"})
+
+async def analysis_result(analysis: str):
+    """
+    分析結果とそのバージョンを返す
+
+    アップロードで取り込んだデータがない間は /api/dashboard と同じく、データディレクトリのCSVから
+    組み立てた結果を使う（バージョンはデータの指紋）。どちらにもない場合、結果は None。
+    """
+    with ingest_store.lock:
+        ingested = bool(ingest_store.results)
+        result = ingest_store.results.get(analysis)
+        version = ingest_store.versions[analysis]
+    if ingested:
+        return result, version
+    built = await run_in_threadpool(dashboard_source.build)
+    if built is None:
+        return None, version
+    return built["results"].get(analysis), built["fingerprint"]
+
+@app.get("/api/cohorts")
+async def get_cohorts(by: str = "trial"):
+    """
+    コホート別の会員継続率（トライアル受講月 by=trial / プラン契約月 by=contract）
+
+    会員データの取り込み時に再計算した結果（取り込みがない間はデータディレクトリから求めた結果）を返す。
+    retention[i][n] は cohorts[i] の n か月後の継続率（%）で、基準月より後のまだ観測できないセルは null。
+    """
+    if by not in ("trial", "contract"):
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": "by は trial か contract を指定してください"},
+                            headers={"Content-Type": "application/json"})
+    cohorts, version = await analysis_result("cohorts")
+    cohorts = cohorts or {}
+    if by not in cohorts:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": "会員データが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    return JSONResponse(
+        content={"status": "成功", "by": by, "version": version,
+                 "reference_month": cohorts.get("reference_month"), **cohorts[by]},
+        headers={"Content-Type": "application/json"}
+    )
+
+@app.get("/api/survival")
+async def get_survival(by: Optional[str] = None):
+    """
+    会員継続曲線（Kaplan-Meier）と月別の退会ハザード
+
+    by を省略すると全体と全内訳を返す。by=plan / gender / age で内訳を1つに絞る。
+    会員データの取り込み時（取り込みがない間はデータディレクトリの読み込み時）に計算済みの結果を返すため、
+    ここでは再計算しない。
+    """
+    breakdowns = {"plan": "by_plan", "gender": "by_gender", "age": "by_age"}
+    if by is not None and by not in breakdowns:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": "by は plan / gender / age のいずれかを指定してください"},
+                            headers={"Content-Type": "application/json"})
+    survival, version = await analysis_result("survival")
+    survival = survival or {}
+    if not survival:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": "契約期間のある会員データが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    content = {"status": "成功", "version": version, "reference_date": survival["reference_date"],
+               "overall": survival["overall"]}
+    for name, key in breakdowns.items():
+        if by in (None, name):
+            content[key] = survival.get(key, {})
+    return JSONResponse(content=content, headers={"Content-Type": "application/json"})
+
+@app.get("/api/conversion")
+async def get_conversion():
+    """体験 → 契約 → 初回支払いの転換ファネル（予約・会員・売上データの取り込み時、取り込みがない間はデータディレクトリから計算済み）"""
+    conversion, version = await analysis_result("conversion")
+    conversion = conversion or {}
+    if not conversion:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": "体験の予約データが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    return JSONResponse(content={"status": "成功", "version": version, **conversion},
+                        headers={"Content-Type": "application/json"})
+
+# /api/member-value/members で並べ替えに使える列
+MEMBER_VALUE_SORT_COLUMNS = ["ltv", "recency_days", "visits", "visits_per_month", "purchases", "average_spend"]
+
+@app.get("/api/member-value")
+async def get_member_value():
+    """会員のLTVとRFMセグメント別の人数・売上（売上・予約データの取り込み時、取り込みがない間はデータディレクトリから計算済み）"""
+    value, version = await analysis_result("member_value")
+    value = value or {}
+    if not value:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": "売上データが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    return JSONResponse(content={"status": "成功", "version": version, **to_jsonable(value)},
+                        headers={"Content-Type": "application/json"})
+
+@app.get("/api/member-value/members")
+async def get_member_value_members(segment: Optional[str] = None, sort: str = "ltv", descending: bool = True,
+                                   limit: int = 100, offset: int = 0):
+    """
+    会員ごとの特徴量（RFMスコア・LTV・来店頻度）をセグメントで絞り込んで返す
+
+    sort には MEMBER_VALUE_SORT_COLUMNS の列を指定する（recency_days は descending=false で直近順）。
+    """
+    if sort not in MEMBER_VALUE_SORT_COLUMNS:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": f"sort は {', '.join(MEMBER_VALUE_SORT_COLUMNS)} のいずれかを指定してください"},
+                            headers={"Content-Type": "application/json"})
+    limit = min(max(limit, 1), 1000)
+    offset = max(offset, 0)
+    with ingest_store.lock:
+        # 再計算時はテーブルごと置き換わるため、参照を取り出せばロックの外で読んでよい
+        ingested = bool(ingest_store.results)
+        features = ingest_store.processor.member_features
+        version = ingest_store.versions["member_value"]
+    if not ingested:
+        built = await run_in_threadpool(dashboard_source.build)
+        if built is not None:
+            features, version = built["processor"].member_features, built["fingerprint"]
+    if features is None:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": "売上データが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    if segment is not None:
+        if segment not in features["segment"].cat.categories:
+            return JSONResponse(status_code=400, content={"status": "エラー", "detail": f"不明なセグメントです: {segment}（{', '.join(features['segment'].cat.categories)}）"},
+                                headers={"Content-Type": "application/json"})
+        features = features[features["segment"] == segment]
+
+    page = features.sort_values(sort, ascending=not descending).iloc[offset:offset + limit].reset_index()
+    # float32 のまま出すと桁が余計に付くため、float64 にしてから丸める
+    float_cols = page.select_dtypes("float").columns
+    page[float_cols] = page[float_cols].astype("float64").round(2)
+    members = [{k: to_jsonable(v) for k, v in row.items()} for row in page.astype({"segment": str, "rfm_score": str}).to_dict("records")]
+    return JSONResponse(
+        content={"status": "成功", "version": version, "segment": segment, "total": len(features),
+                 "offset": offset, "members": members},
+        headers={"Content-Type": "application/json"}
+    )
+
+MEMBER_STATUS_SERIES_MAX_DATES = 1000
+
+def built_member_status_series(points: List[str]) -> Optional[Dict]:
+    """データディレクトリから組み立てた会員データでの基準日ごとの会員数（バージョンはデータの指紋）"""
+    built = dashboard_source.build()
+    if built is None or built["processor"].member_data is None:
+        return None
+    try:
+        series = dashboard_builder.member_status_series(built["processor"], points)
+    except (ValueError, TypeError) as e:
+        raise ingest.IngestError(f"基準日を日付として解釈できません: {e}")
+    return {"version": built["fingerprint"], "series": series}
+
+@app.get("/api/member-status/series")
+async def get_member_status_series(dates: Optional[str] = None, start: Optional[str] = None, end: Optional[str] = None):
+    """
+    複数の基準日での会員数（active / trial / former / visitor）をまとめて返す
+
+    dates にカンマ区切りの日付（YYYY-MM-DD）を渡すか、start / end（YYYY-MM）で各月末を指定する。
+    全基準日を1回の計算で求めるため、36か月分でも1か月分とほぼ同じ時間で返る。
+    """
+    try:
+        if dates:
+            points = [d.strip() for d in dates.split(",") if d.strip()]
+        elif start and end:
+            points = pd.period_range(start, end, freq="M").end_time.normalize().strftime("%Y-%m-%d").tolist()
+        else:
+            return JSONResponse(status_code=400, content={"status": "エラー", "detail": "dates または start と end を指定してください"},
+                                headers={"Content-Type": "application/json"})
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": f"期間の指定が不正です: {e}"},
+                            headers={"Content-Type": "application/json"})
+    if len(points) > MEMBER_STATUS_SERIES_MAX_DATES:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": f"基準日は{MEMBER_STATUS_SERIES_MAX_DATES}件までです"},
+                            headers={"Content-Type": "application/json"})
+
+    with ingest_store.lock:
+        ingested = bool(ingest_store.results)
+    try:
+        if ingested:
+            result = await run_in_threadpool(ingest_store.member_status_series, points)
+        else:
+            # 取り込みがない間は /api/dashboard と同じく、データディレクトリのCSVから読み込んだ会員データで求める
+            result = await run_in_threadpool(built_member_status_series, points)
+    except ingest.IngestError as e:
+        return JSONResponse(status_code=400, content={"status": "エラー", "detail": str(e)},
+                            headers={"Content-Type": "application/json"})
+    if result is None:
+        return JSONResponse(status_code=404, content={"status": "エラー", "detail": "会員データが取り込まれていません"},
+                            headers={"Content-Type": "application/json"})
+    return JSONResponse(content={"status": "成功", **result}, headers={"Content-Type": "application/json"})
+
 @app.put("/api/upload-csv")
 async def upload_csv_put(file: UploadFile = File(...), data_type: str = Form(default="auto")):
     """CSVファイルをアップロードして処理する (PUTメソッド)"""
@@ -597,6 +966,180 @@ async def upload_csv_options():
         headers=headers
     )
 
+# 取り込み済みファイルの確認
+@app.post("/api/uploads/check")
+async def check_uploads(request: FingerprintCheck):
+    """送られたSHA-256のうち、取り込み済みのものを返す"""
+    registry = load_upload_registry()
+    known = [fp for fp in request.fingerprints if fp in registry]
+    return JSONResponse(
+        content={"status": "成功", "known": known, "total": len(request.fingerprints)},
+        headers={"Content-Type": "application/json"}
+    )
+
+# アップロード前の確認（見出しと数行だけを読むためファイルサイズに関係なく一定時間）
+@app.post("/api/upload-preview")
+async def upload_preview(file: UploadFile = File(...)):
+    """CSVの種類・列名・先頭数行を返す"""
+    try:
+        preview = sniffer.sniff(file.file, file.filename)
+    except (OSError, EOFError, ValueError) as e:
+        return JSONResponse(
+            status_code=400,
+            content={"status": "エラー", "detail": f"ファイルを読み込めません: {str(e)}"},
+            headers={"Content-Type": "application/json"}
+        )
+    preview["supported"] = preview["data_type"] in ingest.PIPELINES
+    return JSONResponse(
+        content={"status": "成功", "filename": file.filename, **preview},
+        headers={"Content-Type": "application/json"}
+    )
+
+# 再開可能な分割アップロード（手順は resumable.py を参照）
+def upload_session_error(e: resumable.UploadSessionError) -> JSONResponse:
+    return JSONResponse(
+        status_code=e.status_code,
+        content={"status": "エラー", "detail": e.detail},
+        headers={"Content-Type": "application/json"}
+    )
+
+def upload_session_status(upload_id: str) -> Dict[str, Any]:
+    """クライアントに返すセッションの状態（受信済みチャンクと再開位置）"""
+    status = upload_sessions.status(upload_id)
+    return {
+        "upload_id": upload_id,
+        "filename": status["filename"],
+        "data_type": status["data_type"],
+        "size": status["size"],
+        "chunk_size": status["chunk_size"],
+        "total_chunks": status["total_chunks"],
+        "received": status["received"],
+        "missing": status["missing"],
+        "received_bytes": status["received_bytes"],
+        "offset": status["offset"],
+        "complete": status["complete"],
+    }
+
+@app.post("/api/uploads")
+async def create_upload_session(request: UploadSessionCreate):
+    """分割アップロードのセッションを作成する"""
+    if request.size > upload_storage.MAX_FILE_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"status": "エラー", "detail": str(upload_storage.UploadTooLarge(upload_storage.MAX_FILE_BYTES))},
+            headers={"Content-Type": "application/json"}
+        )
+    try:
+        session = await run_in_threadpool(
+            upload_sessions.create, request.filename, request.size,
+            request.data_type, request.chunk_size, request.sha256
+        )
+        status = await run_in_threadpool(upload_session_status, session["upload_id"])
+    except resumable.UploadSessionError as e:
+        return upload_session_error(e)
+    print(f"分割アップロード開始: upload_id={session['upload_id']}, file={session['filename']}, "
+          f"size={session['size']}, chunks={session['total_chunks']}")
+    return JSONResponse(
+        status_code=201,
+        content={"status": "成功", **status},
+        headers={"Content-Type": "application/json"}
+    )
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload_session(upload_id: str):
+    """受信済みのチャンクを返す（再開時はここで未受信のチャンクを確認する）"""
+    try:
+        status = await run_in_threadpool(upload_session_status, upload_id)
+    except resumable.UploadSessionError as e:
+        return upload_session_error(e)
+    return JSONResponse(
+        content={"status": "成功", **status},
+        headers={"Content-Type": "application/json", "Cache-Control": "no-cache"}
+    )
+
+@app.put("/api/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(upload_id: str, index: int, request: Request):
+    """
+    チャンクを1つ受け取る（本文はチャンクのバイト列そのまま）
+
+    受信しながら一時ファイルに書き、サイズが一致したときだけ確定するため、
+    途中で切れたチャンクは未受信のまま残り、同じ番号で送り直せばよい。
+    """
+    try:
+        session = await run_in_threadpool(upload_sessions.load, upload_id)
+        expected = upload_sessions.expected_chunk_size(session, index)
+        out, tmp_path = await run_in_threadpool(upload_sessions.open_chunk, upload_id, index)
+    except resumable.UploadSessionError as e:
+        return upload_session_error(e)
+
+    size = 0
+    try:
+        async for block in request.stream():
+            size += len(block)
+            if size > expected:
+                raise resumable.UploadSessionError(
+                    f"チャンク{index}のサイズが上限（{expected} バイト）を超えています", 413)
+            await run_in_threadpool(out.write, block)
+        out.close()
+        await run_in_threadpool(upload_sessions.commit_chunk, session, index, tmp_path, size)
+        status = await run_in_threadpool(upload_session_status, upload_id)
+    except resumable.UploadSessionError as e:
+        return upload_session_error(e)
+    finally:
+        out.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return JSONResponse(
+        content={"status": "成功", "index": index, "size": size, **status},
+        headers={"Content-Type": "application/json"}
+    )
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload_session(upload_id: str, data_type: Optional[str] = None):
+    """
+    チャンクを結合し、通常のアップロードと同じ取り込み処理を行う
+
+    data_type を指定するとセッション作成時の指定より優先する（判定に失敗したときの再試行用）。
+    """
+    try:
+        session = await run_in_threadpool(upload_sessions.load, upload_id)
+        assembled = await run_in_threadpool(upload_sessions.assemble, upload_id, UPLOAD_DIR)
+    except resumable.UploadSessionError as e:
+        return upload_session_error(e)
+
+    print(f"分割アップロード結合完了: upload_id={upload_id}, file={session['filename']}, size={assembled['size']}")
+    try:
+        with open(assembled["path"], "rb") as f:
+            upload = UploadFile(file=f, filename=session["filename"], size=assembled["size"])
+            result = await process_uploaded_csv(upload, data_type or session["data_type"])
+    finally:
+        os.remove(assembled["path"])
+
+    if isinstance(result, dict) and result.get("status") == "成功":
+        # 取り込めなかった場合はチャンクを残し、data_type を指定して complete だけやり直せるようにする
+        await run_in_threadpool(upload_sessions.delete, upload_id)
+        result["upload_id"] = upload_id
+        result["sha256"] = assembled["sha256"]
+    return JSONResponse(
+        status_code=200 if result.get("status") == "成功" else 422,
+        content=result,
+        headers={"Content-Type": "application/json"}
+    )
+
+@app.delete("/api/uploads/{upload_id}")
+async def delete_upload_session(upload_id: str):
+    """分割アップロードを中止し、受信済みのチャンクを削除する"""
+    try:
+        await run_in_threadpool(upload_sessions.load, upload_id)
+    except resumable.UploadSessionError as e:
+        return upload_session_error(e)
+    await run_in_threadpool(upload_sessions.delete, upload_id)
+    return JSONResponse(
+        content={"status": "成功", "upload_id": upload_id},
+        headers={"Content-Type": "application/json"}
+    )
+
 # テスト用エンドポイント（アップロードが動作しない場合に使用）
 @app.get("/api/test-upload")
 async def test_upload():
@@ -610,300 +1153,68 @@ async def test_upload():
 
 async def process_uploaded_csv(file, data_type):
     """
-    CSVファイルを処理してデータを変換し、保存します
+    CSVファイルを処理し、成功した場合は内容のハッシュを取り込み済みとして記録します
     """
-    global dashboard_data
-
     try:
-        # CSVファイルを読み込む
-        print(f"CSVファイル読み込み開始: file={file.filename}")
-        df = pd.read_csv(file.file, encoding='utf-8')
-        print(f"CSVファイル読み込み成功: エンコーディング=utf-8")
-
-        # カラム名を確認して出力
-        print("CSVカラム:", df.columns.tolist())
-        print("データサンプル:", df.head(3).to_dict('records'))
-
-        # データタイプによって処理を分岐
-        if data_type == "occupancy":
-            # オリジナルのカラムを保存
-            original_columns = df.columns.tolist()
-            print("元のCSVカラム:", original_columns)
-            print("入力ファイル情報:")
-            print(f"- カラム数: {len(df.columns)}")
-            print(f"- 行数: {len(df)}")
-            print(f"- データ型: {df.dtypes}")
-
-            # レッスン予約形式を検出
-            if any(col in original_columns for col in ["ルームコード", "ルーム名"]):
-                print("レッスン予約フォーマットを検出しました")
-                print("レッスンデータフォーマットを処理します")
-
-                # 必要なカラムがあるか確認
-                date_col = None
-                for col_name in ["レッスン日", "日付", "date"]:
-                    if col_name in original_columns:
-                        date_col = col_name
-                        break
-
-                if date_col is None:
-                    print("日付カラムが見つかりません")
-                    return {
-                        "status": "エラー",
-                        "detail": "CSVファイルに日付を示すカラムが見つかりません"
-                    }
-
-                # ルーム名カラムを確認
-                room_col = None
-                for col_name in ["ルーム名", "ルームコード"]:
-                    if col_name in original_columns:
-                        room_col = col_name
-                        break
-
-                if room_col is None:
-                    print("ルーム名カラムが見つかりません")
-                    return {
-                        "status": "エラー",
-                        "detail": "CSVファイルにルーム名を示すカラムが見つかりません"
-                    }
-
-                # 予約カラムを確認
-                reservation_cols = []
-                for col_name in ["総予約数", "無断キャンセル数", "スペース数"]:
-                    if col_name in original_columns:
-                        reservation_cols.append(col_name)
-
-                if not reservation_cols:
-                    print("予約情報カラムが見つかりません")
-                    return {
-                        "status": "エラー",
-                        "detail": "CSVファイルに予約情報を示すカラムが見つかりません"
-                    }
-
-                # 日付カラムを変換
-                print(f"検出したカラム - 日付: {date_col}, ルーム: {room_col}, 予約数: {reservation_cols}")
-                df[date_col] = pd.to_datetime(df[date_col])
-                df = df.rename(columns={date_col: "date"})
-
-                # ルームごとに予約数と稼働率を集計
-                room_summary = df.groupby(room_col).agg(
-                    lesson_count=pd.NamedAgg(column="date", aggfunc="count")
-                )
-
-                # 稼働率カラムがある場合
-                occupancy_col = None
-                for col_name in ["稼働率", "occupancy"]:
-                    if col_name in original_columns:
-                        occupancy_col = col_name
-                        break
-
-                if occupancy_col:
-                    print(f"稼働率カラム検出: {occupancy_col}")
-                    print(f"稼働率データサンプル: {df[occupancy_col].head(10).tolist()}")
-
-                    # 稼働率を数値に変換（例：'85%' → 85.0）
-                    # 複数の値が結合されている場合に備えて、最初の数値部分のみを抽出
-                    df[occupancy_col] = df[occupancy_col].apply(
-                        lambda x: float(re.match(r'(\d+)', str(x)).group(1)) if pd.notnull(x) and re.match(r'(\d+)', str(x)) else None
-                    )
-                    print(f"変換後の稼働率データサンプル: {df[occupancy_col].head(10).tolist()}")
-
-                    # ルームごとの平均稼働率を計算
-                    room_summary["avg_occupancy"] = df.groupby(room_col)[occupancy_col].mean()
-                    print(f"ルームごとの平均稼働率: {room_summary['avg_occupancy'].to_dict()}")
-
-                    # 稼働率データフレームを作成
-                    occupancy_df = df[[room_col, "date", occupancy_col]].copy()
-                    print(f"稼働率データフレーム作成 - 行数: {len(occupancy_df)}, 欠損値: {occupancy_df.isna().sum().to_dict()}")
-                    occupancy_df = occupancy_df.rename(columns={room_col: "room", occupancy_col: "occupancy"})
-
-                    # タイムスタンプを含むファイル名で保存
-                    timestamp = int(time.time())
-                    output_file = f"uploads/occupancy_{timestamp}.csv"
-                    occupancy_df.to_csv(output_file, index=False)
-                    print(f"稼働率データを保存しました: {output_file}")
-
-                    # 詳細データを保存
-                    details_file = f"uploads/occupancy_details_{timestamp}.csv"
-                    df.to_csv(details_file, index=False)
-                    print(f"詳細データを保存しました: {details_file}")
-
-                    # ルームごとの詳細情報を取得
-                    room_details = {}
-                    for room in occupancy_df["room"].unique():
-                        room_data = occupancy_df[occupancy_df["room"] == room]
-                        room_occupancy = room_data["occupancy"].dropna().tolist()
-                        if room_occupancy:
-                            avg_occ = sum(room_occupancy) / len(room_occupancy)
-                            min_occ = min(room_occupancy)
-                            max_occ = max(room_occupancy)
-                            room_details[room] = {
-                                "avg": avg_occ,
-                                "min": min_occ,
-                                "max": max_occ
-                            }
-                            print(f"ルーム {room} の稼働率情報: 平均={avg_occ:.1f}%, 最小={min_occ:.1f}%, 最大={max_occ:.1f}%")
-
-                    # 日付範囲を取得
-                    min_date = df["date"].min().strftime("%Y-%m-%d")
-                    max_date = df["date"].max().strftime("%Y-%m-%d")
-                    print(f"データ期間: {min_date} から {max_date} まで")
-
-                    # dashboard_dataを更新する
-                    print("ダッシュボードデータの更新を開始します")
-                    update_dashboard_with_occupancy_data(occupancy_df)
-                    print("ダッシュボードデータの更新が完了しました")
-
-                    return {
-                        "status": "成功",
-                        "file": output_file,
-                        "details_file": details_file,
-                        "total_lessons": len(df),
-                        "date_range": {
-                            "from": min_date,
-                            "to": max_date
-                        },
-                        "room_occupancy": room_details
-                    }
-
-                # 稼働率カラムがない場合はスペース数と予約数から計算
-                else:
-                    print("稼働率カラムがないため、スペース数と予約数から計算します")
-                    if "総予約数" in original_columns and "スペース数" in original_columns:
-                        # スペース数が0の場合に0除算を防ぐ
-                        df["稼働率"] = df.apply(
-                            lambda row: (row["総予約数"] / row["スペース数"]) * 100 if row["スペース数"] > 0 else 0,
-                            axis=1
-                        )
-                        print(f"計算された稼働率データサンプル: {df['稼働率'].head(10).tolist()}")
-
-                        # ルームごとの平均稼働率を計算
-                        room_summary["avg_occupancy"] = df.groupby(room_col)["稼働率"].mean()
-                        print(f"ルームごとの平均稼働率: {room_summary['avg_occupancy'].to_dict()}")
-
-                        # 稼働率データフレームを作成
-                        occupancy_df = df[[room_col, "date", "稼働率"]].copy()
-                        print(f"稼働率データフレーム作成 - 行数: {len(occupancy_df)}, 欠損値: {occupancy_df.isna().sum().to_dict()}")
-                        occupancy_df = occupancy_df.rename(columns={room_col: "room", "稼働率": "occupancy"})
-
-                        # タイムスタンプを含むファイル名で保存
-                        timestamp = int(time.time())
-                        output_file = f"uploads/occupancy_{timestamp}.csv"
-                        occupancy_df.to_csv(output_file, index=False)
-                        print(f"稼働率データを保存しました: {output_file}")
-
-                        # 詳細データを保存
-                        details_file = f"uploads/occupancy_details_{timestamp}.csv"
-                        df.to_csv(details_file, index=False)
-                        print(f"詳細データを保存しました: {details_file}")
-
-                        # ルームごとの詳細情報を取得
-                        room_details = {}
-                        for room in occupancy_df["room"].unique():
-                            room_data = occupancy_df[occupancy_df["room"] == room]
-                            room_occupancy = room_data["occupancy"].dropna().tolist()
-                            if room_occupancy:
-                                avg_occ = sum(room_occupancy) / len(room_occupancy)
-                                min_occ = min(room_occupancy)
-                                max_occ = max(room_occupancy)
-                                room_details[room] = {
-                                    "avg": avg_occ,
-                                    "min": min_occ,
-                                    "max": max_occ
-                                }
-                                print(f"ルーム {room} の稼働率情報: 平均={avg_occ:.1f}%, 最小={min_occ:.1f}%, 最大={max_occ:.1f}%")
-
-                        # 日付範囲を取得
-                        min_date = df["date"].min().strftime("%Y-%m-%d")
-                        max_date = df["date"].max().strftime("%Y-%m-%d")
-                        print(f"データ期間: {min_date} から {max_date} まで")
-
-                        # dashboard_dataを更新する
-                        print("ダッシュボードデータの更新を開始します")
-                        update_dashboard_with_occupancy_data(occupancy_df)
-                        print("ダッシュボードデータの更新が完了しました")
-
-                        return {
-                            "status": "成功",
-                            "file": output_file,
-                            "details_file": details_file,
-                            "total_lessons": len(df),
-                            "date_range": {
-                                "from": min_date,
-                                "to": max_date
-                            },
-                            "room_occupancy": room_details
-                        }
-
-            # シンプルなフォーマット（日付、ルーム名、稼働率のみ）
-            elif all(col in original_columns for col in ["date", "room", "occupancy"]):
-                print("シンプルフォーマットを検出しました")
-
-                # 日付カラムを変換
-                df["date"] = pd.to_datetime(df["date"])
-                print("日付カラムを変換しました")
-
-                # 稼働率を数値に変換（例：'85%' → 85.0）
-                print(f"稼働率データサンプル: {df['occupancy'].head(10).tolist()}")
-                df["occupancy"] = df["occupancy"].apply(
-                    lambda x: float(re.match(r'(\d+)', str(x)).group(1)) if pd.notnull(x) and re.match(r'(\d+)', str(x)) else None
-                )
-                print(f"変換後の稼働率データサンプル: {df['occupancy'].head(10).tolist()}")
-
-                # タイムスタンプを含むファイル名で保存
-                timestamp = int(time.time())
-                output_file = f"uploads/occupancy_{timestamp}.csv"
-                df.to_csv(output_file, index=False)
-                print(f"稼働率データを保存しました: {output_file}")
-
-                # ルームごとの詳細情報を取得
-                room_details = {}
-                for room in df["room"].unique():
-                    room_data = df[df["room"] == room]
-                    room_occupancy = room_data["occupancy"].dropna().tolist()
-                    if room_occupancy:
-                        avg_occ = sum(room_occupancy) / len(room_occupancy)
-                        min_occ = min(room_occupancy)
-                        max_occ = max(room_occupancy)
-                        room_details[room] = {
-                            "avg": avg_occ,
-                            "min": min_occ,
-                            "max": max_occ
-                        }
-                        print(f"ルーム {room} の稼働率情報: 平均={avg_occ:.1f}%, 最小={min_occ:.1f}%, 最大={max_occ:.1f}%")
-
-                # 日付範囲を取得
-                min_date = df["date"].min().strftime("%Y-%m-%d")
-                max_date = df["date"].max().strftime("%Y-%m-%d")
-                print(f"データ期間: {min_date} から {max_date} まで")
-
-                # dashboard_dataを更新する
-                print("ダッシュボードデータの更新を開始します")
-                update_dashboard_with_occupancy_data(df)
-                print("ダッシュボードデータの更新が完了しました")
-
-                return {
-                    "status": "成功",
-                    "file": output_file,
-                    "total_lessons": len(df),
-                    "date_range": {
-                        "from": min_date,
-                        "to": max_date
-                    },
-                    "room_occupancy": room_details
-                }
+        fingerprint = await run_in_threadpool(upload_fingerprint, file)
+    except (OSError, EOFError, ValueError) as e:
+        print(f"圧縮ファイルの展開エラー: file={file.filename}, エラー: {str(e)}")
+        return {"status": "エラー", "detail": f"圧縮ファイルを展開できません: {str(e)}"}
+
+    # 見出しと数行だけを読んで種類を判定し、取り込み処理を振り分ける
+    preview = await run_in_threadpool(sniffer.sniff, file.file, file.filename)
+    if not data_type or data_type == "auto":
+        if preview["data_type"] is None:
+            print(f"データ種別を判定できません: file={file.filename}, 不足カラム={preview['missing_columns']}")
+            return {
+                "status": "エラー",
+                "detail": "CSVの見出しからデータの種類を判定できませんでした",
+                "closest": preview["closest"],
+                "missing_columns": preview["missing_columns"],
+            }
+        data_type = preview["data_type"]
+        print(f"データ種別を自動判定しました: {data_type}")
+    data_type = UPLOAD_TYPE_ALIASES.get(data_type, data_type)
 
-            # フォーマットが認識できない場合
-            else:
-                print("認識できないCSVフォーマットです")
-                return {
-                    "status": "エラー",
-                    "detail": "CSVフォーマットが認識できません。正しいフォーマットで再アップロードしてください。"
-                }
+    if data_type not in ingest.PIPELINES:
+        return {
+            "status": "エラー",
+            "detail": f"未対応のデータ種別です: {data_type}（対応: auto, {', '.join(ingest.PIPELINES)}）",
+            "detected_type": preview["data_type"],
+        }
+
+    result = await _process_uploaded_csv(file, data_type, sniffer.read_encoding(preview))
+    if isinstance(result, dict) and result.get("status") == "成功":
+        result["detected_type"] = preview["data_type"]
+        file.file.seek(0, os.SEEK_END)
+        record_upload_fingerprint(fingerprint, file.filename, data_type, file.file.tell())
+        file.file.seek(0)
+        result["fingerprint"] = fingerprint
+    return result
 
-        # その他のデータタイプの処理
-        # ...
+async def _process_uploaded_csv(file, data_type, csv_encoding="utf-8"):
+    """
+    CSVファイルを種類別の取り込みパイプラインで処理し、影響するダッシュボードのセクションを更新します
 
+    csv_encoding は見出しから判定した文字コード（cp932 のエクスポートもそのまま読む）
+    """
+    try:
+        # アップロードサイズを取得
+        file.file.seek(0, os.SEEK_END)
+        upload_size = file.file.tell()
+        file.file.seek(0)
+
+        # .csv.gz などは展開しながらそのままパーサーに渡す（読み込みは1回だけ）
+        print(f"CSVファイル取り込み開始: file={file.filename}, data_type={data_type}")
+        stream, encoding = compression.open_decompressed(file.file, file.filename)
+        # 解析・再計算・保存には数秒かかるため、イベントループを止めないようスレッドで実行する
+        outcome = await run_in_threadpool(
+            ingest_store.ingest, stream, data_type, compression.strip_compression_suffix(file.filename or ""),
+            upload_size, competitors=dashboard_data.competitors, encoding=csv_encoding
+        )
+    except ingest.IngestError as e:
+        print(f"取り込みエラー: {str(e)}")
+        return {"status": "エラー", "detail": str(e)}
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
         traceback.print_exc()
@@ -912,145 +1223,33 @@ async def process_uploaded_csv(file, data_type):
             "detail": f"CSVファイルの処理中にエラーが発生しました: {str(e)}"
         }
 
-def update_dashboard_with_occupancy_data(occupancy_df):
+    update_dashboard_sections(outcome["dashboard"], outcome["sections"])
+    print(f"取り込み完了: partitions={outcome['partitions']}, 再計算={outcome['analyses']}, "
+          f"更新セクション={outcome['sections']}, 所要時間={outcome['timings']}")
+
+    return {
+        "status": "成功",
+        "data_type": outcome["data_type"],
+        "compression": encoding,
+        "partitions": outcome["partitions"],
+        "files": outcome["files"],
+        **outcome["summary"],
+        "analyses": outcome["analyses"],
+        "sections": outcome["sections"],
+        "timings": outcome["timings"],
+    }
+
+def update_dashboard_sections(built: Dict[str, Any], sections: List[str]) -> None:
     """
-    アップロードされた稼働率データをdashboard_dataに反映させる
+    dashboard_builder で組み立てたデータのうち、指定されたセクションだけを dashboard_data に反映する
 
-    Parameters:
-    -----------
-    occupancy_df : pandas.DataFrame
-        date, room, occupancyのカラムを持つDataFrame
+    セクション内は上書きではなくキー単位で更新するため、labels の regions など
+    分析結果にない項目はそのまま残る。
     """
     global dashboard_data
-
-    try:
-        # DataFrameが空の場合は処理しない
-        if occupancy_df.empty:
-            print("稼働率データが空のため、ダッシュボードの更新をスキップします")
-            return
-
-        print(f"ダッシュボード更新開始: データ行数={len(occupancy_df)}")
-        print(f"入力データサンプル: {occupancy_df.head(3).to_dict('records')}")
-
-        # dashboard_data.utilizationが初期化されていない場合は初期化
-        if not hasattr(dashboard_data, 'utilization') or dashboard_data.utilization is None:
-            dashboard_data.utilization = {}
-            print("utilization辞書を初期化しました")
-
-        # 必要なフィールドの初期化
-        if 'monthly' not in dashboard_data.utilization:
-            dashboard_data.utilization['monthly'] = {}
-            print("monthly辞書を初期化しました")
-
-        if 'weekly' not in dashboard_data.utilization:
-            dashboard_data.utilization['weekly'] = {}
-            print("weekly辞書を初期化しました")
-
-        if 'rooms' not in dashboard_data.utilization:
-            dashboard_data.utilization['rooms'] = {}
-            print("rooms辞書を初期化しました")
-
-        # 日付をdatetime形式に変換
-        if len(occupancy_df) > 0:
-            first_date = occupancy_df['date'].iloc[0]
-            print(f"最初の日付値: {first_date}, タイプ: {type(first_date)}")
-
-            if isinstance(first_date, str):
-                occupancy_df['date'] = pd.to_datetime(occupancy_df['date'])
-                print("日付列を日時形式に変換しました")
-
-        # NaN値を確認
-        nan_count = occupancy_df['occupancy'].isna().sum()
-        print(f"稼働率のNaN値の数: {nan_count}")
-
-        # NaN値を除外
-        occupancy_df = occupancy_df.dropna(subset=['occupancy'])
-        print(f"NaN値を除外後のデータ行数: {len(occupancy_df)}")
-
-        # 月別の稼働率を計算
-        try:
-            occupancy_df['year_month'] = occupancy_df['date'].dt.strftime('%Y-%m')
-            monthly_occupancy = occupancy_df.groupby(['year_month', 'room'])['occupancy'].mean().reset_index()
-            print(f"月別稼働率計算結果: {len(monthly_occupancy)}行")
-            print(f"月別稼働率サンプル: {monthly_occupancy.head(3).to_dict('records')}")
-
-            for _, row in monthly_occupancy.iterrows():
-                year_month = row['year_month']
-                room = row['room']
-                occupancy = row['occupancy']
-
-                if year_month not in dashboard_data.utilization['monthly']:
-                    dashboard_data.utilization['monthly'][year_month] = {}
-
-                dashboard_data.utilization['monthly'][year_month][room] = occupancy
-
-            print(f"月別稼働率更新完了: {len(dashboard_data.utilization['monthly'])}月分")
-        except Exception as e:
-            print(f"月別稼働率計算中にエラー: {str(e)}")
-            traceback.print_exc()
-
-        # 曜日別の稼働率を計算
-        try:
-            occupancy_df['day_of_week'] = occupancy_df['date'].dt.dayofweek  # 0=月曜, 6=日曜
-            weekly_occupancy = occupancy_df.groupby(['day_of_week', 'room'])['occupancy'].mean().reset_index()
-            print(f"曜日別稼働率計算結果: {len(weekly_occupancy)}行")
-
-            day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-
-            for _, row in weekly_occupancy.iterrows():
-                day_idx = int(row['day_of_week'])
-                day_name = day_names[day_idx]
-                room = row['room']
-                occupancy = row['occupancy']
-
-                if day_name not in dashboard_data.utilization['weekly']:
-                    dashboard_data.utilization['weekly'][day_name] = {}
-
-                dashboard_data.utilization['weekly'][day_name][room] = occupancy
-
-            print(f"曜日別稼働率更新完了: {len(dashboard_data.utilization['weekly'])}曜日分")
-        except Exception as e:
-            print(f"曜日別稼働率計算中にエラー: {str(e)}")
-            traceback.print_exc()
-
-        # ルームごとの平均稼働率を計算
-        try:
-            room_occupancy = occupancy_df.groupby('room')['occupancy'].mean()
-            print(f"ルームごとの稼働率: {room_occupancy.to_dict()}")
-
-            for room, occupancy in room_occupancy.items():
-                dashboard_data.utilization['rooms'][room] = {
-                    'average': occupancy,
-                    'label': room
-                }
-
-            print(f"ルーム別稼働率更新完了: {len(dashboard_data.utilization['rooms'])}ルーム")
-        except Exception as e:
-            print(f"ルーム別稼働率計算中にエラー: {str(e)}")
-            traceback.print_exc()
-
-        # 全体平均の稼働率も計算
-        try:
-            overall_avg = occupancy_df['occupancy'].mean()
-            dashboard_data.utilization['overall_average'] = overall_avg
-            print(f"全体平均稼働率: {overall_avg:.2f}%")
-        except Exception as e:
-            print(f"全体平均計算中にエラー: {str(e)}")
-            traceback.print_exc()
-
-        # ダッシュボードデータの一部を表示して確認
-        try:
-            print("更新されたダッシュボードデータのサンプル:")
-            print(f"- ルーム数: {len(dashboard_data.utilization['rooms'])}")
-            print(f"- 月数: {len(dashboard_data.utilization['monthly'])}")
-            print(f"- 曜日数: {len(dashboard_data.utilization['weekly'])}")
-            print(f"- 全体平均: {dashboard_data.utilization.get('overall_average', 'N/A')}")
-        except Exception as e:
-            print(f"ダッシュボードデータ表示中にエラー: {str(e)}")
-
-    except Exception as e:
-        print(f"ダッシュボードデータの更新中にエラーが発生しました: {str(e)}")
-        traceback.print_exc()
+    for section in sections:
+        getattr(dashboard_data, section).update(to_jsonable(built.get(section, {})))
+    metrics.bump_snapshot_version()
 
 # ヘルスチェック
 @app.get("/health")
@@ -1060,6 +1259,27 @@ async def health_check():
         headers={"Content-Type": "application/json"}
     )
 
+# Prometheus形式のメトリクス
+@app.get("/metrics")
+async def get_metrics():
+    """ルート別レイテンシ・取り込み量・メモリ使用量などのメトリクスを返す"""
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+# 保存済みプロファイルの取得
+@app.get("/api/profiles/{name}")
+async def get_profile(name: str, request: Request):
+    """プロファイル結果（.folded / .json）を返す。プロファイル用トークンが必要"""
+    token = request.headers.get(profiler.PROFILE_HEADER) or request.query_params.get(profiler.PROFILE_QUERY)
+    if not profiler.is_valid_token(token):
+        raise HTTPException(status_code=403, detail="プロファイルの取得にはトークンが必要です")
+
+    path = profiler.resolve_profile_file(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"プロファイルが見つかりません: {name}")
+
+    media_type = "application/json" if name.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=name)
+
 # 競合分析用ダミーデータを初期化
 def initialize_competitors_data():
     """競合分析用のデータを初期化する関数"""
@@ -1174,11 +1394,29 @@ async def startup_event():
         dashboard_data.competitors = initialize_competitors_data()
     print("競合分析データを初期化しました")
 
+    # 以前にアップロードされたデータがあればダッシュボードへ反映する
+    try:
+        restored = ingest_store.restore(competitors=dashboard_data.competitors)
+        if restored:
+            update_dashboard_sections(restored["dashboard"], restored["sections"])
+    except Exception as e:
+        print(f"取り込み済みデータの復元に失敗しました: {str(e)}")
+        traceback.print_exc()
+
 # ダッシュボードデータをリセットする関数
 def reset_dashboard_data():
-    """ダッシュボードデータをリセットする関数（競合分析データは保持）"""
+    """
+    ダッシュボードデータをリセットする関数（競合分析データは保持）
+
+    取り込み済みのデータ・保存済みのテーブル・取り込み済みファイルの記録も消すため、
+    再起動や次のアップロードでリセット前のデータが戻ることはない。
+    """
     global dashboard_data
 
+    removed = ingest_store.reset()
+    clear_upload_registry()
+    print(f"取り込み済みデータを削除しました: {removed}ファイル")
+
     # 競合データを一時保存
     competitors_backup = dashboard_data.competitors
 
@@ -1203,6 +1441,7 @@ def reset_dashboard_data():
 
     # 競合データを復元
     dashboard_data.competitors = competitors_backup
+    metrics.bump_snapshot_version()
 
     # 競合データが空の場合は初期化
     if not dashboard_data.competitors or len(dashboard_data.competitors) == 0:
@@ -1211,7 +1450,8 @@ def reset_dashboard_data():
 
     return {
         "status": "成功",
-        "message": "ダッシュボードデータがリセットされました（競合分析データは保持）"
+        "message": "ダッシュボードデータがリセットされました（競合分析データは保持）",
+        "removed_files": removed
     }
 
 # ダッシュボードデータリセットエンドポイント
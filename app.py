@@ -2,11 +2,13 @@ from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.responses import JSONResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
-import time
 from typing import List
 import pandas as pd
 import json
+import compression
+import upload_storage
 
 app = FastAPI()
 
@@ -19,11 +21,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# アップロードのリクエスト本文（展開後）のサイズ上限
+app.add_middleware(upload_storage.RequestSizeLimitMiddleware)
+
+# Content-Encoding: gzip / zstd で送られた本文を受信しながら展開
+app.add_middleware(compression.DecompressRequestMiddleware)
+
 # 静的ファイル設定
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # アップロードディレクトリの作成
-os.makedirs("uploads", exist_ok=True)
+UPLOAD_DIR = "uploads"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+async def save_upload(file: UploadFile, data_type: str, budget: upload_storage.UploadBudget = None):
+    """
+    アップロードされたファイルを内容のハッシュ名で保存し、レスポンス用の情報を返す
+
+    チャンクごとに展開・ハッシュ計算・書き込みを行うため、ファイル全体をメモリに持たない。
+    """
+    saved = await upload_storage.save_upload(file, UPLOAD_DIR, prefix=data_type, budget=budget)
+    return {
+        "filename": file.filename,
+        "data_type": data_type,
+        "saved_path": saved["path"],
+        "sha256": saved["sha256"],
+        "size": saved["size"],
+        "received_size": saved["received_size"],
+        "encoding": saved["encoding"],
+    }
 
 @app.get("/")
 async def read_root():
@@ -44,30 +70,24 @@ async def test_api():
 async def upload_csv(file: UploadFile = File(...), data_type: str = Form(default="auto")):
     """CSVファイルをアップロードして処理する"""
     try:
-        # ファイル読み込み
-        contents = await file.read()
-
-        # 保存用のパスを生成
-        timestamp = int(time.time())
-        filename = file.filename
-        output_path = f"uploads/{data_type}_{timestamp}_{filename}"
-
-        # ファイルを保存
-        with open(output_path, "wb") as f:
-            f.write(contents)
+        # ファイルを保存（保存名は内容のハッシュ）
+        result = await save_upload(file, data_type)
 
         # ファイル情報を返す
         return JSONResponse(
             content={
                 "status": "成功",
-                "filename": filename,
-                "data_type": data_type,
-                "saved_path": output_path,
-                "size": len(contents),
+                **result,
                 "message": "ファイルがアップロードされました"
             },
             headers={"Content-Type": "application/json"}
         )
+    except upload_storage.UploadTooLarge as e:
+        return JSONResponse(
+            status_code=413,
+            content={"status": "エラー", "detail": str(e)},
+            headers={"Content-Type": "application/json"}
+        )
     except Exception as e:
         # エラー処理
         return JSONResponse(
@@ -80,37 +100,23 @@ async def upload_csv(file: UploadFile = File(...), data_type: str = Form(default
 async def upload_multiple_csv(files: List[UploadFile] = File(...), data_type: str = Form(default="auto")):
     """複数のCSVファイルをアップロードして処理する"""
     try:
-        results = []
-        timestamp = int(time.time())
+        # リクエスト全体の書き込み量の上限を全ファイルで共有する
+        budget = upload_storage.UploadBudget()
 
-        for file in files:
+        async def save_one(file):
             try:
-                # ファイル読み込み
-                contents = await file.read()
-                filename = file.filename
-
-                # 保存用のパスを生成
-                output_path = f"uploads/{data_type}_{timestamp}_{filename}"
-
-                # ファイルを保存
-                with open(output_path, "wb") as f:
-                    f.write(contents)
-
-                # 結果を追加
-                results.append({
-                    "filename": filename,
-                    "data_type": data_type,
-                    "saved_path": output_path,
-                    "size": len(contents),
-                    "status": "成功"
-                })
+                result = await save_upload(file, data_type, budget)
+                return {**result, "status": "成功"}
             except Exception as e:
                 # このファイルのエラー
-                results.append({
+                return {
                     "filename": file.filename,
                     "status": "エラー",
                     "detail": str(e)
-                })
+                }
+
+        # 各ファイルの書き込みは並行して進める
+        results = await asyncio.gather(*(save_one(file) for file in files))
 
         # 全体の結果を返す
         return JSONResponse(
@@ -0,0 +1,263 @@
+"""
+SaunaDataProcessor のベンチマーク
+
+合成データ（synthetic_data.py）を規模を変えて生成し、load_*_data と analyze_* の
+各ステージについて実行時間・ピークメモリ・処理行数/秒を計測してJSONに保存する。
+保存済みのベースラインと比較し、しきい値を超えて遅く（または重く）なった
+ステージがあれば終了コード1で終了する。
+
+使用例:
+    python benchmark.py                          # 計測してベースラインと比較
+    python benchmark.py --factors 1 10 50        # 規模を指定
+    python benchmark.py --update-baseline        # 現在の結果をベースラインとして保存
+
+ベースラインは計測したマシンに依存するため、比較は同じ環境で行うこと。
+"""
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_processor import SaunaDataProcessor
+from synthetic_data import generate_dataset
+
+BENCHMARK_DIR = "benchmarks"
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "latest.json")
+DEFAULT_DATA_DIR = os.path.join(BENCHMARK_DIR, "data")
+
+DEFAULT_FACTORS = [1, 5, 10]
+# 実行時間がこれ未満の差はノイズとして扱う（秒）
+MIN_SECONDS_DELTA = 0.05
+# ピークメモリがこれ未満の差はノイズとして扱う（MB）
+MIN_MEMORY_DELTA_MB = 5.0
+
+STAGES = [
+    "load_member_data",
+    "load_reservation_data",
+    "load_frame_data",
+    "load_sales_data",
+    "analyze_member_status",
+    "analyze_reservations",
+    "analyze_occupancy",
+    "analyze_sales",
+]
+
+
+def dataset_files(data_dir: str) -> Dict[str, List[str]]:
+    """合成データのディレクトリから種類ごとのファイル一覧を返す"""
+    return {
+        "member": [os.path.join(data_dir, "member.csv")],
+        "member_delete": [os.path.join(data_dir, "member_delete.csv")],
+        "reservation": sorted(glob.glob(os.path.join(data_dir, "reservation_*.csv"))),
+        "frame": sorted(glob.glob(os.path.join(data_dir, "frame_*.csv"))),
+        "sales": sorted(glob.glob(os.path.join(data_dir, "sales_*.csv"))),
+    }
+
+
+def prepare_dataset(factor: int, stores: int, months: int, seed: int, data_dir: str) -> Tuple[str, Dict]:
+    """指定規模の合成データを用意する（同じ条件で生成済みなら再利用）"""
+    path = os.path.join(data_dir, f"f{factor}_s{stores}_m{months}_seed{seed}")
+    manifest_path = os.path.join(path, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            return path, json.load(f)
+    print(f"合成データを生成しています: {path}")
+    with contextlib.redirect_stdout(io.StringIO()):
+        manifest = generate_dataset(path, factor=factor, stores=stores, months=months, seed=seed)
+    return path, manifest
+
+
+def _stage_calls(processor: SaunaDataProcessor, files: Dict[str, List[str]]) -> List[Tuple[str, Callable, Callable]]:
+    """(ステージ名, 実行関数, 処理行数を返す関数) の一覧"""
+    def rows(attr):
+        return lambda: len(getattr(processor, attr)) if getattr(processor, attr) is not None else 0
+
+    return [
+        ("load_member_data", lambda: processor.load_member_data(files["member"][0], files["member_delete"][0]), rows("member_data")),
+        ("load_reservation_data", lambda: processor.load_reservation_data(files["reservation"]), rows("reservation_data")),
+        ("load_frame_data", lambda: processor.load_frame_data(files["frame"]), rows("frame_data")),
+        ("load_sales_data", lambda: processor.load_sales_data(files["sales"]), rows("sales_data")),
+        ("analyze_member_status", processor.analyze_member_status, rows("member_data")),
+        ("analyze_reservations", processor.analyze_reservations, rows("reservation_data")),
+        ("analyze_occupancy", processor.analyze_occupancy, rows("frame_data")),
+        ("analyze_sales", processor.analyze_sales, rows("sales_data")),
+    ]
+
+
+def _run_pipeline(files: Dict[str, List[str]], reference_date: str, trace_memory: bool) -> Dict[str, Dict]:
+    """全ステージを1回実行し、ステージごとの計測値を返す"""
+    processor = SaunaDataProcessor()
+    processor.set_reference_date(reference_date)
+    results = {}
+    for name, call, count_rows in _stage_calls(processor, files):
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        # 処理中のprint出力は計測結果の表示の邪魔になるため捨てる
+        with contextlib.redirect_stdout(io.StringIO()):
+            call()
+        elapsed = time.perf_counter() - started
+        entry = {"seconds": elapsed, "rows": count_rows()}
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            entry["peak_memory_mb"] = peak / (1024 * 1024)
+        results[name] = entry
+    return results
+
+
+def benchmark_dataset(data_dir: str, reference_date: str, repeat: int) -> Dict[str, Dict]:
+    """
+    1つのデータセットについて全ステージを計測する
+
+    tracemalloc は処理を大きく遅くするため、メモリ計測用の1回と
+    時間計測用の repeat 回を分けて実行し、時間は中央値を採用する。
+    """
+    files = dataset_files(data_dir)
+    memory_run = _run_pipeline(files, reference_date, trace_memory=True)
+    timing_runs = [_run_pipeline(files, reference_date, trace_memory=False) for _ in range(repeat)]
+
+    stages = {}
+    for name in STAGES:
+        seconds = statistics.median(run[name]["seconds"] for run in timing_runs)
+        rows = timing_runs[0][name]["rows"]
+        stages[name] = {
+            "seconds": round(seconds, 4),
+            "peak_memory_mb": round(memory_run[name]["peak_memory_mb"], 2),
+            "rows": rows,
+            "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+        }
+    return stages
+
+
+def run_benchmarks(factors: List[int], stores: int, months: int, seed: int,
+                   repeat: int, data_dir: str) -> Dict:
+    results = {}
+    for factor in factors:
+        path, manifest = prepare_dataset(factor, stores, months, seed, data_dir)
+        print(f"\n=== factor={factor}（会員 {manifest['rows']['member']}件、予約 {manifest['rows']['reservation']}件、"
+              f"予約枠 {manifest['rows']['frame']}件、売上 {manifest['rows']['sales']}件） ===")
+        stages = benchmark_dataset(path, manifest["reference_date"], repeat)
+        for name, entry in stages.items():
+            print(f"  {name:<24} {entry['seconds']:>9.4f}秒  {entry['peak_memory_mb']:>9.2f}MB  "
+                  f"{entry['rows_per_second'] or 0:>12.1f}行/秒")
+        results[f"factor_{factor}"] = {"factor": factor, "dataset": manifest["rows"], "stages": stages}
+
+    return {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "config": {"factors": factors, "stores": stores, "months": months, "seed": seed, "repeat": repeat},
+        "results": results,
+    }
+
+
+def compare_with_baseline(current: Dict, baseline: Dict, threshold: float,
+                          memory_threshold: Optional[float] = None) -> List[Dict]:
+    """ベースラインより threshold（割合）以上遅く・重くなったステージを返す"""
+    memory_threshold = threshold if memory_threshold is None else memory_threshold
+    regressions = []
+    for key, result in current["results"].items():
+        base_result = baseline.get("results", {}).get(key)
+        if base_result is None:
+            continue
+        for stage, entry in result["stages"].items():
+            base = base_result["stages"].get(stage)
+            if base is None:
+                continue
+            checks = [
+                ("seconds", threshold, MIN_SECONDS_DELTA),
+                ("peak_memory_mb", memory_threshold, MIN_MEMORY_DELTA_MB),
+            ]
+            for metric, limit, min_delta in checks:
+                before, after = base.get(metric), entry.get(metric)
+                if not before or after is None:
+                    continue
+                if after > before * (1 + limit) and after - before > min_delta:
+                    regressions.append({
+                        "dataset": key, "stage": stage, "metric": metric,
+                        "baseline": before, "current": after,
+                        "change_percent": round((after / before - 1) * 100, 1),
+                    })
+    return regressions
+
+
+def print_comparison(current: Dict, baseline: Dict) -> None:
+    print("\n=== ベースラインとの比較（実行時間） ===")
+    for key, result in current["results"].items():
+        base_result = baseline.get("results", {}).get(key)
+        if base_result is None:
+            print(f"  {key}: ベースラインなし")
+            continue
+        for stage, entry in result["stages"].items():
+            base = base_result["stages"].get(stage)
+            if not base or not base.get("seconds"):
+                continue
+            change = (entry["seconds"] / base["seconds"] - 1) * 100
+            print(f"  {key:<10} {stage:<24} {base['seconds']:>9.4f}秒 → {entry['seconds']:>9.4f}秒 ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SaunaDataProcessor のベンチマークを実行します")
+    parser.add_argument("--factors", type=int, nargs="+", default=DEFAULT_FACTORS, help="合成データの規模（倍率）")
+    parser.add_argument("--stores", type=int, default=1, help="店舗数")
+    parser.add_argument("--months", type=int, default=24, help="月数")
+    parser.add_argument("--seed", type=int, default=42, help="乱数シード")
+    parser.add_argument("--repeat", type=int, default=3, help="時間計測の繰り返し回数（中央値を採用）")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="合成データのキャッシュ先")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="結果JSONの出力先")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="比較対象のベースラインJSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="実行時間の劣化しきい値（0.2 = 20%%）")
+    parser.add_argument("--memory-threshold", type=float, default=None, help="ピークメモリの劣化しきい値（省略時は --threshold と同じ）")
+    parser.add_argument("--update-baseline", action="store_true", help="結果をベースラインとして保存する")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.factors, args.stores, args.months, args.seed, args.repeat, args.data_dir)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+    print(f"\n結果を保存しました: {args.output}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"ベースラインを更新しました: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"ベースライン {args.baseline} がないため比較をスキップします（--update-baseline で作成できます）")
+        return
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print_comparison(current, baseline)
+    regressions = compare_with_baseline(current, baseline, args.threshold, args.memory_threshold)
+    if regressions:
+        print("\n性能劣化を検出しました:")
+        for r in regressions:
+            print(f"  {r['dataset']} {r['stage']} {r['metric']}: {r['baseline']} → {r['current']} ({r['change_percent']:+.1f}%)")
+        sys.exit(1)
+    print("\n性能劣化はありません")
+
+
+if __name__ == "__main__":
+    main()
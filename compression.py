@@ -0,0 +1,146 @@
+"""
+圧縮されたアップロードの展開
+
+CSVは同じ店舗名・ルーム名や引用符付きの見出しが繰り返されるため gzip / zstd で大きく縮む。
+アップロードは次の2通りの圧縮を受け付け、どちらも展開しながら読み進めるため
+展開後の全体がメモリに載ることはない。
+
+- ファイル単位: report.csv.gz / report.csv.zst（ファイル名または先頭のマジックナンバーで判定）
+- リクエスト単位: Content-Encoding: gzip / zstd（DecompressRequestMiddleware で展開）
+
+zstd は zstandard パッケージがインストールされている場合のみ使用できる。
+"""
+import gzip
+import json
+import zlib
+from typing import BinaryIO, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+
+def supported_encodings():
+    return ["gzip", "zstd"] if zstandard is not None else ["gzip"]
+
+
+def detect_encoding(fileobj: BinaryIO, filename: Optional[str] = None) -> Optional[str]:
+    """ファイル名の拡張子、なければ先頭のマジックナンバーから圧縮形式を判定する（非圧縮はNone）"""
+    if filename:
+        for suffix, encoding in SUFFIXES.items():
+            if filename.lower().endswith(suffix):
+                return encoding
+
+    position = fileobj.tell()
+    head = fileobj.read(4)
+    fileobj.seek(position)
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def strip_compression_suffix(filename: str) -> str:
+    """report.csv.gz → report.csv"""
+    for suffix in SUFFIXES:
+        if filename.lower().endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+def open_decompressed(fileobj: BinaryIO, filename: Optional[str] = None) -> Tuple[BinaryIO, Optional[str]]:
+    """
+    圧縮されていれば展開しながら読むストリームを、そうでなければ元のファイルを返す
+
+    戻り値は (ストリーム, 圧縮形式)。pandas.read_csv などにそのまま渡せる。
+    """
+    encoding = detect_encoding(fileobj, filename)
+    if encoding == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="rb"), encoding
+    if encoding == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd形式の展開には zstandard パッケージが必要です")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False), encoding
+    return fileobj, None
+
+
+class _ZstdDecompressor:
+    """zstandard の decompressobj を zlib と同じ decompress/flush の形で使うための薄いラッパー"""
+
+    def __init__(self):
+        self._obj = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._obj.decompress(data) if data else b""
+
+    def flush(self) -> bytes:
+        return b""
+
+
+def make_decompressor(encoding: str):
+    """Content-Encoding に対応する逐次展開オブジェクト（未対応ならNone）"""
+    encoding = encoding.strip().lower()
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    if encoding == "zstd" and zstandard is not None:
+        return _ZstdDecompressor()
+    return None
+
+
+class DecompressRequestMiddleware:
+    """
+    Content-Encoding 付きのリクエスト本文を受信しながら展開するASGIミドルウェア
+
+    展開後の長さは事前に分からないため Content-Length を外し、後続のアプリ
+    （マルチパートの解析など）にはチャンクごとに展開済みの本文を渡す。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = headers.get(b"content-encoding", b"").decode("latin-1")
+        if not encoding or encoding.strip().lower() == "identity":
+            await self.app(scope, receive, send)
+            return
+
+        decompressor = make_decompressor(encoding)
+        if decompressor is None:
+            body = json.dumps({
+                "status": "エラー",
+                "detail": f"未対応のContent-Encodingです: {encoding}（対応: {', '.join(supported_encodings())}）",
+            }, ensure_ascii=False).encode("utf-8")
+            await send({"type": "http.response.start", "status": 415,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # scope はコピーせずに書き換える（外側のミドルウェアがルーターの設定した scope["route"] を読めるように）
+        scope["headers"] = [(k, v) for k, v in scope.get("headers") or []
+                            if k not in (b"content-encoding", b"content-length")]
+
+        async def receive_decompressed():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = decompressor.decompress(message.get("body", b""))
+                if not message.get("more_body", False):
+                    body += decompressor.flush()
+                message = dict(message, body=body)
+            return message
+
+        await self.app(scope, receive_decompressed, send)
@@ -6,9 +6,22 @@ import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from datetime import datetime
-
-# アプリの初期化
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+from dash.exceptions import PreventUpdate
+import os
+from data_layer import DataLayer
+from dashboard_builder import TIMESERIES
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# バックグラウンド処理の状態と結果を置くディレクトリ
+DASH_CACHE_DIR = os.environ.get("SAUNA_DASH_CACHE_DIR", os.path.join("cache", "dash"))
+# バックグラウンド処理の結果を残す秒数
+JOB_RESULT_EXPIRE = 24 * 60 * 60
+# 分析結果をプロセス間で共有するディレクトリ（バックグラウンド処理で計算した結果を本体で使う）
+ANALYSIS_CACHE_DIR = os.path.join(DASH_CACHE_DIR, "analyses")
 
 # カラーパレット
 COLORS = {
@@ -40,51 +53,302 @@ PIE_COLORS = [
     COLORS["warning"]
 ]
 
-# ダミーデータの生成用関数
-def generate_dummy_data():
-    # ダミーデータを返すだけ
-    # 実際の実装では、データベースやAPIからデータを取得する
-
-    # 月のリスト
-    months = pd.date_range(start='2023-05-01', end='2025-03-01', freq='MS').strftime('%Y-%m').tolist()
-
-    # 曜日
-    days_of_week = ['月', '火', '水', '木', '金', '土', '日']
-
-    # 時間帯
-    time_slots = ['9-12時', '12-15時', '15-18時', '18-21時', '21-24時']
-
-    # 地域
-    regions = ['大阪府', '兵庫県', '京都府', '奈良県', '滋賀県', '和歌山県', 'その他']
-
-    # 部屋名
-    room_names = ['Room1', 'Room2', 'Room3']
-
-    # 競合施設名
-    competitor_names = ['HAAAVE.sauna', 'KUDOCHI sauna', 'MENTE', 'M\'s Sauna', 'SAUNA Pod 槃',
-                        'SAUNA OOO OSAKA', '大阪サウナ DESSE']
-
-    # 年齢層
-    age_groups = ['20代', '30代', '40代', '50代', '~19歳', '60歳~']
-
-    # 性別
-    genders = ['男性', '女性']
+# ダッシュボードのデータ（CSV → SaunaDataProcessor → 図のキャッシュ）。
+# データと図はこのプロセスに置き、分析結果だけをディスク経由でバックグラウンド処理と共有する
+data_layer = DataLayer.from_env(result_store=diskcache.Cache(ANALYSIS_CACHE_DIR) if diskcache is not None else None)
+
+def create_job_manager():
+    """
+    まだ計算していない分析をFlaskのワーカーの外（別プロセス）で実行するジョブマネージャー
+
+    ジョブのプロセスの状態は終了時に捨てられるため、ジョブでは分析だけを行って結果を
+    data_layer.result_store に保存し、図の作成は本体のプロセスで行う（render_tab）。
+    ジョブの状態と結果はローカルディスク（diskcache）に置き、コールバックの入力と
+    データファイルの署名をキーに残す。
+    diskcache / multiprocess / psutil がない環境では None を返し、分析はリクエスト内で行う。
+    """
+    if diskcache is None:
+        print("警告: diskcache がないため、分析はリクエスト内で実行します（pip install \"dash[diskcache]\"）")
+        return None
+    try:
+        return dash.DiskcacheManager(diskcache.Cache(DASH_CACHE_DIR), cache_by=[data_layer.file_signature],
+                                     expire=JOB_RESULT_EXPIRE)
+    except ImportError as e:
+        print(f"警告: バックグラウンド処理を使えません（{e}）。分析はリクエスト内で実行します")
+        return None
+
+job_manager = create_job_manager()
+
+# アプリの初期化（タブの中身はコールバックで作るため、未表示の部品へのコールバックを許可する）
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP], suppress_callback_exceptions=True,
+                background_callback_manager=job_manager)
+
+# 部屋名 → 色
+ROOM_COLORS = {"Room1": COLORS["room1"], "Room2": COLORS["room2"], "Room3": COLORS["room3"]}
+GENDER_COLORS = {"男性": COLORS["male"], "女性": COLORS["female"]}
+MEMBER_SERIES_COLORS = {"会員": COLORS["primary"], "体験者": COLORS["accent1"], "ビジター": COLORS["accent2"]}
+
+def _room_color(room, i):
+    return ROOM_COLORS.get(room, PIE_COLORS[i % len(PIE_COLORS)])
+
+def _in_period(month, period):
+    """期間セレクターの値（all / YYYY）に含まれる月か"""
+    return period in (None, "all") or str(month).startswith(str(period))
+
+def _format_number(value, suffix="", prefix=""):
+    if value is None:
+        return f"{prefix}---{suffix}"
+    if isinstance(value, float) and not value.is_integer():
+        return f"{prefix}{value:,.1f}{suffix}"
+    return f"{prefix}{int(value):,}{suffix}"
+
+def _finish(fig, showlegend=True):
+    """共通の見た目を設定し、キャッシュに入れるJSON形式（dict）にする"""
+    fig.update_layout(
+        margin=dict(l=40, r=20, t=20, b=40),
+        plot_bgcolor=COLORS["white"],
+        paper_bgcolor=COLORS["white"],
+        showlegend=showlegend,
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, x=0),
+    )
+    return fig.to_dict()
+
+def _room_series_figure(entries, rooms, kind="bar", y_title="稼働率（%）"):
+    """[{name, Room1, Room2, ...}] 形式のデータを部屋ごとの系列にする"""
+    if not entries:
+        return None
+    fig = go.Figure()
+    names = [e["name"] for e in entries]
+    for i, room in enumerate(rooms):
+        values = [e.get(room) for e in entries]
+        color = _room_color(room, i)
+        if kind == "line":
+            fig.add_trace(go.Scatter(x=names, y=values, name=room, mode="lines+markers", line=dict(color=color)))
+        else:
+            fig.add_trace(go.Bar(x=names, y=values, name=room, marker_color=color))
+    fig.update_layout(barmode="group", yaxis_title=y_title)
+    return _finish(fig)
+
+# ---------------------------------------------------------------------------
+# 図の定義（ダッシュボードデータ → Plotly の図）
+# ---------------------------------------------------------------------------
+def fig_room_average(dashboard):
+    rooms = dashboard["utilization"]["rooms"]
+    if not rooms:
+        return None
+    names = list(rooms)
+    fig = go.Figure(go.Bar(
+        x=names, y=[rooms[r]["average"] for r in names],
+        marker_color=[_room_color(r, i) for i, r in enumerate(names)],
+        text=[f"{rooms[r]['average']}%" for r in names], textposition="outside",
+    ))
+    fig.update_layout(yaxis_title="平均稼働率（%）")
+    return _finish(fig, showlegend=False)
+
+def fig_gender(dashboard):
+    items = dashboard["members"]["genderDistribution"]
+    if not items:
+        return None
+    fig = go.Figure(go.Pie(
+        labels=[i["name"] for i in items], values=[i["value"] for i in items], hole=0.4,
+        marker=dict(colors=[GENDER_COLORS.get(i["name"], PIE_COLORS[n % len(PIE_COLORS)]) for n, i in enumerate(items)]),
+    ))
+    return _finish(fig)
+
+def fig_age(dashboard):
+    items = dashboard["members"]["ageDistribution"]
+    if not items:
+        return None
+    fig = go.Figure(go.Bar(x=[i["name"] for i in items], y=[i["value"] for i in items],
+                           marker_color=COLORS["secondary"]))
+    fig.update_layout(yaxis_title="人数")
+    return _finish(fig, showlegend=False)
+
+def fig_region(dashboard):
+    items = dashboard["members"]["regionDistribution"]
+    if not items:
+        return None
+    fig = go.Figure(go.Bar(x=[i["name"] for i in items], y=[i["value"] for i in items],
+                           marker_color=COLORS["accent1"]))
+    return _finish(fig, showlegend=False)
+
+def fig_membership_trend(dashboard, period):
+    entries = [e for e in dashboard["members"]["membershipTrend"] if _in_period(e["name"], period)]
+    if not entries:
+        return None
+    fig = go.Figure()
+    for series, color in MEMBER_SERIES_COLORS.items():
+        fig.add_trace(go.Scatter(x=[e["name"] for e in entries], y=[e.get(series, 0) for e in entries],
+                                 name=series, mode="lines+markers", line=dict(color=color)))
+    fig.update_layout(yaxis_title="人数（月末時点）")
+    return _finish(fig)
+
+def fig_weekday(dashboard):
+    return _room_series_figure(dashboard["utilization"]["byDayOfWeek"], dashboard["labels"]["roomNames"])
+
+def fig_time_slot(dashboard):
+    return _room_series_figure(dashboard["utilization"]["byTimeSlot"], dashboard["labels"]["roomNames"])
+
+def fig_room_weekday(dashboard, room):
+    entries = dashboard["utilization"]["byDayOfWeek"]
+    rooms = dashboard["labels"]["roomNames"]
+    if not entries or room not in rooms:
+        return None
+    fig = go.Figure(go.Bar(x=[e["name"] for e in entries], y=[e.get(room) for e in entries],
+                           marker_color=_room_color(room, rooms.index(room))))
+    return _finish(fig, showlegend=False)
+
+def fig_monthly_utilization(dashboard, period):
+    entries = [e for e in dashboard["utilization"]["byMonth"] if _in_period(e["name"], period)]
+    return _room_series_figure(entries, dashboard["labels"]["roomNames"], kind="line")
+
+def fig_competitor_prices(dashboard):
+    pricing = dashboard["competitors"].get("pricing", [])
+    if not pricing:
+        return None
+    fig = go.Figure(go.Bar(
+        x=[p["name"] for p in pricing], y=[p["価格"] for p in pricing],
+        marker_color=[COLORS["primary"] if p["name"] == "HAAAVE.sauna" else COLORS["gray"] for p in pricing],
+    ))
+    fig.update_layout(yaxis_title="料金（円）")
+    return _finish(fig, showlegend=False)
+
+def fig_competitor_regions(dashboard):
+    items = dashboard["competitors"].get("regionDistribution", [])
+    if not items:
+        return None
+    fig = go.Figure(go.Bar(x=[i["name"] for i in items], y=[i["value"] for i in items],
+                           marker_color=COLORS["secondary"]))
+    return _finish(fig, showlegend=False)
+
+def fig_sales_trend(dashboard, period):
+    entries = [e for e in dashboard["finance"]["monthly_trend"] if _in_period(e["name"], period)]
+    if not entries:
+        return None
+    fig = go.Figure(go.Bar(x=[e["name"] for e in entries], y=[e["売上"] for e in entries],
+                           name="売上", marker_color=COLORS["primary"]))
+    fig.update_layout(yaxis_title="売上（円）")
+    return _finish(fig)
+
+def fig_sales_by_type(dashboard):
+    by_type = dashboard["finance"]["salesByType"]
+    if not any(by_type.values()):
+        return None
+    fig = go.Figure(go.Bar(x=list(by_type), y=list(by_type.values()), marker_color=PIE_COLORS[:len(by_type)]))
+    fig.update_layout(yaxis_title="売上（円）")
+    return _finish(fig, showlegend=False)
+
+# 図の名前 → (依存する分析ステージ, 作成関数)。依存する分析が再計算されたときだけ作り直す
+FIGURES = {
+    "room_average": (["occupancy"], fig_room_average),
+    "gender": (["member_status"], fig_gender),
+    "age": (["member_status"], fig_age),
+    "region": (["member_status"], fig_region),
+    "membership_trend": (["member_status", "reservations", "sales", "occupancy"], fig_membership_trend),
+    "weekday": (["occupancy"], fig_weekday),
+    "time_slot": (["occupancy"], fig_time_slot),
+    "room_weekday": (["occupancy"], fig_room_weekday),
+    "monthly_utilization": (["occupancy"], fig_monthly_utilization),
+    "competitor_prices": ([], fig_competitor_prices),
+    "competitor_regions": ([], fig_competitor_regions),
+    "sales_trend": (["sales"], fig_sales_trend),
+    "sales_by_type": (["sales"], fig_sales_by_type),
+}
 
-    return {
-        "labels": {
-            "months": months,
-            "days_of_week": days_of_week,
-            "time_slots": time_slots,
-            "regions": regions,
-            "room_names": room_names,
-            "competitor_names": competitor_names,
-            "age_groups": age_groups,
-            "genders": genders
-        }
-    }
+# 時系列グラフ（サーバー側で表示幅に合わせて間引いた系列を描く）の系列ごとの縦軸
+TIMESERIES_TITLES = {"occupancy": "稼働率（%）", "occupancy_daily": "稼働率（%）", "sales_daily": "売上（円）"}
+TIMESERIES_WIDTH = 1200
+
+def _period_range(period):
+    """期間セレクターの値（all / YYYY）→ (開始日, 終了日)"""
+    if period in (None, "all"):
+        return None, None
+    return f"{period}-01-01", f"{period}-12-31 23:59:59"
+
+def fig_timeseries(name, downsampled):
+    if not downsampled["series"]:
+        return None
+    fig = go.Figure()
+    for i, (series, values) in enumerate(downsampled["series"].items()):
+        color = ROOM_COLORS.get(series, PIE_COLORS[i % len(PIE_COLORS)])
+        fig.add_trace(go.Scatter(x=values["x"], y=values["y"], name=series, mode="lines", line=dict(color=color, width=1.5)))
+    fig.update_layout(yaxis_title=TIMESERIES_TITLES.get(name), hovermode="x unified")
+    return _finish(fig)
+
+def timeseries_chart(name, period, height=300, width=TIMESERIES_WIDTH):
+    """長期間の時系列を間引いて表示する（間引いた結果と図は期間・幅ごとにキャッシュされる）"""
+    start, end = _period_range(period)
+    downsampled = data_layer.timeseries(name, start, end, width)
+    figure = data_layer.memo(f"timeseries_figure:{name}", TIMESERIES[name],
+                             lambda: fig_timeseries(name, downsampled), start, end, downsampled["width"])
+    if figure is None:
+        return placeholder_chart(height, "データがありません")
+    return dcc.Graph(figure=figure, config={"displayModeBar": False}, style={"height": f"{height}px"})
+
+# 会員継続曲線の内訳（analyze_survival の by_* キー）
+SURVIVAL_BREAKDOWNS = {"by_plan": "契約プラン別", "by_gender": "性別", "by_age": "年代別"}
+
+def fig_survival(survival, breakdown):
+    curves = survival.get(breakdown, {})
+    if not survival.get("overall", {}).get("months"):
+        return None
+    fig = go.Figure()
+    overall = survival["overall"]
+    fig.add_trace(go.Scatter(x=overall["months"], y=overall["survival"], name="全体", mode="lines",
+                             line=dict(color=COLORS["dark"], width=2, dash="dot", shape="hv")))
+    for i, (label, curve) in enumerate(curves.items()):
+        color = GENDER_COLORS.get(label, PIE_COLORS[i % len(PIE_COLORS)])
+        fig.add_trace(go.Scatter(
+            x=curve["months"], y=curve["survival"], name=f"{label}（{curve['members']}人）", mode="lines",
+            line=dict(color=color, shape="hv"), customdata=list(zip(curve["at_risk"], curve["hazard"])),
+            hovertemplate="%{x}か月: 継続率 %{y:.1f}%<br>在籍 %{customdata[0]}人 / 退会率 %{customdata[1]:.1f}%",
+        ))
+    fig.update_layout(xaxis_title="在籍月数", yaxis_title="継続率（%）", yaxis_range=[0, 105])
+    return _finish(fig)
+
+def survival_chart(breakdown, height=300):
+    """会員継続曲線（会員データの取り込み時に計算済みの結果を描く）"""
+    survival = data_layer.result("survival")
+    figure = data_layer.memo("survival", ["survival"], lambda: fig_survival(survival, breakdown), breakdown)
+    if figure is None:
+        return placeholder_chart(height, "契約データがありません")
+    return dcc.Graph(figure=figure, config={"displayModeBar": False}, style={"height": f"{height}px"})
+
+# 売上の会員ステータス（analyze_sales の monthly_sales_by_category のキー）→ 表示名と色
+SALES_STATUS_SERIES = {
+    "member": ("会員", COLORS["primary"]),
+    "trial": ("トライアル", COLORS["accent1"]),
+    "visitor": ("ビジター", COLORS["accent2"]),
+    "former": ("退会後", COLORS["gray"]),
+}
 
-# ダミーデータの取得
-dummy_data = generate_dummy_data()
+def fig_sales_by_status(sales, period):
+    monthly = sales.get("monthly_sales_by_category", {})
+    months = sorted({m for values in monthly.values() for m in values if _in_period(m, period)})
+    if not months:
+        return None
+    fig = go.Figure()
+    for status, (label, color) in SALES_STATUS_SERIES.items():
+        if status in monthly:
+            fig.add_trace(go.Bar(x=months, y=[monthly[status].get(m, 0) for m in months], name=label, marker_color=color))
+    fig.update_layout(barmode="stack", yaxis_title="売上（円）")
+    return _finish(fig)
+
+def sales_by_status_chart(period, height=300):
+    """利用者タイプ別の月別売上（精算時点の会員ステータスで分類済みの分析結果を描く）"""
+    sales = data_layer.result("sales")
+    figure = data_layer.memo("sales_by_status", ["sales"], lambda: fig_sales_by_status(sales, period), period)
+    if figure is None:
+        return placeholder_chart(height, "データがありません")
+    return dcc.Graph(figure=figure, config={"displayModeBar": False}, style={"height": f"{height}px"})
+
+def chart(name, *params, height=300):
+    """キャッシュ済みの図を表示する（データがなければプレースホルダー）"""
+    inputs, build = FIGURES[name]
+    figure = data_layer.figure(name, inputs, build, *params)
+    if figure is None:
+        return placeholder_chart(height, "データがありません")
+    return dcc.Graph(figure=figure, config={"displayModeBar": False}, style={"height": f"{height}px"})
 
 # カードコンポーネント
 def create_card(title, value, icon, color=COLORS["primary"], subvalue=None):
@@ -116,9 +380,9 @@ def create_chart_card(title, subtitle, chart_content):
     ], className="mb-4 shadow-sm")
 
 # プレースホルダーチャート
-def placeholder_chart(height=300):
+def placeholder_chart(height=300, message="データロード中..."):
     return html.Div([
-        html.P("データロード中...", className="text-muted")
+        html.P(message, className="text-muted")
     ], className="d-flex justify-content-center align-items-center", style={"height": f"{height}px"})
 
 # サイドバーの項目
@@ -175,260 +439,290 @@ header = html.Div([
         dbc.Button("🔍", color="light", className="mr-2", id="filter-btn"),
         dbc.Button("📥", color="light", id="download-btn"),
     ], className="d-flex")
-], className="d-flex justify-content-between align-items-center bg-white p-4 shadow-sm",
+], id="header", className="d-flex justify-content-between align-items-center bg-white p-4 shadow-sm",
    style={"marginLeft": "250px"})
 
 # 概要タブの内容
-overview_tab = html.Div([
-    # 基本統計カード
-    html.Div([
+def overview_tab(period):
+    members = data_layer.dashboard()["members"]
+    return html.Div([
+        # 基本統計カード
+        html.Div([
+            dbc.Row([
+                dbc.Col(create_card("総メンバー数", _format_number(members["total"]), "👥", COLORS["primary"]), width=12, md=6, lg=3),
+                dbc.Col(create_card("アクティブ会員数", _format_number(members["active"]), "👥", COLORS["success"],
+                                    f"入会率: {_format_number(members['joinRate'], '%')}"), width=12, md=6, lg=3),
+                dbc.Col(create_card("トライアル体験者数", _format_number(members["trial"]), "👥", COLORS["accent1"]), width=12, md=6, lg=3),
+                dbc.Col(create_card("ビジター数", _format_number(members["visitor"]), "👥", COLORS["accent2"]), width=12, md=6, lg=3),
+            ], className="mb-4")
+        ]),
+
+        # ルーム稼働率と会員属性
         dbc.Row([
-            dbc.Col(create_card("総メンバー数", "---", "👥", COLORS["primary"]), width=12, md=6, lg=3),
-            dbc.Col(create_card("アクティブ会員数", "---", "👥", COLORS["success"], "入会率: ---%"), width=12, md=6, lg=3),
-            dbc.Col(create_card("トライアル体験者数", "---", "👥", COLORS["accent1"]), width=12, md=6, lg=3),
-            dbc.Col(create_card("ビジター数", "---", "👥", COLORS["accent2"]), width=12, md=6, lg=3),
-        ], className="mb-4")
-    ]),
+            dbc.Col(create_chart_card(
+                "ルーム別稼働率",
+                "全期間の平均稼働率",
+                chart("room_average")
+            ), width=12, lg=6),
+
+            dbc.Col(create_chart_card(
+                "会員属性",
+                "性別分布",
+                chart("gender")
+            ), width=12, lg=6),
+        ], className="mb-4"),
 
-    # ルーム稼働率と会員属性
-    dbc.Row([
-        dbc.Col(create_chart_card(
-            "ルーム別稼働率",
-            "全期間の平均稼働率",
-            placeholder_chart(300)
-        ), width=12, lg=6),
-
-        dbc.Col(create_chart_card(
-            "会員属性",
-            "性別・年齢分布",
-            placeholder_chart(300)
-        ), width=12, lg=6),
-    ], className="mb-4"),
-
-    # 曜日別稼働率
-    create_chart_card(
-        "曜日別稼働率",
-        "各ルームの曜日別稼働状況",
-        placeholder_chart(300)
-    ),
+        # 曜日別稼働率
+        create_chart_card(
+            "曜日別稼働率",
+            "各ルームの曜日別稼働状況",
+            chart("weekday")
+        ),
 
-    # 月別稼働率の推移
-    create_chart_card(
-        "月別稼働率推移",
-        "各ルームの月別稼働率推移",
-        placeholder_chart(300)
-    ),
-])
+        # 月別稼働率の推移
+        create_chart_card(
+            "月別稼働率推移",
+            "各ルームの月別稼働率推移",
+            chart("monthly_utilization", period)
+        ),
+
+        # 日別推移チャート
+        create_chart_card(
+            "日別推移",
+            "各ルームの日別平均稼働率",
+            timeseries_chart("occupancy_daily", period)
+        ),
+    ])
 
 # 会員分析タブ
-members_tab = html.Div([
-    # 会員統計カード
-    dbc.Row([
-        dbc.Col(create_card("総メンバー数", "---", "👥", COLORS["primary"]), width=12, md=6, lg=3),
-        dbc.Col(create_card("アクティブ会員数", "---", "👥", COLORS["success"]), width=12, md=6, lg=3),
-        dbc.Col(create_card("入会率", "---%", "📈", COLORS["accent1"], "--/--"), width=12, md=6, lg=3),
-        dbc.Col(create_card("退会率", "---%", "📈", COLORS["danger"], "--/--"), width=12, md=6, lg=3),
-    ], className="mb-4"),
-
-    # 性別・年齢分布
-    dbc.Row([
-        dbc.Col(create_chart_card(
-            "性別分布",
-            "会員の性別比率",
-            placeholder_chart(300)
-        ), width=12, lg=6),
-
-        dbc.Col(create_chart_card(
-            "年齢分布",
-            "会員の年代別分布",
-            placeholder_chart(300)
-        ), width=12, lg=6),
-    ], className="mb-4"),
-
-    # 地域分布
-    create_chart_card(
-        "地域分布",
-        "会員の都道府県別分布",
-        placeholder_chart(300)
-    ),
+def members_tab(period):
+    members = data_layer.dashboard()["members"]
+    return html.Div([
+        # 会員統計カード
+        dbc.Row([
+            dbc.Col(create_card("総メンバー数", _format_number(members["total"]), "👥", COLORS["primary"]), width=12, md=6, lg=3),
+            dbc.Col(create_card("アクティブ会員数", _format_number(members["active"]), "👥", COLORS["success"]), width=12, md=6, lg=3),
+            dbc.Col(create_card("入会率", _format_number(members["joinRate"], "%"), "📈", COLORS["accent1"], "トライアル→会員"), width=12, md=6, lg=3),
+            dbc.Col(create_card("退会率", _format_number(members["churnRate"], "%"), "📈", COLORS["danger"], "会員→退会"), width=12, md=6, lg=3),
+        ], className="mb-4"),
 
-    # 会員推移グラフ
-    create_chart_card(
-        "会員推移",
-        "会員・体験者・ビジターの月別推移",
-        placeholder_chart(300)
-    ),
-])
+        # 性別・年齢分布
+        dbc.Row([
+            dbc.Col(create_chart_card(
+                "性別分布",
+                "会員の性別比率",
+                chart("gender")
+            ), width=12, lg=6),
+
+            dbc.Col(create_chart_card(
+                "年齢分布",
+                "会員の年代別分布",
+                chart("age")
+            ), width=12, lg=6),
+        ], className="mb-4"),
+
+        # 地域分布
+        create_chart_card(
+            "地域分布",
+            "会員の都道府県別分布",
+            chart("region")
+        ),
+
+        # 会員推移グラフ
+        create_chart_card(
+            "会員推移",
+            "会員・体験者・ビジターの月別推移",
+            chart("membership_trend", period)
+        ),
+
+        # 会員継続曲線
+        dbc.Row([
+            dbc.Col(create_chart_card(
+                f"会員継続曲線（{label}）",
+                "プラン契約開始からの継続率（基準日で打ち切り）",
+                survival_chart(breakdown)
+            ), width=12, lg=4)
+            for breakdown, label in SURVIVAL_BREAKDOWNS.items()
+        ], className="mb-4"),
+    ])
 
 # ルーム稼働率タブ
-utilization_tab = html.Div([
-    # ルーム稼働率カード
-    dbc.Row([
-        dbc.Col(create_card("Room1 稼働率", "---%", "📊", COLORS["room1"]), width=12, md=4),
-        dbc.Col(create_card("Room2 稼働率", "---%", "📊", COLORS["room2"]), width=12, md=4),
-        dbc.Col(create_card("Room3 稼働率", "---%", "📊", COLORS["room3"]), width=12, md=4),
-    ], className="mb-4"),
-
-    # 稼働率比較チャート
-    create_chart_card(
-        "ルーム稼働率比較",
-        "全期間の平均稼働率",
-        placeholder_chart(300)
-    ),
+def utilization_tab(period):
+    dashboard = data_layer.dashboard()
+    rooms = dashboard["labels"]["roomNames"]
+    averages = dashboard["utilization"]["rooms"]
+    months = [e for e in dashboard["utilization"]["byMonth"] if _in_period(e["name"], period)]
+    return html.Div([
+        # ルーム稼働率カード
+        dbc.Row([
+            dbc.Col(create_card(f"{room} 稼働率", _format_number(averages.get(room, {}).get("average"), "%"), "📊",
+                                _room_color(room, i)), width=12, md=4)
+            for i, room in enumerate(rooms)
+        ], className="mb-4"),
 
-    # 年間推移チャート
-    create_chart_card(
-        "年間推移",
-        "各ルームの年間稼働率推移",
-        placeholder_chart(300)
-    ),
+        # 稼働率比較チャート
+        create_chart_card(
+            "ルーム稼働率比較",
+            "全期間の平均稼働率",
+            chart("room_average")
+        ),
 
-    # 月別稼働率テーブル
-    create_chart_card(
-        "月別稼働率詳細",
-        "各ルームの月別稼働率データ",
-        html.Div([
-            dbc.Table([
-                html.Thead([
-                    html.Tr([
-                        html.Th("月"),
-                        html.Th("Room1"),
-                        html.Th("Room2"),
-                        html.Th("Room3"),
-                        html.Th("詳細"),
-                    ])
-                ]),
-                html.Tbody([
-                    html.Tr([
-                        html.Td(month),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td(
-                            dbc.Button("詳細を見る", color="link", size="sm", id=f"detail-btn-{i}")
-                        )
-                    ]) for i, month in enumerate(dummy_data["labels"]["months"])
-                ]),
-            ], bordered=True, hover=True, responsive=True, striped=True)
-        ])
-    ),
-])
+        # 年間推移チャート
+        create_chart_card(
+            "年間推移",
+            "各ルームの年間稼働率推移",
+            chart("monthly_utilization", period)
+        ),
+
+        # 日別推移チャート
+        create_chart_card(
+            "日別推移",
+            "各ルームの日別平均稼働率",
+            timeseries_chart("occupancy_daily", period)
+        ),
+
+        # 月別稼働率テーブル
+        create_chart_card(
+            "月別稼働率詳細",
+            "各ルームの月別稼働率データ",
+            html.Div([
+                dbc.Table([
+                    html.Thead([
+                        html.Tr([html.Th("月")] + [html.Th(room) for room in rooms] + [html.Th("詳細")])
+                    ]),
+                    html.Tbody([
+                        html.Tr([html.Td(entry["name"])]
+                                + [html.Td(_format_number(entry.get(room), "%")) for room in rooms]
+                                + [html.Td(dbc.Button("詳細を見る", color="link", size="sm", id=f"detail-btn-{i}"))])
+                        for i, entry in enumerate(months)
+                    ]),
+                ], bordered=True, hover=True, responsive=True, striped=True)
+            ])
+        ),
+    ])
 
 # 曜日・時間分析タブ
-daytime_tab = html.Div([
-    # 曜日別稼働率チャート
-    create_chart_card(
-        "曜日別稼働率",
-        "各ルームの曜日別稼働状況",
-        placeholder_chart(300)
-    ),
+def daytime_tab(period):
+    rooms = data_layer.dashboard()["labels"]["roomNames"]
+    return html.Div([
+        # 曜日別稼働率チャート
+        create_chart_card(
+            "曜日別稼働率",
+            "各ルームの曜日別稼働状況",
+            chart("weekday")
+        ),
 
-    # 時間帯別稼働率チャート
-    create_chart_card(
-        "時間帯別稼働率",
-        "各ルームの時間帯別稼働状況",
-        placeholder_chart(300)
-    ),
+        # 時間帯別稼働率チャート
+        create_chart_card(
+            "時間帯別稼働率",
+            "各ルームの時間帯別稼働状況",
+            chart("time_slot")
+        ),
 
-    # ルーム別分析
-    dbc.Row([
-        dbc.Col(create_chart_card(
-            "Room1 曜日別稼働率",
-            "Room1の曜日別詳細",
-            placeholder_chart(200)
-        ), width=12, md=4),
-
-        dbc.Col(create_chart_card(
-            "Room2 曜日別稼働率",
-            "Room2の曜日別詳細",
-            placeholder_chart(200)
-        ), width=12, md=4),
-
-        dbc.Col(create_chart_card(
-            "Room3 曜日別稼働率",
-            "Room3の曜日別詳細",
-            placeholder_chart(200)
-        ), width=12, md=4),
-    ]),
-])
+        # ルーム別分析
+        dbc.Row([
+            dbc.Col(create_chart_card(
+                f"{room} 曜日別稼働率",
+                f"{room}の曜日別詳細",
+                chart("room_weekday", room, height=200)
+            ), width=12, md=4)
+            for room in rooms
+        ]),
+    ])
 
 # 競合分析タブ
-competitors_tab = html.Div([
-    # 競合施設料金比較
-    create_chart_card(
-        "競合施設 料金比較",
-        "大阪市内の主なプライベートサウナ施設の料金比較（1時間あたり）",
-        placeholder_chart(300)
-    ),
+def competitors_tab(period):
+    details = data_layer.dashboard()["competitors"].get("details", [])
+    columns = ["施設名", "所在地", "形態", "料金", "ルーム数", "水風呂", "男女混浴", "開業年"]
+    return html.Div([
+        # 競合施設料金比較
+        create_chart_card(
+            "競合施設 料金比較",
+            "大阪市内の主なプライベートサウナ施設の料金比較（1時間あたり）",
+            chart("competitor_prices")
+        ),
 
-    # 競合施設詳細比較
-    create_chart_card(
-        "競合施設詳細比較",
-        "各施設の特徴比較",
-        html.Div([
-            dbc.Table([
-                html.Thead([
-                    html.Tr([
-                        html.Th("施設名"),
-                        html.Th("所在地"),
-                        html.Th("形態"),
-                        html.Th("料金"),
-                        html.Th("ルーム数"),
-                        html.Th("水風呂"),
-                        html.Th("男女混浴"),
-                        html.Th("開業年"),
-                    ])
-                ]),
-                html.Tbody([
-                    html.Tr([
-                        html.Td(
-                            html.Span(name, className="font-weight-bold text-primary")
-                            if name == "HAAAVE.sauna" else name
-                        ),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td("---"),
-                        html.Td("---"),
-                    ]) for name in dummy_data["labels"]["competitor_names"]
-                ]),
-            ], bordered=True, hover=True, responsive=True, striped=True)
-        ])
-    ),
+        # 競合施設詳細比較
+        create_chart_card(
+            "競合施設詳細比較",
+            "各施設の特徴比較",
+            html.Div([
+                dbc.Table([
+                    html.Thead([
+                        html.Tr([html.Th(column) for column in columns])
+                    ]),
+                    html.Tbody([
+                        html.Tr([
+                            html.Td(
+                                html.Span(row.get(column, "---"), className="font-weight-bold text-primary")
+                                if column == "施設名" and row.get(column) == "HAAAVE.sauna" else row.get(column, "---")
+                            )
+                            for column in columns
+                        ]) for row in details
+                    ]),
+                ], bordered=True, hover=True, responsive=True, striped=True)
+            ])
+        ),
 
-    # 地域分布
-    create_chart_card(
-        "競合施設 地域分布",
-        "大阪市内のエリア別サウナ施設数",
-        placeholder_chart(200)
-    ),
-])
+        # 地域分布
+        create_chart_card(
+            "競合施設 地域分布",
+            "大阪市内のエリア別サウナ施設数",
+            chart("competitor_regions", height=200)
+        ),
+    ])
 
 # 売上分析タブ
-finance_tab = html.Div([
-    # 売上統計カード
-    dbc.Row([
-        dbc.Col(create_card("直近月間売上", "¥---", "📊", COLORS["primary"]), width=12, md=4),
-        dbc.Col(create_card("直近月間利益", "¥---", "📊", COLORS["success"]), width=12, md=4),
-        dbc.Col(create_card("直近月間利益率", "---%", "📊", COLORS["accent1"]), width=12, md=4),
-    ], className="mb-4"),
-
-    # 月別売上・利益推移
-    create_chart_card(
-        "月別売上・利益推移",
-        "売上と利益の月次推移",
-        placeholder_chart(300)
-    ),
+def finance_tab(period):
+    latest = data_layer.dashboard()["finance"]["latest_month"]
+    month = latest.get("month", "---")
+    return html.Div([
+        # 売上統計カード（原価データがないため利益は表示しない）
+        dbc.Row([
+            dbc.Col(create_card("直近月間売上", _format_number(latest.get("sales"), prefix="¥"), "📊", COLORS["primary"], month), width=12, md=4),
+            dbc.Col(create_card("直近月間利益", "¥---", "📊", COLORS["success"], "原価データなし"), width=12, md=4),
+            dbc.Col(create_card("平均客単価", _format_number(latest.get("average_value"), prefix="¥"), "📊", COLORS["accent1"], month), width=12, md=4),
+        ], className="mb-4"),
 
-    # 利用者タイプ別平均利用料金
-    create_chart_card(
-        "利用者タイプ別平均利用料金",
-        "体験者・ビジター・会員の平均利用額",
-        placeholder_chart(300)
-    ),
-])
+        # 月別売上推移
+        create_chart_card(
+            "月別売上推移",
+            "売上の月次推移",
+            chart("sales_trend", period)
+        ),
+
+        # 日別売上推移
+        create_chart_card(
+            "日別売上推移",
+            "売上の日次推移",
+            timeseries_chart("sales_daily", period)
+        ),
+
+        # 利用者タイプ別売上
+        create_chart_card(
+            "利用者タイプ別売上",
+            "体験者・ビジター・会員の売上合計",
+            chart("sales_by_type")
+        ),
+
+        # 利用者タイプ別の月別売上
+        create_chart_card(
+            "利用者タイプ別の月別売上",
+            "精算時点の会員ステータスで分類",
+            sales_by_status_chart(period)
+        ),
+    ])
+
+# タブ名 → (サイドバーのボタン, レイアウト作成関数)
+TABS = {
+    "overview": ("nav-概要", overview_tab),
+    "members": ("nav-会員分析", members_tab),
+    "utilization": ("nav-ルーム稼働率", utilization_tab),
+    "daytime": ("nav-曜日・時間分析", daytime_tab),
+    "competitors": ("nav-競合分析", competitors_tab),
+    "finance": ("nav-売上分析", finance_tab),
+}
+NAV_TABS = {button_id: tab for tab, (button_id, _) in TABS.items()}
 
 # 月別詳細データモーダル
 monthly_detail_modal = dbc.Modal([
@@ -489,14 +783,28 @@ monthly_detail_modal = dbc.Modal([
     ),
 ], id="monthly-detail-modal", size="lg")
 
-# タブコンテンツをまとめる
-tab_content = html.Div([
-    overview_tab,
+# 作成中の表示（進捗とキャンセル）
+render_status = html.Div([
+    dbc.Progress(id="render-progress", value=0, label="", striped=True, animated=True, className="mb-2"),
+    dbc.Button("キャンセル", id="cancel-render", color="light", size="sm"),
+], id="render-status", className="mb-4", style={"display": "none"})
+
+# タブコンテンツをまとめる（各タブは初めて表示したときに render_tab で作る）
+tab_content = html.Div([render_status] + [
+    html.Div(placeholder_chart(300), id=f"tab-{tab}", style={"display": "block" if tab == "overview" else "none"})
+    for tab in TABS
 ], id="tab-content", style={"marginLeft": "250px", "padding": "20px"})
 
 # 全体レイアウト
 app.layout = html.Div([
     dcc.Store(id="active-tab", data="overview"),
+    # 作成を依頼するタブ {tab, period}。未計算の分析がある場合は先にバックグラウンドで分析する
+    dcc.Store(id="render-request"),
+    dcc.Store(id="analysis-request"),
+    dcc.Store(id="analyzed-request"),
+    # 直近に作成したタブ {tab, period, signature} と、作成済みのタブ {tab: {period, signature}}
+    dcc.Store(id="last-render"),
+    dcc.Store(id="rendered-tabs", data={}),
     sidebar,
     html.Div([
         header,
@@ -505,39 +813,101 @@ app.layout = html.Div([
     monthly_detail_modal,
 ])
 
-# コールバック：タブ切り替え
+# コールバック：タブ切り替え・期間変更・再読み込み
 @app.callback(
-    Output("tab-content", "children"),
-    Output("active-tab", "data"),
-    [
-        Input("nav-概要", "n_clicks"),
-        Input("nav-会員分析", "n_clicks"),
-        Input("nav-ルーム稼働率", "n_clicks"),
-        Input("nav-曜日・時間分析", "n_clicks"),
-        Input("nav-競合分析", "n_clicks"),
-        Input("nav-売上分析", "n_clicks"),
-    ],
+    [Output(f"tab-{tab}", "style") for tab in TABS]
+    + [Output("active-tab", "data"), Output("render-request", "data"), Output("analysis-request", "data")],
+    [Input(button_id, "n_clicks") for button_id, _ in TABS.values()]
+    + [Input("period-selector", "value"), Input("refresh-btn", "n_clicks")],
     State("active-tab", "data"),
+    State("rendered-tabs", "data"),
 )
-def switch_tab(overview, members, utilization, daytime, competitors, finance, current):
+def switch_tab(*args):
+    """
+    タブの表示を切り替え、まだ作っていない（または古い）タブだけ作成を依頼する
+
+    作成済みのタブは表示を切り替えるだけなので、データを読まずにすぐ返る。
+    データファイルが変わったかどうかは stat だけで判定する。未計算の分析がある場合だけ
+    バックグラウンド処理に回し、それ以外はこのプロセスの図のキャッシュからすぐ作る。
+    """
+    period, current, rendered = args[-4], args[-2], args[-1] or {}
     ctx = dash.callback_context
-    if not ctx.triggered:
-        return overview_tab, "overview"
-    else:
-        button_id = ctx.triggered[0]["prop_id"].split(".")[0]
-        if button_id == "nav-概要":
-            return overview_tab, "overview"
-        elif button_id == "nav-会員分析":
-            return members_tab, "members"
-        elif button_id == "nav-ルーム稼働率":
-            return utilization_tab, "utilization"
-        elif button_id == "nav-曜日・時間分析":
-            return daytime_tab, "daytime"
-        elif button_id == "nav-競合分析":
-            return competitors_tab, "competitors"
-        elif button_id == "nav-売上分析":
-            return finance_tab, "finance"
-        return overview_tab, "overview"
+    button_id = ctx.triggered[0]["prop_id"].split(".")[0] if ctx.triggered else None
+
+    tab = NAV_TABS.get(button_id, current if current in TABS else "overview")
+    styles = [{"display": "block" if name == tab else "none"} for name in TABS]
+    done = rendered.get(tab) or {}
+    stale = (button_id == "refresh-btn" or done.get("period") != period
+             or done.get("signature") != data_layer.file_signature())
+    if not stale:
+        return styles + [tab, dash.no_update, dash.no_update]
+    request = {"tab": tab, "period": period}
+    if job_manager is not None and data_layer.pending():
+        return styles + [tab, dash.no_update, request]
+    return styles + [tab, request, dash.no_update]
+
+def prepare_analyses(set_progress, request):
+    """
+    依頼されたタブの表示前に、まだ計算していない分析をバックグラウンドで計算する
+
+    結果は data_layer.result_store に保存され、本体のプロセスの render_tab はそれを読み込む。
+    """
+    if not request:
+        raise PreventUpdate
+    set_progress((10, "データの更新を確認しています"))
+    # ジョブのプロセスは起動時点の状態を引き継いでいるだけなので、間隔によらず変更を確認する
+    data_layer.refresh(force=True)
+    set_progress((100, "完了"))
+    return request
+
+if job_manager is not None:
+    app.callback(
+        Output("analyzed-request", "data"),
+        Input("analysis-request", "data"),
+        background=True,
+        progress=[Output("render-progress", "value"), Output("render-progress", "label")],
+        running=[(Output("render-status", "style"), {"display": "block"}, {"display": "none"})],
+        cancel=[Input("cancel-render", "n_clicks")],
+    )(prepare_analyses)
+
+@app.callback(
+    [Output(f"tab-{tab}", "children") for tab in TABS] + [Output("last-render", "data")],
+    Input("render-request", "data"),
+    Input("analyzed-request", "data"),
+)
+def render_tab(request, analyzed):
+    """
+    依頼されたタブをこのプロセスの図のキャッシュから組み立てる
+
+    分析結果はバックグラウンド処理が保存したものを読み込むため、ここでは再計算しない
+    （バックグラウンド処理がない環境ではここで計算する）。図は依存する分析が変わったときだけ作り直す。
+    """
+    ctx = dash.callback_context
+    if ctx.triggered and ctx.triggered[0]["prop_id"].startswith("analyzed-request"):
+        request = analyzed
+    if not request or request.get("tab") not in TABS:
+        raise PreventUpdate
+    tab, period = request["tab"], request["period"]
+    signature = data_layer.file_signature()
+
+    data_layer.refresh(force=True)
+    content = TABS[tab][1](period)
+    return [content if name == tab else dash.no_update for name in TABS] + [
+        {"tab": tab, "period": period, "signature": signature}
+    ]
+
+# コールバック：作成済みのタブを記録
+@app.callback(
+    Output("rendered-tabs", "data"),
+    Input("last-render", "data"),
+    State("rendered-tabs", "data"),
+)
+def record_render(last_render, rendered):
+    if not last_render:
+        raise PreventUpdate
+    rendered = dict(rendered or {})
+    rendered[last_render["tab"]] = {"period": last_render["period"], "signature": last_render["signature"]}
+    return rendered
 
 # コールバック：モーダル操作
 @app.callback(
@@ -574,4 +944,7 @@ def toggle_sidebar(n_clicks, current_style):
 
 # アプリ起動
 if __name__ == "__main__":
+    # 起動時に一度読み込んでおき、バックグラウンド処理のプロセスが読み込み済みの状態から始められるようにする
+    # （分析結果は result_store にも保存され、データが変わらない限り再起動後も再計算しない）
+    data_layer.refresh(force=True)
     app.run(debug=True)
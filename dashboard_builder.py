@@ -0,0 +1,432 @@
+"""
+SaunaDataProcessor の分析結果からダッシュボード表示用データ（DashboardData）を組み立てる
+
+出力は api.py の DashboardData と同じ6セクション（labels / metrics / members /
+utilization / competitors / finance）で、キー名は frontend/src/components/Dashboard.js が
+参照するものに合わせている。月別の切り出し（build_month_slices）は月別詳細表示用。
+長期間の時系列グラフ用の系列（build_timeseries）は downsample で間引いてから返す。
+
+DashboardBuilder はデータディレクトリのCSVの読み込みから全分析・組み立てまでを一括で行い、
+(データの指紋, 基準日) ごとに結果をキャッシュする。
+
+環境変数:
+- SAUNA_DATA_DIR:              読み込むディレクトリ（既定 data）
+- SAUNA_DASHBOARD_JOBS:        読み込み・分析の並列数（既定 分析ステージ数とCPU数の小さい方。
+                               processes=False のときは読み込みのスレッド数だけに使う）
+- SAUNA_DASHBOARD_CACHE_SIZE:  キャッシュする (データの指紋, 基準日) の上限件数（既定 8）
+"""
+import hashlib
+import os
+import re
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import downsample
+from data_processor import SaunaDataProcessor
+from run_processor import (ANALYSIS_STAGES, DATA_DIR, LOAD_STAGES, discover_files, file_month, load_tables,
+                           run_analyses)
+
+DASHBOARD_SECTIONS = ["labels", "metrics", "members", "utilization", "competitors", "finance"]
+
+DAYS_OF_WEEK = ["月", "火", "水", "木", "金", "土", "日"]
+WEEKDAY_JP = {
+    "Monday": "月", "Tuesday": "火", "Wednesday": "水", "Thursday": "木",
+    "Friday": "金", "Saturday": "土", "Sunday": "日",
+}
+TIME_SLOTS = ["9-12時", "12-15時", "15-18時", "18-21時", "21-24時"]
+TIME_SLOT_BINS = [9, 12, 15, 18, 21, 24]
+DEFAULT_ROOMS = ["Room1", "Room2", "Room3"]
+
+# 月末時点の会員数（SaunaDataProcessor.member_status_series の列）→ 会員推移グラフの系列名
+TREND_SERIES = {"active": "会員", "trial": "体験者", "visitor": "ビジター"}
+# 売上カテゴリ（精算時点の会員ステータス）→ 会員種別売上のキー。合計が総売上と一致するよう全カテゴリを載せる
+SALES_TYPE_NAMES = {"member": "会員", "visitor": "ビジター", "trial": "トライアル", "former": "退会会員", "other": "その他"}
+# 時系列グラフの系列名 → 依存する分析ステージ（run_processor.ANALYSIS_STAGES のキー）
+TIMESERIES = {
+    "occupancy": ["occupancy"],        # 枠ごとの稼働率（ルーム別）
+    "occupancy_daily": ["occupancy"],  # 日別の平均稼働率（ルーム別）
+    "sales_daily": ["sales"],          # 日別の売上合計
+}
+
+
+def _round(value, digits: int = 1):
+    if value is None or pd.isna(value):
+        return None
+    if digits == 0:
+        return int(round(float(value)))
+    return round(float(value), digits)
+
+
+def _room_names(processor) -> List[str]:
+    frame = getattr(processor, "frame_data", None)
+    col = processor.frame_cols["space_name"]
+    if frame is None or col not in frame.columns:
+        return list(DEFAULT_ROOMS)
+    return sorted(str(r) for r in frame[col].dropna().unique())
+
+
+def _months(results: Dict) -> List[str]:
+    months = set()
+    for stats in results.get("occupancy", {}).get("byRoom", {}).values():
+        months.update(stats.get("monthly", {}))
+    months.update(results.get("sales", {}).get("monthly_sales", {}))
+    for counts in results.get("reservations", {}).get("monthly_stats", {}).values():
+        months.update(counts)
+    return sorted(m for m in months if isinstance(m, str))
+
+
+def member_status_series(processor, dates: List[str]) -> List[Dict]:
+    """
+    基準日 dates（YYYY-MM-DD）ごとの会員数（active / trial / former / visitor）を返す
+
+    全基準日を processor.member_status_series で一度に評価する。日付として解釈できない値は ValueError。
+    """
+    days = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+    counts = processor.member_status_series(days)
+    return [{"date": date, **{column: int(value) for column, value in row.items()}}
+            for date, (_, row) in zip(days.strftime("%Y-%m-%d"), counts.iterrows())]
+
+
+def build_members(processor, results: Dict) -> Dict:
+    status = results.get("member_status", {})
+    gender = status.get("gender_distribution", {})
+    age_groups = status.get("age_distribution", {}).get("groups", {})
+
+    members = {
+        "total": status.get("total_members", 0),
+        "active": status.get("current_members", 0),
+        "trial": status.get("trial_count", 0),
+        "visitor": status.get("visitor_count", 0),
+        "joinRate": status.get("conversion_rate", 0),
+        "churnRate": status.get("churn_rate", 0),
+        "genderDistribution": [{"name": str(k), "value": int(v)} for k, v in gender.items()],
+        "ageDistribution": [{"name": k, "value": int(v)} for k, v in age_groups.items()],
+        # 会員データに地域の列がないため空のままにする
+        "regionDistribution": [],
+        "membershipTrend": [],
+    }
+
+    # 各月末（基準日の月は基準日）時点の会員・体験者・ビジター数。全月を一度に評価する
+    if getattr(processor, "member_data", None) is not None:
+        reference_date = processor.reference_date
+        months = [m for m in _months(results) if m <= reference_date.strftime("%Y-%m")]
+        dates = [min(pd.Period(m, freq="M").end_time.normalize(), reference_date) for m in months]
+        counts = processor.member_status_series(dates)
+        for month, (_, row) in zip(months, counts.iterrows()):
+            entry = {"name": month}
+            for column, series in TREND_SERIES.items():
+                entry[series] = int(row[column])
+            members["membershipTrend"].append(entry)
+    return members
+
+
+def build_utilization(processor, results: Dict, rooms: List[str]) -> Dict:
+    occupancy = results.get("occupancy", {})
+    by_room = occupancy.get("byRoom", {})
+
+    utilization = {
+        "rooms": {},
+        "byMonth": [],
+        "byDayOfWeek": [],
+        "byTimeSlot": [],
+        "overall_average": _round(occupancy.get("overall")),
+    }
+
+    frame = getattr(processor, "frame_data", None)
+    rate_col = processor.frame_cols["occupancy_rate"]
+    room_col = processor.frame_cols["space_name"]
+    if frame is not None and {rate_col, room_col} <= set(frame.columns):
+        for room, average in frame.groupby(room_col)[rate_col].mean().items():
+            utilization["rooms"][str(room)] = {"average": _round(average), "label": str(room)}
+
+    months = sorted({m for stats in by_room.values() for m in stats.get("monthly", {})})
+    for month in months:
+        entry = {"name": month}
+        for room in rooms:
+            entry[room] = _round(by_room.get(room, {}).get("monthly", {}).get(month))
+        utilization["byMonth"].append(entry)
+
+    for weekday, day in WEEKDAY_JP.items():
+        entry = {"name": day}
+        for room in rooms:
+            entry[room] = _round(by_room.get(room, {}).get("weekday", {}).get(weekday))
+        utilization["byDayOfWeek"].append(entry)
+
+    start_col = processor.frame_cols["start_time"]
+    if frame is not None and {rate_col, room_col, start_col} <= set(frame.columns):
+        hours = pd.to_numeric(frame[start_col].astype(str).str.split(":").str[0], errors="coerce")
+        slots = pd.cut(hours, bins=TIME_SLOT_BINS, labels=TIME_SLOTS, right=False)
+        table = frame.groupby([slots, frame[room_col]], observed=False)[rate_col].mean().unstack()
+        for slot in TIME_SLOTS:
+            entry = {"name": slot}
+            for room in rooms:
+                value = table.at[slot, room] if slot in table.index and room in table.columns else None
+                entry[room] = _round(value)
+            utilization["byTimeSlot"].append(entry)
+    return utilization
+
+
+def build_finance(processor, results: Dict) -> Dict:
+    sales = results.get("sales", {})
+    by_category = sales.get("sales_by_category", {})
+    by_room = sales.get("sales_by_room", {})
+
+    # 原価データがないため利益系の値は出力しない（画面側の既定表示に任せる）
+    finance = {
+        "summary": {},
+        "latest_month": {},
+        "monthly_trend": [],
+        "salesByType": {name: _round(by_category.get(key, 0), 0) for key, name in SALES_TYPE_NAMES.items()},
+        "salesByRoom": {room: _round(by_room.get(room, 0), 0) for room in DEFAULT_ROOMS},
+        "dailySales": [],
+    }
+
+    data = getattr(processor, "sales_data", None)
+    amount_col = processor.sales_cols["amount"]
+    date_col = processor.sales_cols["transaction_datetime"]
+    if data is None or "month" not in data.columns or amount_col not in data.columns:
+        return finance
+
+    monthly = data.groupby("month")[amount_col].agg(["sum", "mean"]).sort_index()
+    finance["monthly_trend"] = [{"name": month, "売上": _round(row["sum"], 0)} for month, row in monthly.iterrows()]
+    if len(monthly):
+        latest = monthly.index[-1]
+        finance["latest_month"] = {
+            "month": latest,
+            "sales": _round(monthly.at[latest, "sum"], 0),
+            "average_value": _round(monthly.at[latest, "mean"], 0),
+        }
+        finance["summary"] = {"latestMonth": latest, "monthlySales": finance["latest_month"]["sales"]}
+
+    if date_col in data.columns:
+        weekday_sales = data.groupby(data[date_col].dt.dayofweek)[amount_col].sum()
+        finance["dailySales"] = [
+            {"name": day, "売上": _round(weekday_sales.get(i, 0), 0)} for i, day in enumerate(DAYS_OF_WEEK)
+        ]
+    return finance
+
+
+def build_timeseries(processor, name: str) -> Optional[pd.DataFrame]:
+    """
+    時系列グラフ用の全期間の系列を返す（インデックス = 日時、列 = 系列名）
+
+    間引く前の値のため、呼び出し側で downsample.downsample_frame に渡して点数を減らす。
+    データがない場合は None。
+    """
+    if name not in TIMESERIES:
+        raise ValueError(f"未対応の系列です: {name}（対応: {', '.join(TIMESERIES)}）")
+
+    if name.startswith("occupancy"):
+        frame = getattr(processor, "frame_data", None)
+        date_col = processor.frame_cols["lesson_datetime"]
+        room_col = processor.frame_cols["space_name"]
+        rate_col = processor.frame_cols["occupancy_rate"]
+        if frame is None or not {date_col, room_col, rate_col} <= set(frame.columns):
+            return None
+        when = frame[date_col].dt.normalize()
+        start_col = processor.frame_cols["start_time"]
+        if name == "occupancy" and start_col in frame.columns:
+            when = when + pd.to_timedelta(frame[start_col].astype(str) + ":00", errors="coerce")
+        series = frame.groupby([when.rename("time"), frame[room_col].astype(str)])[rate_col].mean()
+        return series.unstack().sort_index()
+
+    data = getattr(processor, "sales_data", None)
+    date_col = processor.sales_cols["transaction_datetime"]
+    amount_col = processor.sales_cols["amount"]
+    if data is None or not {date_col, amount_col} <= set(data.columns):
+        return None
+    daily = data.groupby(data[date_col].dt.normalize().rename("time"))[amount_col].sum()
+    return daily.to_frame("売上").sort_index()
+
+
+def build_dashboard(processor, results: Dict, competitors: Optional[Dict] = None) -> Dict:
+    """
+    分析結果（run_processor.run_analyses の戻り値）をDashboardDataの形に変換する
+
+    processor は分析済みのもの（analyze_sales で month 列が付与された状態）を渡す。
+    会員推移は processor.member_status_series で各月末時点の人数を一度に求める。
+    competitors は外部データのため呼び出し側から渡す。
+    """
+    rooms = _room_names(processor)
+    members = build_members(processor, results)
+    status = results.get("member_status", {})
+    genders = [item["name"] for item in members["genderDistribution"]]
+
+    return {
+        "labels": {
+            "months": _months(results),
+            "daysOfWeek": list(DAYS_OF_WEEK),
+            "timeSlots": list(TIME_SLOTS),
+            "roomNames": rooms,
+            "ageGroups": [item["name"] for item in members["ageDistribution"]],
+            "genders": genders or ["男性", "女性"],
+        },
+        "metrics": {
+            "total_members": status.get("total_members", 0),
+            "active_members": status.get("current_members", 0),
+            "join_rate": status.get("conversion_rate", 0),
+            "churn_rate": status.get("churn_rate", 0),
+        },
+        "members": members,
+        "utilization": build_utilization(processor, results, rooms),
+        "competitors": competitors or {},
+        "finance": build_finance(processor, results),
+    }
+
+
+def build_month_slices(dashboard: Dict, results: Dict) -> Dict[str, Dict]:
+    """ダッシュボードデータから月ごとの値だけを切り出す（{YYYY-MM: データ}）"""
+    trend = {e["name"]: e for e in dashboard["members"].get("membershipTrend", [])}
+    utilization = {e["name"]: e for e in dashboard["utilization"].get("byMonth", [])}
+    sales = {e["name"]: e for e in dashboard["finance"].get("monthly_trend", [])}
+    reservations = results.get("reservations", {}).get("monthly_stats", {})
+
+    slices = {}
+    for month in dashboard["labels"]["months"]:
+        slices[month] = {
+            "month": month,
+            "members": trend.get(month, {"name": month}),
+            "utilization": utilization.get(month, {"name": month}),
+            "finance": sales.get(month, {"name": month}),
+            "reservations": {category: int(counts.get(month, 0)) for category, counts in reservations.items()},
+        }
+    return slices
+
+
+# ---------------------------------------------------------------------------
+# データディレクトリからの一括組み立て
+# ---------------------------------------------------------------------------
+DASHBOARD_CACHE_SIZE = int(os.environ.get("SAUNA_DASHBOARD_CACHE_SIZE", 8))
+REFERENCE_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def data_fingerprint(files: Dict[str, List[str]]) -> str:
+    """
+    読み込むCSVの一覧と (更新時刻, サイズ) から作るハッシュ（discover_files の戻り値を渡す）
+
+    stat だけで求めるため、ファイルを読まずに「データが変わったか」を判定できる。
+    """
+    digest = hashlib.sha256()
+    for table in sorted(files):
+        for path in files[table]:
+            stat = os.stat(path)
+            digest.update(f"{table}:{os.path.basename(path)}:{stat.st_mtime_ns}:{stat.st_size}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class DashboardBuilder:
+    """
+    データディレクトリのCSV → 全分析 → DashboardData を一括で作り、(データの指紋, 基準日) ごとにキャッシュする
+
+    テーブルの読み込みはスレッド、独立した分析ステージは fork したプロセスで並列に実行する
+    （run_processor の --jobs と同じ仕組み）。CSVが変わるか基準日が変わるまでは計算し直さない。
+
+    Webサーバーのようにスレッドを多数持つプロセスから fork すると、他のスレッドが持っていた
+    ロック（メトリクス・ログ・BLAS）が子プロセスで解放されずデッドロックしうるため、
+    その場合は processes=False にして分析を直列に実行する。
+    """
+
+    def __init__(self, data_dir: Optional[str] = None, jobs: Optional[int] = None,
+                 cache_size: int = DASHBOARD_CACHE_SIZE, competitors: Optional[Dict] = None,
+                 processes: bool = True):
+        # data_layer は dashboard_builder を読み込むため、ここで遅延インポートする
+        from data_layer import VersionedCache
+
+        self.data_dir = data_dir or DATA_DIR
+        self.jobs = jobs or min(len(ANALYSIS_STAGES), os.cpu_count() or 1)
+        self.cache = VersionedCache(cache_size, name="dashboard")
+        # 時系列グラフ用の系列と間引いた結果（ダッシュボードのキャッシュを押し出さないよう分けて持つ）
+        self.series_cache = VersionedCache(name="dashboard_timeseries")
+        self._competitors = competitors
+        self.processes = processes
+
+    @classmethod
+    def from_env(cls, competitors: Optional[Dict] = None, processes: bool = True) -> "DashboardBuilder":
+        jobs = int(os.environ.get("SAUNA_DASHBOARD_JOBS", 0)) or None
+        return cls(os.environ.get("SAUNA_DATA_DIR", DATA_DIR), jobs, competitors=competitors, processes=processes)
+
+    def competitors(self) -> Dict:
+        if self._competitors is None:
+            from run_processor import load_competitors
+            self._competitors = load_competitors()
+        return self._competitors
+
+    def build(self, reference_date: Optional[str] = None) -> Optional[Dict]:
+        """
+        基準日 reference_date（YYYY-MM-DD。省略時は当日。データの期間外は ValueError）の DashboardData を返す
+
+        Returns:
+            {"fingerprint", "reference_date", "dashboard", "results", "processor", "timings"}。
+            results は分析ステージごとの結果（run_processor.run_analyses の戻り値）、processor は
+            読み込み済みの SaunaDataProcessor（基準日ごとの会員数などの追加の集計に使う。分析中に
+            付与される member_features は processes=False のときのみ。fork した場合は子プロセスに残るため None）。
+            CSVが1つもない場合は None
+        """
+        files = discover_files(self.data_dir)
+        if not any(files.values()):
+            return None
+        reference = self._reference(reference_date, files)
+        fingerprint = data_fingerprint(files)
+        return self.cache.get_or_compute((fingerprint, reference),
+                                         lambda: self._build(files, fingerprint, reference))
+
+    @staticmethod
+    def _reference(reference_date: Optional[str], files: Dict[str, List[str]]) -> str:
+        """
+        基準日を確認して YYYY-MM-DD で返す（省略時は当日）
+
+        基準日ごとに全分析をやり直してキャッシュするため、指定できるのは日単位で、
+        ファイル名の年月から分かるデータの期間内の日付に限る（それ以外は ValueError）。
+        """
+        if not reference_date:
+            return pd.Timestamp.now().strftime("%Y-%m-%d")
+        if not REFERENCE_DATE_PATTERN.fullmatch(reference_date):
+            raise ValueError(f"基準日は YYYY-MM-DD で指定してください: {reference_date}")
+        day = pd.Timestamp(reference_date)
+        months = sorted(m for paths in files.values() for m in (file_month(os.path.basename(p)) for p in paths) if m)
+        if months and not months[0] <= day.strftime("%Y-%m") <= months[-1]:
+            raise ValueError(f"基準日はデータの期間（{months[0]}〜{months[-1]}）内で指定してください: {reference_date}")
+        return day.strftime("%Y-%m-%d")
+
+    def timeseries(self, name: str, start: Optional[str] = None, end: Optional[str] = None,
+                   width: Optional[int] = downsample.DEFAULT_WIDTH, method: str = downsample.DEFAULT_METHOD,
+                   reference_date: Optional[str] = None) -> Optional[Dict]:
+        """
+        時系列 name（TIMESERIES のキー）を期間で絞り込み、表示幅に合わせて間引いた結果を返す
+
+        全期間の系列と間引いた結果は (データの指紋, 基準日) ごとに使い回す。
+        CSVがない場合や、系列の元になるデータがない場合は None。
+        """
+        built = self.build(reference_date)
+        if built is None:
+            return None
+        key = (built["fingerprint"], built["reference_date"], name)
+        frame = self.series_cache.get_or_compute(("timeseries",) + key,
+                                                 lambda: build_timeseries(built["processor"], name))
+        if frame is None or frame.empty:
+            return None
+        width = downsample.normalize_width(width)
+        return self.series_cache.get_or_compute(("downsampled",) + key + (start, end, width, method),
+                                                lambda: downsample.downsample_frame(frame, start, end, width, method))
+
+    def _build(self, files: Dict[str, List[str]], fingerprint: str, reference: str) -> Dict:
+        started = time.perf_counter()
+        processor = SaunaDataProcessor()
+        processor.set_reference_date(reference)
+        timings = load_tables(processor, LOAD_STAGES, files, self.jobs)
+        results, analysis_timings = run_analyses(processor, list(ANALYSIS_STAGES),
+                                                 self.jobs if self.processes else 1)
+
+        build_started = time.perf_counter()
+        dashboard = build_dashboard(processor, results, self.competitors())
+        total = time.perf_counter() - started
+        timings += analysis_timings + [
+            {"stage": "build", "seconds": round(time.perf_counter() - build_started, 4)},
+            {"stage": "total", "seconds": round(total, 4)},
+        ]
+        print(f"[dashboard_builder] ダッシュボードデータを作成しました（基準日 {reference}, "
+              f"データ {fingerprint}, {total:.2f}秒）")
+        return {"fingerprint": fingerprint, "reference_date": reference, "dashboard": dashboard,
+                "results": results, "processor": processor, "timings": timings}
@@ -0,0 +1,261 @@
+"""
+ダッシュボード（Dash）が共有するデータ層
+
+データディレクトリのCSVを watcher.PartitionStore で読み込んで SaunaDataProcessor に渡し、
+分析ステージごとの結果とバージョンを保持する。CSVが変わると、変わったファイルだけを読み直し、
+影響を受ける分析だけを再計算してその分析のバージョンを上げる。
+
+グラフなど分析結果から作る値は VersionedCache にメモ化する。キーには値が依存する分析の
+バージョンを含めるため、入力が変わらない限り同じ値を返し、変わったものだけが作り直される。
+キャッシュは件数の上限を超えると最も長く使われていないものから捨てる。
+長期間の時系列（timeseries）は全期間の系列と、表示幅・期間ごとに間引いた結果を別々にメモ化する。
+
+result_store（diskcache.Cache など）を渡すと、分析結果を入力のCSVの (更新時刻, サイズ) と
+基準日をキーにディスクへ保存し、別のプロセス（Dash のバックグラウンド処理）で計算した結果を
+再計算せずに使う。
+
+環境変数:
+- SAUNA_DATA_DIR:            読み込むディレクトリ（既定 data）
+- SAUNA_REFERENCE_DATE:      基準日（省略時は当日）
+- SAUNA_FIGURE_CACHE_SIZE:   メモ化する値の上限件数（既定 256）
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import downsample
+import metrics
+from dashboard_builder import TIMESERIES, build_dashboard, build_timeseries
+from data_processor import SaunaDataProcessor
+from run_processor import ANALYSIS_METHODS, ANALYSIS_STAGES, DATA_DIR
+from watcher import PartitionStore, affected_analyses, classify_file
+
+FIGURE_CACHE_SIZE = int(os.environ.get("SAUNA_FIGURE_CACHE_SIZE", 256))
+# CSVの変更を確認する間隔（秒）。これより短い間隔の refresh はファイル一覧を見ない
+CHECK_INTERVAL = 5.0
+# ディスクに保存した分析結果を残す秒数
+RESULT_EXPIRE = 7 * 24 * 60 * 60
+
+ALL_ANALYSES = list(ANALYSIS_STAGES)
+
+
+class VersionedCache:
+    """
+    件数上限つきのLRUキャッシュ
+
+    同じキーを同時に計算しないよう、計算はキャッシュ全体のロックを持ったまま行う
+    （Dash のコールバックから呼ばれる程度の並行度を想定）。
+    """
+
+    def __init__(self, max_entries: int = FIGURE_CACHE_SIZE, name: str = "figure"):
+        self.max_entries = max_entries
+        self.name = name
+        self.entries: "OrderedDict[Hashable, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.record_cache_access(self.name, True)
+                return self.entries[key]
+
+            self.misses += 1
+            metrics.record_cache_access(self.name, False)
+            value = compute()
+            self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict:
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+class DataLayer:
+    """CSV → 分析結果 → ダッシュボードデータを保持し、分析ごとのバージョンで値をメモ化する"""
+
+    def __init__(self, data_dir: str = DATA_DIR, reference_date: Optional[str] = None,
+                 check_interval: float = CHECK_INTERVAL, cache_size: int = FIGURE_CACHE_SIZE,
+                 competitors: Optional[Dict] = None, result_store=None):
+        self.data_dir = data_dir
+        self.check_interval = check_interval
+        self.processor = SaunaDataProcessor()
+        if reference_date:
+            self.processor.set_reference_date(reference_date)
+        self.store = PartitionStore(data_dir, self.processor)
+        self.results: Dict[str, Dict] = {}
+        # 分析ステージごとのバージョン（再計算するたびに1つ上げる）
+        self.versions: Dict[str, int] = {stage: 0 for stage in ALL_ANALYSES}
+        self.cache = VersionedCache(cache_size)
+        # プロセス間で共有する分析結果（get / set / in が使えるもの。None なら保存しない）
+        self.result_store = result_store
+        self._competitors = competitors
+        self._checked_at: Optional[float] = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls, result_store=None) -> "DataLayer":
+        return cls(os.environ.get("SAUNA_DATA_DIR", DATA_DIR), os.environ.get("SAUNA_REFERENCE_DATE"),
+                   result_store=result_store)
+
+    # ------------------------------------------------------------------
+    # 読み込みと再計算
+    # ------------------------------------------------------------------
+    def refresh(self, force: bool = False) -> List[str]:
+        """
+        CSVの変更を取り込み、再計算した分析ステージを返す
+
+        前回の確認から check_interval 秒以内なら何もしない（force=True で必ず確認する）。
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return []
+            self._checked_at = now
+
+            signatures = self.store.scan()
+            changes = self.store.refresh(signatures)
+            stale = affected_analyses(set(changes), ALL_ANALYSES)
+            for stage in stale:
+                started = time.perf_counter()
+                key = self._result_key(stage, signatures)
+                if self.result_store is not None and key in self.result_store:
+                    self.results[stage] = self.result_store.get(key)
+                    action = "保存済みの結果を読み込みました"
+                else:
+                    self.results[stage] = getattr(self.processor, ANALYSIS_METHODS[stage])()
+                    if self.result_store is not None:
+                        self.result_store.set(key, self.results[stage], expire=RESULT_EXPIRE)
+                    action = "再計算しました"
+                self.versions[stage] += 1
+                print(f"[data_layer] {stage} を{action}（{time.perf_counter() - started:.2f}秒, "
+                      f"バージョン {self.versions[stage]}）")
+            return stale
+
+    def pending(self) -> List[str]:
+        """
+        次の refresh で計算が必要になる分析ステージ（result_store に結果があるものは除く）
+
+        CSVの stat だけで判定するため、データを読み直さずに呼べる。
+        """
+        with self._lock:
+            signatures = self.store.scan()
+            known = self.store.signatures
+            paths = {p for p in set(signatures) | set(known) if signatures.get(p) != known.get(p)}
+            stale = affected_analyses({classify_file(os.path.basename(p)) for p in paths}, ALL_ANALYSES)
+            if self.result_store is None:
+                return stale
+            return [stage for stage in stale if self._result_key(stage, signatures) not in self.result_store]
+
+    def _result_key(self, stage: str, signatures: Dict[str, Tuple[int, int]]) -> Tuple[str, str, str]:
+        """分析ステージの結果を保存するキー（入力のテーブルのCSVの (更新時刻, サイズ) と基準日のハッシュ）"""
+        tables = set(ANALYSIS_STAGES[stage])
+        if "member" in tables:
+            tables.add("member_delete")
+        digest = hashlib.sha256(self.processor.reference_date.strftime("%Y-%m-%d").encode("utf-8"))
+        for path, (mtime, size) in sorted(signatures.items()):
+            name = os.path.basename(path)
+            if classify_file(name) in tables:
+                digest.update(f"{name}:{mtime}:{size}\n".encode("utf-8"))
+        return ("analysis", stage, digest.hexdigest()[:16])
+
+    def file_signature(self) -> str:
+        """
+        データディレクトリのCSVの一覧と (更新時刻, サイズ) から作るハッシュ
+
+        ファイルを読まずに stat だけで求めるため、データを読み込んでいないプロセスでも
+        「データが変わったか」の判定（バックグラウンド処理の結果のキャッシュキー）に使える。
+        """
+        digest = hashlib.sha256()
+        for path, (mtime, size) in sorted(self.store.scan().items()):
+            digest.update(f"{os.path.basename(path)}:{mtime}:{size}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def version(self, inputs: Iterable[str] = ALL_ANALYSES) -> Tuple[int, ...]:
+        """指定した分析ステージのバージョンの組（値のキャッシュキーに使う）"""
+        return tuple(self.versions[stage] for stage in inputs)
+
+    @property
+    def data_version(self) -> int:
+        """いずれかの分析が再計算されるたびに増える通し番号"""
+        return sum(self.versions.values())
+
+    # ------------------------------------------------------------------
+    # メモ化
+    # ------------------------------------------------------------------
+    def memo(self, name: str, inputs: Iterable[str], compute: Callable[[], object], *params: Hashable):
+        """
+        inputs の分析のバージョンと params が同じ間は compute の結果を使い回す
+
+        compute は初回（または inputs のいずれかが再計算された後）にだけ呼ばれる。
+        キャッシュのロックを持ったまま呼ぶため、compute から refresh / dashboard は呼ばないこと。
+        """
+        inputs = tuple(inputs)
+        with self._lock:
+            key = (name, self.version(inputs), params)
+        return self.cache.get_or_compute(key, compute)
+
+    def competitors(self) -> Dict:
+        if self._competitors is None:
+            from run_processor import load_competitors
+            self._competitors = load_competitors()
+        return self._competitors
+
+    def result(self, stage: str) -> Dict:
+        """分析ステージの最新の結果（ダッシュボードデータに含まれない分析の表示用）"""
+        with self._lock:
+            self.refresh()
+            return self.results.get(stage) or {}
+
+    def dashboard(self) -> Dict:
+        """DashboardData の形に組み立てたデータ（いずれかの分析が変わるまで使い回す）"""
+        with self._lock:
+            self.refresh()
+            return self.memo("dashboard", ALL_ANALYSES,
+                             lambda: build_dashboard(self.processor, self.results, self.competitors()))
+
+    def figure(self, name: str, inputs: Iterable[str], build: Callable, *params: Hashable):
+        """
+        build(ダッシュボードデータ, *params) の結果をメモ化して返す
+
+        ダッシュボードデータとキーのバージョンは同じ時点のものを使うため、計算中に
+        CSVが更新されても古いデータの図が新しいバージョンとして残ることはない。
+        """
+        inputs = tuple(inputs)
+        with self._lock:
+            dashboard = self.dashboard()
+            key = (name, self.version(inputs), params)
+        return self.cache.get_or_compute(key, lambda: build(dashboard, *params))
+
+    def timeseries(self, name: str, start: Optional[str] = None, end: Optional[str] = None,
+                   width: Optional[int] = downsample.DEFAULT_WIDTH, method: str = downsample.DEFAULT_METHOD) -> Dict:
+        """
+        時系列 name を期間 start〜end で絞り込み、表示幅 width に合わせて間引いた結果
+
+        全期間の系列は依存する分析のバージョンごとに1回だけ作り、間引いた結果は
+        (期間, 幅, 方法) ごとにメモ化する。幅は downsample.normalize_width で丸めてからキーにする。
+        """
+        inputs = TIMESERIES[name]
+        if method not in downsample.METHODS:
+            raise ValueError(f"未対応の間引き方法です: {method}（対応: {', '.join(downsample.METHODS)}）")
+        width = downsample.normalize_width(width)
+        with self._lock:
+            self.refresh()
+            frame = self.memo(f"timeseries:{name}", inputs, lambda: build_timeseries(self.processor, name))
+            return self.memo(f"downsampled:{name}", inputs,
+                             lambda: downsample.downsample_frame(frame, start, end, width, method),
+                             start, end, width, method)
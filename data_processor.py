@@ -1,7 +1,191 @@
 import pandas as pd
 import numpy as np
+import functools
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+from metrics import get_process_rss_bytes
+
+# 読み込み中のRSSを測る間隔（秒）。これより短い一時的な増加は取りこぼすことがある
+MEMORY_SAMPLE_INTERVAL = 0.01
+# ユニーク値の割合がこれ以下の文字列列はカテゴリ型への変換を提案する
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+MB = 1024 * 1024
+
+# 年齢区分（両端を含む）
+AGE_RANGES = {
+    '~19歳': (0, 19),
+    '20~29歳': (20, 29),
+    '30~39歳': (30, 39),
+    '40~49歳': (40, 49),
+    '50~59歳': (50, 59),
+    '60歳~': (60, 120)
+}
+
+# ステータスの変化（status_timeline）。同じ時刻では値の大きいものを後の状態とする
+STATUS_EVENT_ORDER = {'trial': 0, 'member': 1, 'former': 2}
+# 取引・予約の時点のステータス（tag_status_at の値）
+POINT_IN_TIME_STATUSES = ['trial', 'member', 'visitor', 'former', 'other']
+# 来店として数える予約ステータス（dummy_user_ids の無断キャンセルも来店扱い）
+VISIT_STATUSES = ['チェックイン', 'チェックアウト']
+# 体験からの日数の区分（区間の左端を含む）。転換までの日数のヒストグラムに使う
+CONVERSION_DAY_BINS = [0, 1, 8, 15, 31, 61, 91, 181, 366, np.inf]
+CONVERSION_DAY_LABELS = ['当日', '1週間以内', '2週間以内', '1か月以内', '2か月以内', '3か月以内', '半年以内', '1年以内', '1年超']
+# RFMスコア（1〜5）の段階数
+RFM_LEVELS = 5
+# RFMセグメント（上から順に判定し、最初に当てはまったものにする。R・F はスコア）
+RFM_SEGMENTS = [
+    ('優良', lambda r, f: (r >= 4) & (f >= 4)),
+    ('安定', lambda r, f: (r >= 3) & (f >= 3)),
+    ('新規', lambda r, f: (r >= 4) & (f <= 1)),
+    ('育成', lambda r, f: r >= 3),
+    ('休眠優良', lambda r, f: (r <= 1) & (f >= 4)),
+    ('離反リスク', lambda r, f: f >= 3),
+    ('休眠', lambda r, f: np.ones_like(r, dtype=bool)),
+]
+
+
+def _track_load_memory(method):
+    """load_*_data の所要時間と実行中のピークRSSを self.load_stats に記録する"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        before = get_process_rss_bytes()
+        peak = [before]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(MEMORY_SAMPLE_INTERVAL):
+                peak[0] = max(peak[0], get_process_rss_bytes())
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            done.set()
+            sampler.join()
+            after = get_process_rss_bytes()
+            peak_rss = max(peak[0], after)
+            self.load_stats[method.__name__] = {
+                'seconds': round(time.perf_counter() - started, 4),
+                'rss_before_mb': round(before / MB, 2),
+                'rss_peak_mb': round(peak_rss / MB, 2),
+                'rss_after_mb': round(after / MB, 2),
+                'peak_increase_mb': round((peak_rss - before) / MB, 2),
+            }
+    return wrapper
+
+
+def _suggest_dtype(series: pd.Series) -> Tuple[Optional[str], Optional[int]]:
+    """
+    メモリを減らせる型と、その型に変換した場合のバイト数を返す（提案がなければ (None, None)）
+
+    文字列はユニーク値が少なければカテゴリ型、整数は値の範囲に収まる最小の整数型、
+    整数値しか持たない浮動小数点（欠損ありを含む）は整数型（欠損ありはIntN）を提案する。
+    """
+    values = series.dropna()
+    if len(values) == 0:
+        return None, None
+
+    if series.dtype == object:
+        if values.nunique() / len(series) > CATEGORY_MAX_UNIQUE_RATIO:
+            return None, None
+        target = 'category'
+    elif pd.api.types.is_integer_dtype(series.dtype):
+        target = str(pd.to_numeric(values.astype('int64'), downcast='integer').dtype)
+    elif pd.api.types.is_float_dtype(series.dtype):
+        if not np.all(np.mod(values.to_numpy(), 1) == 0):
+            return None, None
+        target = str(pd.to_numeric(values.astype('int64'), downcast='integer').dtype)
+    else:
+        return None, None
+
+    if target != 'category' and len(values) < len(series):
+        target = target.capitalize()  # 欠損を保てる pandas の IntN 型
+
+    if target == str(series.dtype):
+        return None, None
+    return target, int(series.astype(target).memory_usage(deep=True, index=False))
+
+
+def _month_number(dates: pd.Series) -> np.ndarray:
+    """日付を通しの月番号（年*12+月-1）にする。欠損は NaN"""
+    return (dates.dt.year * 12 + dates.dt.month - 1).to_numpy(dtype=np.float64)
+
+
+def _age_bands(ages: pd.Series) -> pd.Series:
+    """年齢を AGE_RANGES の区分名にする（範囲外・欠損は None）"""
+    ages = pd.to_numeric(ages, errors='coerce')
+    conditions = [(ages >= low) & (ages <= high) for low, high in AGE_RANGES.values()]
+    return pd.Series(np.select(conditions, list(AGE_RANGES), default=None), index=ages.index)
+
+
+def _rfm_score(values: pd.Series, higher_is_better: bool = True) -> np.ndarray:
+    """値の順位（パーセンタイル）を 1〜RFM_LEVELS の int8 スコアにする（同値は最も低い順位にそろえる）"""
+    pct = values.rank(method='min', pct=True, ascending=higher_is_better).to_numpy()
+    return np.clip(np.ceil(pct * RFM_LEVELS), 1, RFM_LEVELS).astype(np.int8)
+
+
+def _compact(df: pd.DataFrame) -> pd.DataFrame:
+    """数値列を値の範囲に収まる最小の型にする（浮動小数点は float32）"""
+    for col in df.columns:
+        if pd.api.types.is_integer_dtype(df[col].dtype):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_float_dtype(df[col].dtype):
+            df[col] = df[col].astype(np.float32)
+    return df
+
+
+def _day_histogram(days: pd.Series) -> List[Dict]:
+    """日数を CONVERSION_DAY_BINS で区分した件数（[{name, count}]、欠損は数えない）"""
+    bins = pd.cut(days.dropna(), bins=CONVERSION_DAY_BINS, labels=CONVERSION_DAY_LABELS, right=False)
+    counts = bins.value_counts(sort=False)
+    return [{'name': label, 'count': int(counts.get(label, 0))} for label in CONVERSION_DAY_LABELS]
+
+
+def _survival_table(durations: np.ndarray, churned: np.ndarray, groups: np.ndarray, n_groups: int) -> Dict[str, np.ndarray]:
+    """
+    月単位の Kaplan-Meier 推定をグループごとにまとめて行う
+
+    durations は在籍月数（整数）、churned は退会済みか（False は基準日で打ち切り）。
+    (グループ, 月数) ごとの退会数・打ち切り数を bincount で数え、逆順の累積和で
+    各月の在籍者数（リスク集合）を求める。戻り値はいずれも (グループ数, 最大月数+1) の配列。
+    """
+    width = int(durations.max()) + 1 if len(durations) else 1
+    index = groups * width + durations
+    size = n_groups * width
+    events = np.bincount(index[churned], minlength=size).reshape(n_groups, width)
+    censored = np.bincount(index[~churned], minlength=size).reshape(n_groups, width)
+    # 月数 t の時点で在籍していた人数 = 在籍月数が t 以上の人数
+    at_risk = (events + censored)[:, ::-1].cumsum(axis=1)[:, ::-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hazard = np.where(at_risk > 0, events / at_risk, 0.0)
+    survival = np.cumprod(1 - hazard, axis=1)
+    return {'at_risk': at_risk, 'events': events, 'censored': censored, 'hazard': hazard, 'survival': survival}
+
+
+def _survival_curve(table: Dict[str, np.ndarray], group: int) -> Dict:
+    """_survival_table の1グループ分を、在籍者がいる月までの曲線（%）にする"""
+    at_risk = table['at_risk'][group]
+    months = int(np.flatnonzero(at_risk)[-1]) + 1 if at_risk.any() else 0
+    survival = table['survival'][group][:months]
+    below_half = np.flatnonzero(survival <= 0.5)
+    return {
+        'members': int(at_risk[0]) if months else 0,
+        'churned': int(table['events'][group].sum()),
+        'censored': int(table['censored'][group].sum()),
+        'months': list(range(months)),
+        'at_risk': at_risk[:months].tolist(),
+        'churned_by_month': table['events'][group][:months].tolist(),
+        'survival': np.round(survival * 100, 2).tolist(),
+        'hazard': np.round(table['hazard'][group][:months] * 100, 2).tolist(),
+        # 継続率が50%以下になった最初の月（まだ下回っていなければ None）
+        'median_months': int(below_half[0]) if below_half.size else None,
+    }
+
 
 class SaunaDataProcessor:
     def __init__(self):
@@ -10,6 +194,8 @@ class SaunaDataProcessor:
         self.reservation_data = None
         self.frame_data = None
         self.sales_data = None
+        # 会員ごとの特徴量（analyze_member_value で作成。インデックスはメンバーID）
+        self.member_features = None
 
         # 実データのカラム名マッピング
         self.member_cols = {
@@ -20,7 +206,8 @@ class SaunaDataProcessor:
             'trial_datetime': 'トライアル 受講日時',
             'plan_start_date': 'プラン契約適用開始日',
             'plan_end_date': 'プラン契約適用終了日',
-            'contract_date': 'プラン契約日'  # JavaScriptコードに合わせて追加
+            'contract_date': 'プラン契約日',  # JavaScriptコードに合わせて追加
+            'plan_name': '契約プラン名'
         }
 
         self.reservation_cols = {
@@ -57,16 +244,26 @@ class SaunaDataProcessor:
         # 基準日の設定（デフォルトは現在日）
         self.reference_date = pd.Timestamp.now()
 
+        # load_*_data ごとの所要時間とRSS（memory_report で参照）
+        self.load_stats = {}
+
     def set_reference_date(self, date_str):
         """基準日を設定する"""
         self.reference_date = pd.to_datetime(date_str)
 
+    @_track_load_memory
     def load_member_data(self, member_path: str, member_delete_path: str = None) -> None:
         """会員データの読み込みと前処理"""
-        self.member_data = pd.read_csv(member_path, encoding='utf-8')
+        member_df = pd.read_csv(member_path, encoding='utf-8')
+        member_delete_df = pd.read_csv(member_delete_path, encoding='utf-8') if member_delete_path else None
+        self.set_member_tables(member_df, member_delete_df)
+
+    def set_member_tables(self, member_df: pd.DataFrame, member_delete_df: Optional[pd.DataFrame] = None) -> None:
+        """読み込み済みの会員データ（と削除済み会員データ）を前処理して保持する"""
+        self.member_data = member_df
 
-        if member_delete_path:
-            self.member_delete_data = pd.read_csv(member_delete_path, encoding='utf-8')
+        if member_delete_df is not None:
+            self.member_delete_data = member_delete_df
 
             # 除外リストに含まれる会員を削除
             if self.member_delete_data is not None:
@@ -93,6 +290,191 @@ class SaunaDataProcessor:
                 if col and col in self.member_delete_data.columns:
                     self.member_delete_data[col] = pd.to_datetime(self.member_delete_data[col], errors='coerce')
 
+    def memory_report(self) -> Dict:
+        """
+        読み込み済みテーブルのメモリ使用量を列ごとに集計する
+
+        文字列も中身まで数えた実メモリ（deep）で、型を変えた場合の見込みサイズと
+        削減量、load_*_data 実行中のピークRSSもあわせて返す。
+        """
+        tables = {}
+        for name in ['member', 'member_delete', 'reservation', 'frame', 'sales']:
+            data = getattr(self, f'{name}_data')
+            if data is None:
+                continue
+
+            rows = len(data)
+            columns = []
+            for col in data.columns:
+                col_bytes = int(data[col].memory_usage(deep=True, index=False))
+                suggested, projected = _suggest_dtype(data[col])
+                projected = col_bytes if projected is None else projected
+                columns.append({
+                    'column': col,
+                    'dtype': str(data[col].dtype),
+                    'bytes': col_bytes,
+                    'bytes_per_row': round(col_bytes / rows, 1) if rows else 0,
+                    'suggested_dtype': suggested,
+                    'projected_bytes': projected,
+                    'savings_bytes': col_bytes - projected,
+                })
+
+            index_bytes = int(data.index.memory_usage(deep=True))
+            total = index_bytes + sum(c['bytes'] for c in columns)
+            projected_total = index_bytes + sum(c['projected_bytes'] for c in columns)
+            tables[name] = {
+                'rows': rows,
+                'bytes': total,
+                'bytes_per_row': round(total / rows, 1) if rows else 0,
+                'projected_bytes': projected_total,
+                'savings_bytes': total - projected_total,
+                'columns': sorted(columns, key=lambda c: c['bytes'], reverse=True),
+            }
+
+        total = sum(t['bytes'] for t in tables.values())
+        projected_total = sum(t['projected_bytes'] for t in tables.values())
+        return {
+            'total_bytes': total,
+            'projected_bytes': projected_total,
+            'savings_bytes': total - projected_total,
+            'tables': tables,
+            'load_stats': dict(self.load_stats),
+        }
+
+    def status_timeline(self) -> pd.DataFrame:
+        """
+        会員ごとのステータスの変化を時刻順に並べた表（member, at, status）
+
+        トライアル受講日に trial、プラン契約適用開始日に member、適用終了日の翌日に former になる。
+        削除済み会員も、日付が残っていれば同じように含める。
+        """
+        member_id_col = self.member_cols['member_id']
+        events = [
+            ('trial', self.member_cols['trial_datetime'], pd.Timedelta(0)),
+            ('member', self.member_cols['plan_start_date'], pd.Timedelta(0)),
+            ('former', self.member_cols['plan_end_date'], pd.Timedelta(days=1)),
+        ]
+        parts = []
+        for table in [self.member_data, self.member_delete_data]:
+            if table is None or member_id_col not in table.columns:
+                continue
+            ids = pd.to_numeric(table[member_id_col], errors='coerce')
+            for status, col, offset in events:
+                if col in table.columns and pd.api.types.is_datetime64_any_dtype(table[col]):
+                    parts.append(pd.DataFrame({'member': ids, 'at': table[col].dt.normalize() + offset,
+                                               'status': status}))
+        if not parts:
+            return pd.DataFrame({'member': pd.Series(dtype=np.int64), 'at': pd.Series(dtype='datetime64[ns]'),
+                                 'status': pd.Series(dtype=object)})
+
+        timeline = pd.concat(parts, ignore_index=True).dropna()
+        timeline = timeline.astype({'member': np.int64, 'at': 'datetime64[ns]'})
+        timeline['order'] = timeline['status'].map(STATUS_EVENT_ORDER)
+        return timeline.sort_values(['at', 'order'], kind='stable').drop(columns='order').reset_index(drop=True)
+
+    def tag_status_at(self, member_ids: pd.Series, timestamps: pd.Series, visitor_ids=None,
+                      timeline: Optional[pd.DataFrame] = None) -> pd.Series:
+        """
+        各行（予約・取引）の時点の会員ステータスを返す（値は POINT_IN_TIME_STATUSES）
+
+        status_timeline をメンバーIDごとに as-of 結合（merge_asof）し、その時刻以前で
+        最後のステータスを付ける。トライアル前の購入（事前決済など）は、次のステータスが
+        trial なら trial とする。どのステータスにも当たらない行は、visitor_ids に含まれる
+        メンバーなら visitor、それ以外（メンバーID・日時が欠損した行を含む）は other。
+        """
+        if timeline is None:
+            timeline = self.status_timeline()
+        statuses = pd.Series('other', index=member_ids.index, dtype=object)
+        rows = pd.DataFrame({'member': pd.to_numeric(member_ids, errors='coerce'), 'at': timestamps}).dropna()
+        if rows.empty:
+            return statuses
+        rows = rows.astype({'member': np.int64, 'at': 'datetime64[ns]'}).sort_values('at')
+
+        latest = pd.merge_asof(rows, timeline, on='at', by='member', direction='backward')['status'].to_numpy()
+        upcoming = pd.merge_asof(rows, timeline[timeline['status'] == 'trial'], on='at', by='member',
+                                 direction='forward')['status'].to_numpy()
+        tagged = pd.Series(latest, index=rows.index).where(pd.notna(latest), pd.Series(upcoming, index=rows.index))
+        if visitor_ids is not None:
+            tagged = tagged.where(tagged.notna() | ~rows['member'].isin(visitor_ids), 'visitor')
+        statuses.loc[rows.index] = tagged.fillna('other')
+        return statuses
+
+    def _reservation_times(self) -> pd.Series:
+        """予約の日時（開始時刻つきの予約日時があればそれ、なければ受講日）"""
+        data = self.reservation_data
+        if '予約日時' in data.columns:
+            return data['予約日時']
+        return data[self.reservation_cols['reservation_datetime']]
+
+    def visitor_ids(self) -> np.ndarray:
+        """ビジターチケットで予約したことのあるメンバーID"""
+        if self.reservation_data is None:
+            return np.array([], dtype=np.int64)
+        ticket_col = self.reservation_cols['ticket_name']
+        if ticket_col not in self.reservation_data.columns:
+            return np.array([], dtype=np.int64)
+        is_visitor = self.reservation_data[ticket_col].astype(str).str.contains('ビジター', regex=False)
+        ids = pd.to_numeric(self.reservation_data.loc[is_visitor, self.reservation_cols['member_id']], errors='coerce')
+        return ids.dropna().astype(np.int64).unique()
+
+    def member_status_series(self, dates) -> pd.DataFrame:
+        """
+        複数の基準日での会員数（active / trial / former / visitor）を一度に求める
+
+        analyze_member_status と同じ分類を、基準日ごとに set_reference_date し直さずに評価する。
+        トライアル受講・プラン開始・プラン終了・ビジターとしての初回利用を日付単位のイベントとして
+        並べ替えておき、各基準日までのイベント数を searchsorted で数える（累積和の参照）。
+        基準日の数が増えても並べ替えは1回だけで、基準日の当日に起きたイベントは含める。
+
+        Returns:
+            インデックスが基準日、列が active / trial / former / visitor の DataFrame
+        """
+        dates = pd.DatetimeIndex(pd.to_datetime(list(dates))).normalize()
+        points = dates.to_numpy(dtype='datetime64[ns]')
+        series = pd.DataFrame(0, index=dates, columns=['active', 'trial', 'former', 'visitor'], dtype=np.int64)
+        if len(dates) == 0:
+            return series
+
+        def count_until(events: pd.Series) -> np.ndarray:
+            # 各基準日の当日までに起きたイベントの数
+            days = np.sort(events.dropna().dt.normalize().to_numpy(dtype='datetime64[ns]'))
+            return np.searchsorted(days, points, side='right')
+
+        trial_col = self.member_cols['trial_datetime']
+        deleted_trials = pd.Series(dtype='datetime64[ns]')
+        if self.member_delete_data is not None and trial_col in self.member_delete_data.columns:
+            deleted_trials = self.member_delete_data[trial_col]
+
+        if self.member_data is not None:
+            members = self.member_data
+            start_col = self.member_cols['plan_start_date']
+            end_col = self.member_cols['plan_end_date']
+            contract_col = self.member_cols.get('contract_date')
+            trials = members[trial_col]
+            starts = members[start_col]
+            if contract_col and contract_col in members.columns:
+                starts = starts.fillna(members[contract_col])
+            is_member = trials.notna() & starts.notna()
+            ends = members.loc[is_member, end_col] if end_col in members.columns else pd.Series(dtype='datetime64[ns]')
+
+            # 会員は開始日から在籍し、終了日の当日からは退会者（削除済み会員は体験日から退会者として扱う）
+            series['trial'] = count_until(pd.concat([trials, deleted_trials]))
+            series['active'] = count_until(starts[is_member]) - count_until(ends)
+            series['former'] = count_until(ends) + count_until(deleted_trials)
+
+        # ビジター: 会員でない時点でビジターチケットを使った最初の日
+        if self.reservation_data is not None:
+            ticket_col = self.reservation_cols['ticket_name']
+            member_col = self.reservation_cols['member_id']
+            if ticket_col in self.reservation_data.columns:
+                times = self._reservation_times()
+                status_at = self.tag_status_at(self.reservation_data[member_col], times)
+                is_visitor = (self.reservation_data[ticket_col].astype(str).str.contains('ビジター', regex=False)
+                              & (status_at != 'member'))
+                first_visits = times[is_visitor].groupby(self.reservation_data.loc[is_visitor, member_col]).min()
+                series['visitor'] = count_until(first_visits)
+        return series
+
     def analyze_member_status(self) -> Dict:
         """会員ステータスの分析"""
         if self.member_data is None:
@@ -124,57 +506,41 @@ class SaunaDataProcessor:
             'total': len(self.member_data) + (len(self.member_delete_data) if self.member_delete_data is not None else 0)
         }
 
-        # 通常会員データの分類
-        for _, member in self.member_data.iterrows():
-            member_id = member[member_id_col]
-
-            # 初回体験者として分類
-            if pd.notna(member[trial_col]):
-                categories['trial'].append(member_id)
-
-                # さらに、会員か退会者かを判定
-                if contract_col and pd.notna(member.get(contract_col)):
-                    if pd.notna(member[end_col]):
-                        if member[end_col] > reference_date:
-                            categories['active'].append(member_id)
-                        else:
-                            categories['former'].append(member_id)
-                    else:
-                        categories['active'].append(member_id)
-                # 契約日がない場合でも、開始日があれば判定
-                elif pd.notna(member[start_col]):
-                    if pd.notna(member[end_col]):
-                        if member[end_col] > reference_date:
-                            categories['active'].append(member_id)
-                        else:
-                            categories['former'].append(member_id)
-                    else:
-                        categories['active'].append(member_id)
-
-        # 削除された会員データの分類
-        if self.member_delete_data is not None:
-            for _, member in self.member_delete_data.iterrows():
-                member_id = member[member_id_col]
-
-                if pd.notna(member.get(trial_col)):
-                    categories['trial'].append(member_id)
-                    categories['former'].append(member_id)  # 削除されているので退会者として扱う
-
-        # 予約データからビジターを特定
+        # 通常会員データの分類（行ごとの判定をベクトル演算で行う。リストの並びは元データの行順）
+        members = self.member_data
+        has_trial = members[trial_col].notna()
+        has_plan = members[start_col].notna()
+        if contract_col and contract_col in members.columns:
+            has_plan = has_plan | members[contract_col].notna()
+        is_member = has_trial & has_plan
+        end_dates = members[end_col]
+        still_active = end_dates.isna() | (end_dates > reference_date)
+
+        categories['trial'] = members.loc[has_trial, member_id_col].tolist()
+        categories['active'] = members.loc[is_member & still_active, member_id_col].tolist()
+        categories['former'] = members.loc[is_member & ~still_active, member_id_col].tolist()
+
+        # 削除された会員データの分類（削除されているので退会者として扱う）
+        if self.member_delete_data is not None and trial_col in self.member_delete_data.columns:
+            deleted_trial = self.member_delete_data.loc[
+                self.member_delete_data[trial_col].notna(), member_id_col
+            ].tolist()
+            categories['trial'].extend(deleted_trial)
+            categories['former'].extend(deleted_trial)
+
+        # 予約データからビジターを特定（予約の時点で会員でなかったときにビジターチケットを使った人、初出順）
         if self.reservation_data is not None:
             ticket_col = self.reservation_cols['ticket_name']
             reservation_member_id_col = self.reservation_cols['member_id']
 
-            for _, reservation in self.reservation_data.iterrows():
-                member_id = reservation[reservation_member_id_col]
-                ticket_type = str(reservation.get(ticket_col, ''))
-
-                # チケットタイプでの分類
-                if ('ビジター' in ticket_type and
-                    member_id not in categories['active'] and
-                    member_id not in categories['former'] and
-                    member_id not in categories['visitor']):
-                    categories['visitor'].append(member_id)
+            if ticket_col in self.reservation_data.columns:
+                tickets = self.reservation_data[ticket_col].astype(str)
+            else:
+                tickets = pd.Series('', index=self.reservation_data.index)
+            reservation_members = self.reservation_data[reservation_member_id_col]
+            status_at = self.tag_status_at(reservation_members, self._reservation_times())
+            is_visitor = tickets.str.contains('ビジター', regex=False) & (status_at != 'member')
+            categories['visitor'] = reservation_members[is_visitor].drop_duplicates().tolist()
 
         # 性別分布
         gender_distribution = {}
@@ -189,17 +555,8 @@ class SaunaDataProcessor:
             age_distribution = age_data.describe().to_dict()
 
             # 年齢グループ分布も追加
-            age_ranges = {
-                '~19歳': (0, 19),
-                '20~29歳': (20, 29),
-                '30~39歳': (30, 39),
-                '40~49歳': (40, 49),
-                '50~59歳': (50, 59),
-                '60歳~': (60, 120)
-            }
-
             age_groups = {}
-            for group_name, (min_age, max_age) in age_ranges.items():
+            for group_name, (min_age, max_age) in AGE_RANGES.items():
                 age_groups[group_name] = len(age_data[(age_data >= min_age) & (age_data <= max_age)])
 
             age_distribution['groups'] = age_groups
@@ -226,40 +583,178 @@ class SaunaDataProcessor:
             'churn_rate': round(churn_rate, 2)
         }
 
-    def load_reservation_data(self, reservation_paths: List[str]) -> None:
-        """予約データの読み込みと前処理"""
-        dfs = []
-        for path in reservation_paths:
-            try:
-                df = pd.read_csv(path, encoding='utf-8')
+    def analyze_cohorts(self) -> Dict:
+        """
+        コホート別の会員継続率
+
+        トライアル受講月・プラン契約月ごとに会員をまとめ、コホートの月から N か月後に
+        プラン契約期間（適用開始月〜適用終了月、終了日なしは継続中）に入っている人数と割合を求める。
+        トライアルのコホートは入会しなかった人も分母に含むため、体験から会員として残った割合になる。
+        基準日の月より後のセルはまだ観測できないため None にする。
+        削除済み会員は契約期間がわからないため含めない。
+
+        各会員の在籍期間をコホート内の月のオフセット（整数）に直し、開始に+1・終了の翌月に-1を
+        bincount で積み上げて累積和をとるため、会員数に比例する計算量で全コホートを一度に求める。
+        """
+        if self.member_data is None:
+            return {}
+
+        members = self.member_data
+        start_col = self.member_cols['plan_start_date']
+        end_col = self.member_cols['plan_end_date']
+        if start_col not in members.columns:
+            return {}
+
+        reference_month = self.reference_date.year * 12 + self.reference_date.month - 1
+        start = _month_number(members[start_col])
+        if end_col in members.columns:
+            end = _month_number(members[end_col])
+        else:
+            end = np.full(len(members), np.nan)
+        # 終了日なし・基準日より後に終了する契約は基準月まで在籍として数える
+        end = np.fmin(np.where(np.isnan(end), reference_month, end), reference_month)
+
+        cohort_cols = {
+            'trial': self.member_cols['trial_datetime'],
+            'contract': self.member_cols.get('contract_date'),
+        }
+        results = {'reference_month': self.reference_date.strftime('%Y-%m')}
+        for name, col in cohort_cols.items():
+            if not col or col not in members.columns:
+                continue
+            cohort = _month_number(members[col])
+            valid = ~np.isnan(cohort) & (cohort <= reference_month)
+            if not valid.any():
+                continue
+
+            cohort = cohort[valid].astype(np.int64)
+            first_month = cohort.min()
+            rows = cohort - first_month
+            n_cohorts = rows.max() + 1
+            width = reference_month - first_month + 2
+            sizes = np.bincount(rows, minlength=n_cohorts)
+
+            # コホート月からのオフセットで在籍期間を表す（コホート月より前の在籍は0か月目から）
+            first = np.maximum(start[valid] - cohort, 0)
+            last = end[valid] - cohort
+            retained = (~np.isnan(first)) & (last >= first)
+            rows_kept = rows[retained]
+            first = first[retained].astype(np.int64)
+            last = last[retained].astype(np.int64)
+            diff = (np.bincount(rows_kept * width + first, minlength=n_cohorts * width)
+                    - np.bincount(rows_kept * width + last + 1, minlength=n_cohorts * width))
+            counts = diff.reshape(n_cohorts, width).cumsum(axis=1)[:, :width - 1]
+
+            offsets = np.arange(width - 1)
+            observable = (np.arange(n_cohorts)[:, None] + offsets[None, :]) <= (reference_month - first_month)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = np.round(counts / sizes[:, None] * 100, 2)
+
+            labels = [f"{(first_month + i) // 12}-{(first_month + i) % 12 + 1:02d}" for i in range(n_cohorts)]
+            nonempty = sizes > 0
+            results[name] = {
+                'cohorts': [label for label, keep in zip(labels, nonempty) if keep],
+                'sizes': sizes[nonempty].tolist(),
+                'offsets': offsets.tolist(),
+                'retained': [[int(c) if ok else None for c, ok in zip(row, mask)]
+                             for row, mask in zip(counts[nonempty], observable[nonempty])],
+                'retention': [[float(r) if ok else None for r, ok in zip(row, mask)]
+                              for row, mask in zip(rates[nonempty], observable[nonempty])],
+            }
+        return results
+
+    def analyze_survival(self) -> Dict:
+        """
+        会員継続曲線（Kaplan-Meier）と月別の退会ハザード
+
+        プラン契約適用開始日から適用終了日までを在籍月数（開始月と終了月を含む）とし、
+        終了日が基準日以前の会員を退会、終了日なし・基準日より後の会員を基準月で打ち切りとして扱う。
+        全体のほか、契約プラン名・性別・年齢区分ごとの曲線を返す（区分が欠損の会員は「不明」）。
+        survival[t] は t か月在籍した後も継続している割合、hazard[t] は t か月目に在籍していた
+        会員のうち、その月で退会した割合（いずれも%）。
+        """
+        if self.member_data is None:
+            return {}
+
+        members = self.member_data
+        start_col = self.member_cols['plan_start_date']
+        end_col = self.member_cols['plan_end_date']
+        if start_col not in members.columns:
+            return {}
+        members = members[members[start_col].notna() & (members[start_col] <= self.reference_date)]
+        if members.empty:
+            return {}
+
+        reference_month = self.reference_date.year * 12 + self.reference_date.month - 1
+        start = _month_number(members[start_col])
+        if end_col in members.columns:
+            end = _month_number(members[end_col])
+            churned = (members[end_col] <= self.reference_date).to_numpy()
+        else:
+            end = np.full(len(members), np.nan)
+            churned = np.zeros(len(members), dtype=bool)
+        last_month = np.where(churned, end, reference_month)
+        durations = np.maximum(last_month - start + 1, 0).astype(np.int64)
 
-                # 必要なカラムが存在するか確認
-                required_cols = [self.reservation_cols[col] for col in
-                               ['reservation_id', 'member_id', 'ticket_name', 'reservation_datetime', 'status']
-                               if self.reservation_cols[col] is not None]
+        unknown = pd.Series('不明', index=members.index)
+        plan_col = self.member_cols['plan_name']
+        gender_col = self.member_cols['gender']
+        age_col = self.member_cols['age']
+        breakdowns = {
+            'by_plan': members[plan_col] if plan_col in members.columns else unknown,
+            'by_gender': members[gender_col] if gender_col in members.columns else unknown,
+            'by_age': _age_bands(members[age_col]) if age_col in members.columns else unknown,
+        }
 
-                if all(col in df.columns for col in required_cols):
-                    # 日時データを結合
-                    if '開始時刻' in df.columns and '受講日' in df.columns:
-                        df['予約日時'] = df['受講日'] + ' ' + df['開始時刻']
+        overall = _survival_table(durations, churned, np.zeros(len(members), dtype=np.int64), 1)
+        results = {
+            'reference_date': self.reference_date.strftime('%Y-%m-%d'),
+            'overall': _survival_curve(overall, 0),
+        }
+        for name, labels in breakdowns.items():
+            codes, uniques = pd.factorize(labels.fillna('不明').astype(str), sort=True)
+            table = _survival_table(durations, churned, codes.astype(np.int64), len(uniques))
+            results[name] = {label: _survival_curve(table, i) for i, label in enumerate(uniques)}
+        return results
 
-                    dfs.append(df)
-            except Exception as e:
-                print(f"警告: {path}の読み込み中にエラーが発生しました: {e}")
+    @_track_load_memory
+    def load_reservation_data(self, reservation_paths: List[str]) -> None:
+        """予約データの読み込みと前処理"""
+        dfs = [self.read_reservation_partition(path) for path in reservation_paths]
+        self.set_reservation_partitions(dfs)
+
+    def read_reservation_partition(self, path: str) -> Optional[pd.DataFrame]:
+        """予約データ1ファイル分（1か月分）を読み込んで前処理する。読み込めない場合はNone"""
+        try:
+            return self.prepare_reservation_partition(pd.read_csv(path, encoding='utf-8'))
+        except Exception as e:
+            print(f"警告: {path}の読み込み中にエラーが発生しました: {e}")
+            return None
+
+    def prepare_reservation_partition(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """読み込み済みの予約データ1ファイル分を前処理する。必要なカラムがなければNone"""
+        # 必要なカラムが存在するか確認
+        required_cols = [self.reservation_cols[col] for col in
+                       ['reservation_id', 'member_id', 'ticket_name', 'reservation_datetime', 'status']
+                       if self.reservation_cols[col] is not None]
+
+        if not all(col in df.columns for col in required_cols):
+            return None
+
+        # 日時データを結合して日付列を変換
+        if '開始時刻' in df.columns and '受講日' in df.columns:
+            df['予約日時'] = pd.to_datetime(df['受講日'] + ' ' + df['開始時刻'], errors='coerce')
+        else:
+            date_col = self.reservation_cols['reservation_datetime']
+            df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+        return df
 
+    def set_reservation_partitions(self, partitions: List[Optional[pd.DataFrame]]) -> None:
+        """前処理済みの予約データ（ファイル単位）を結合して保持する"""
+        dfs = [df for df in partitions if df is not None]
         if dfs:
             self.reservation_data = pd.concat(dfs, ignore_index=True)
 
-            # 日付列の変換
-            if '予約日時' in self.reservation_data.columns:
-                self.reservation_data['予約日時'] = pd.to_datetime(
-                    self.reservation_data['予約日時'], errors='coerce'
-                )
-            elif self.reservation_cols['reservation_datetime'] in self.reservation_data.columns:
-                self.reservation_data[self.reservation_cols['reservation_datetime']] = pd.to_datetime(
-                    self.reservation_data[self.reservation_cols['reservation_datetime']], errors='coerce'
-                )
-
     def analyze_reservations(self) -> Dict:
         """予約データの分析"""
         if self.reservation_data is None:
@@ -309,6 +804,15 @@ class SaunaDataProcessor:
         # チケット種別分布
         ticket_distribution = self.reservation_data['ticket_category'].value_counts().to_dict()
 
+        # 予約時点の会員ステータス（その時点で会員だったか・体験者だったか）と月別集計
+        self.reservation_data['status_at'] = self.tag_status_at(
+            self.reservation_data[self.reservation_cols['member_id']], self._reservation_times(), self.visitor_ids())
+        monthly_status_stats = {}
+        if 'month' in self.reservation_data.columns:
+            counts = self.reservation_data.groupby(['status_at', 'month']).size()
+            monthly_status_stats = {status: counts[status].to_dict()
+                                    for status in POINT_IN_TIME_STATUSES if status in counts.index.levels[0]}
+
         # ステータス別集計
         status_col = self.reservation_cols['status']
         status_distribution = {}
@@ -317,39 +821,55 @@ class SaunaDataProcessor:
 
         return {
             'monthly_stats': monthly_stats,
+            'monthly_status_stats': monthly_status_stats,
             'ticket_distribution': ticket_distribution,
             'status_distribution': status_distribution
         }
 
+    @_track_load_memory
     def load_frame_data(self, frame_paths: List[str]) -> None:
         """フレームデータの読み込みと前処理"""
-        dfs = []
-        for path in frame_paths:
-            try:
-                df = pd.read_csv(path, encoding='utf-8')
-
-                # 必要なカラムが存在するか確認
-                required_cols = [self.frame_cols[col] for col in
-                                ['space_name', 'lesson_datetime', 'capacity', 'occupancy_rate']
-                                if self.frame_cols[col] is not None]
-
-                if all(col in df.columns for col in required_cols):
-                    dfs.append(df)
-            except Exception as e:
-                print(f"警告: {path}の読み込み中にエラーが発生しました: {e}")
+        dfs = [self.read_frame_partition(path) for path in frame_paths]
+        self.set_frame_partitions(dfs)
+
+    def read_frame_partition(self, path: str) -> Optional[pd.DataFrame]:
+        """フレームデータ1ファイル分（1か月分）を読み込んで前処理する。読み込めない場合はNone"""
+        try:
+            return self.prepare_frame_partition(pd.read_csv(path, encoding='utf-8'))
+        except Exception as e:
+            print(f"警告: {path}の読み込み中にエラーが発生しました: {e}")
+            return None
+
+    def prepare_frame_partition(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """読み込み済みのフレームデータ1ファイル分を前処理する。必要なカラムがなければNone"""
+        # 必要なカラムが存在するか確認
+        required_cols = [self.frame_cols[col] for col in
+                        ['space_name', 'lesson_datetime', 'capacity', 'occupancy_rate']
+                        if self.frame_cols[col] is not None]
+
+        if not all(col in df.columns for col in required_cols):
+            return None
 
+        # 日付列の変換
+        date_col = self.frame_cols['lesson_datetime']
+        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+
+        # 月と曜日の抽出
+        df['month'] = df[date_col].dt.strftime('%Y-%m')
+        df['weekday'] = df[date_col].dt.day_name()
+
+        # 稼働率を数値に変換（例：'85%' → 85.0、'100.0%' → 100.0）
+        rate_col = self.frame_cols['occupancy_rate']
+        if df[rate_col].dtype == object:
+            df[rate_col] = pd.to_numeric(df[rate_col].astype(str).str.rstrip('%'), errors='coerce')
+        return df
+
+    def set_frame_partitions(self, partitions: List[Optional[pd.DataFrame]]) -> None:
+        """前処理済みのフレームデータ（ファイル単位）を結合して保持する"""
+        dfs = [df for df in partitions if df is not None]
         if dfs:
             self.frame_data = pd.concat(dfs, ignore_index=True)
 
-            # 日付列の変換
-            date_col = self.frame_cols['lesson_datetime']
-            if date_col in self.frame_data.columns:
-                self.frame_data[date_col] = pd.to_datetime(self.frame_data[date_col], errors='coerce')
-
-                # 月と曜日の抽出
-                self.frame_data['month'] = self.frame_data[date_col].dt.strftime('%Y-%m')
-                self.frame_data['weekday'] = self.frame_data[date_col].dt.day_name()
-
     def analyze_occupancy(self) -> Dict:
         """稼働率の分析"""
         if self.frame_data is None:
@@ -421,34 +941,42 @@ class SaunaDataProcessor:
             'byRoom': room_rates
         }
 
+    @_track_load_memory
     def load_sales_data(self, sales_paths: List[str]) -> None:
         """売上データの読み込みと前処理"""
-        dfs = []
-        for path in sales_paths:
-            try:
-                df = pd.read_csv(path, encoding='utf-8')
-
-                # 必要なカラムが存在するか確認
-                required_cols = [self.sales_cols[col] for col in
-                               ['transaction_id', 'member_id', 'transaction_datetime', 'amount']
-                               if self.sales_cols[col] is not None]
-
-                if all(col in df.columns for col in required_cols):
-                    dfs.append(df)
-            except Exception as e:
-                print(f"警告: {path}の読み込み中にエラーが発生しました: {e}")
-
+        dfs = [self.read_sales_partition(path) for path in sales_paths]
+        self.set_sales_partitions(dfs)
+
+    def read_sales_partition(self, path: str) -> Optional[pd.DataFrame]:
+        """売上データ1ファイル分（1か月分）を読み込んで前処理する。読み込めない場合はNone"""
+        try:
+            return self.prepare_sales_partition(pd.read_csv(path, encoding='utf-8'))
+        except Exception as e:
+            print(f"警告: {path}の読み込み中にエラーが発生しました: {e}")
+            return None
+
+    def prepare_sales_partition(self, df: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """読み込み済みの売上データ1ファイル分を前処理する。必要なカラムがなければNone"""
+        # 必要なカラムが存在するか確認
+        required_cols = [self.sales_cols[col] for col in
+                       ['transaction_id', 'member_id', 'transaction_datetime', 'amount']
+                       if self.sales_cols[col] is not None]
+
+        if not all(col in df.columns for col in required_cols):
+            return None
+
+        # 日付列の変換と月の抽出
+        date_col = self.sales_cols['transaction_datetime']
+        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
+        df['month'] = df[date_col].dt.strftime('%Y-%m')
+        return df
+
+    def set_sales_partitions(self, partitions: List[Optional[pd.DataFrame]]) -> None:
+        """前処理済みの売上データ（ファイル単位）を結合して保持する"""
+        dfs = [df for df in partitions if df is not None]
         if dfs:
             self.sales_data = pd.concat(dfs, ignore_index=True)
 
-            # 日付列の変換
-            date_col = self.sales_cols['transaction_datetime']
-            if date_col in self.sales_data.columns:
-                self.sales_data[date_col] = pd.to_datetime(self.sales_data[date_col], errors='coerce')
-
-                # 月の抽出
-                self.sales_data['month'] = self.sales_data[date_col].dt.strftime('%Y-%m')
-
     def analyze_sales(self) -> Dict:
         """売上の分析"""
         if self.sales_data is None:
@@ -457,19 +985,18 @@ class SaunaDataProcessor:
                 'average_transaction': 0
             }
 
-        # 会員ステータスを取得（必要に応じて計算）
-        member_categories = self.analyze_member_status().get('categories', {})
-
         # カラム名を実際のデータに合わせる
         member_id_col = self.sales_cols['member_id']
         amount_col = self.sales_cols['amount']
         item_name_col = self.sales_cols['item_name']
+        date_col = self.sales_cols['transaction_datetime']
 
         # 売上カテゴリごとにカウント
         sales_by_category = {
             'trial': 0,    # 初回体験
             'member': 0,   # 会員
             'visitor': 0,  # ビジター
+            'former': 0,   # 退会後
             'other': 0     # その他
         }
 
@@ -481,35 +1008,45 @@ class SaunaDataProcessor:
             'Other': 0
         }
 
-        # 売上データを分析
-        for _, sale in self.sales_data.iterrows():
-            member_id = sale[member_id_col]
-            amount = sale[amount_col] or 0
-            summary = str(sale.get(item_name_col, ''))
-
-            # 売上カテゴリの判定
-            if member_id in member_categories.get('active', []):
-                sales_by_category['member'] += amount
-            elif member_id in member_categories.get('trial', []):
-                sales_by_category['trial'] += amount
-            elif member_id in member_categories.get('visitor', []):
-                sales_by_category['visitor'] += amount
-            else:
-                sales_by_category['other'] += amount
-
-            # ルーム別売上の判定
-            if 'Room1' in summary and 'Room2' not in summary and 'Room3' not in summary:
-                sales_by_room['Room1'] += amount
-            elif 'Room1' not in summary and 'Room2' in summary and 'Room3' not in summary:
-                sales_by_room['Room2'] += amount
-            elif 'Room1' not in summary and 'Room2' not in summary and 'Room3' in summary:
-                sales_by_room['Room3'] += amount
-            elif 'Room1/Room2' in summary:
-                # Room1とRoom2の両方に言及がある場合は按分
-                sales_by_room['Room1'] += amount / 2
-                sales_by_room['Room2'] += amount / 2
-            else:
-                sales_by_room['Other'] += amount
+        # 売上データを分析（行ごとの判定をベクトル演算で行う）
+        amounts = self.sales_data[amount_col].fillna(0)
+        sale_members = self.sales_data[member_id_col]
+        if item_name_col in self.sales_data.columns:
+            summaries = self.sales_data[item_name_col].astype(str)
+        else:
+            summaries = pd.Series('', index=self.sales_data.index)
+
+        # 売上カテゴリの判定（精算日時の時点の会員ステータス）
+        self.sales_data['status_at'] = self.tag_status_at(sale_members, self.sales_data[date_col], self.visitor_ids())
+        category_totals = amounts.groupby(self.sales_data['status_at']).sum()
+        for category in sales_by_category:
+            sales_by_category[category] += category_totals.get(category, 0)
+
+        # カテゴリ別の月別売上（過去の月もその時点のステータスで集計する）
+        monthly_sales_by_category = {}
+        if 'month' in self.sales_data.columns:
+            monthly = amounts.groupby([self.sales_data['status_at'], self.sales_data['month']]).sum()
+            monthly_sales_by_category = {category: monthly[category].to_dict()
+                                         for category in sales_by_category if category in monthly.index.levels[0]}
+
+        # ルーム別売上の判定
+        has_room1 = summaries.str.contains('Room1', regex=False)
+        has_room2 = summaries.str.contains('Room2', regex=False)
+        has_room3 = summaries.str.contains('Room3', regex=False)
+        only_room1 = has_room1 & ~has_room2 & ~has_room3
+        only_room2 = ~has_room1 & has_room2 & ~has_room3
+        only_room3 = ~has_room1 & ~has_room2 & has_room3
+        single_room = only_room1 | only_room2 | only_room3
+        # Room1とRoom2の両方に言及がある場合は按分
+        split_room = ~single_room & summaries.str.contains('Room1/Room2', regex=False)
+
+        sales_by_room['Room1'] += amounts[only_room1].sum()
+        sales_by_room['Room2'] += amounts[only_room2].sum()
+        sales_by_room['Room3'] += amounts[only_room3].sum()
+        if split_room.any():
+            sales_by_room['Room1'] += amounts[split_room].sum() / 2
+            sales_by_room['Room2'] += amounts[split_room].sum() / 2
+        sales_by_room['Other'] += amounts[~single_room & ~split_room].sum()
 
         # 総売上と売上比率を計算
         total_sales = sum(sales_by_category.values())
@@ -527,9 +1064,7 @@ class SaunaDataProcessor:
         # 月別売上集計
         monthly_sales = {}
         if 'month' in self.sales_data.columns:
-            for month in self.sales_data['month'].unique():
-                month_data = self.sales_data[self.sales_data['month'] == month]
-                monthly_sales[month] = month_data[amount_col].sum()
+            monthly_sales = self.sales_data.groupby('month', sort=False)[amount_col].sum().to_dict()
 
         # 平均取引額
         avg_transaction = 0
@@ -540,8 +1075,232 @@ class SaunaDataProcessor:
             'total_sales': total_sales,
             'average_transaction': avg_transaction,
             'monthly_sales': monthly_sales,
+            'monthly_sales_by_category': monthly_sales_by_category,
             'sales_by_category': sales_by_category,
             'sales_by_room': sales_by_room,
             'category_ratios': category_ratios,
             'room_ratios': room_ratios
         }
+
+    def build_member_features(self) -> Optional[pd.DataFrame]:
+        """
+        会員ごとの特徴量テーブルを作る（インデックスはメンバーID、基準日以前のデータのみ）
+
+        予約データの来店（VISIT_STATUSES）と売上データをメンバーIDで結合し、
+        最終利用からの日数（recency_days）、来店回数、購入回数、累計売上（LTV）、
+        初回利用からの月数あたりの来店回数と、RFMスコア・セグメントを求める。
+        F は来店回数（予約データがない場合は購入回数）、M は累計売上で評価する。
+        """
+        reference_date = self.reference_date
+        parts = []
+
+        if self.reservation_data is not None:
+            data = self.reservation_data
+            member_col = self.reservation_cols['member_id']
+            date_col = '予約日時' if '予約日時' in data.columns else self.reservation_cols['reservation_datetime']
+            status = data[self.reservation_cols['status']].astype(str)
+            visited = (status.isin(VISIT_STATUSES)
+                       | (status.eq('無断キャンセル') & data[member_col].isin(self.dummy_user_ids)))
+            visits = data.loc[visited & (data[date_col] <= reference_date)]
+            parts.append(visits.groupby(member_col)[date_col].agg(
+                visits='size', first_visit='min', last_visit='max'))
+
+        if self.sales_data is not None:
+            data = self.sales_data
+            member_col = self.sales_cols['member_id']
+            date_col = self.sales_cols['transaction_datetime']
+            amount_col = self.sales_cols['amount']
+            sales = data.loc[data[date_col] <= reference_date]
+            parts.append(sales.groupby(member_col).agg(
+                purchases=(amount_col, 'size'), ltv=(amount_col, 'sum'),
+                first_purchase=(date_col, 'min'), last_purchase=(date_col, 'max')))
+
+        if not parts:
+            return None
+        features = pd.concat(parts, axis=1, join='outer')
+        features.index.name = self.member_cols['member_id']
+        for col in ['visits', 'purchases', 'ltv']:
+            features[col] = features[col].fillna(0).astype(np.int64) if col in features.columns else 0
+        if features.empty:
+            return None
+
+        first_cols = [c for c in ['first_visit', 'first_purchase'] if c in features.columns]
+        last_cols = [c for c in ['last_visit', 'last_purchase'] if c in features.columns]
+        features['first_activity'] = features[first_cols].min(axis=1)
+        features['last_activity'] = features[last_cols].max(axis=1)
+        features = features.drop(columns=first_cols + last_cols)
+
+        features['recency_days'] = (reference_date - features['last_activity']).dt.days.astype(np.int64)
+        # 初回利用から基準日までの月数（1か月未満は1か月として数える）
+        tenure = (reference_date - features['first_activity']).dt.days / 30.4375
+        features['tenure_months'] = np.maximum(tenure, 1.0)
+        features['visits_per_month'] = features['visits'] / features['tenure_months']
+        features['average_spend'] = (features['ltv'] / features['purchases'].where(features['purchases'] > 0)).fillna(0)
+
+        frequency = features['visits'] if self.reservation_data is not None else features['purchases']
+        r = _rfm_score(features['recency_days'], higher_is_better=False)
+        f = _rfm_score(frequency)
+        m = _rfm_score(features['ltv'])
+        features['r_score'], features['f_score'], features['m_score'] = r, f, m
+        features['rfm_score'] = pd.Categorical(
+            (r.astype(np.int16) * 100 + f * 10 + m).astype(str))
+        names = [name for name, _ in RFM_SEGMENTS]
+        features['segment'] = pd.Categorical(
+            np.select([rule(r, f) for _, rule in RFM_SEGMENTS], names, default=names[-1]), categories=names)
+        return _compact(features)
+
+    def analyze_member_value(self) -> Dict:
+        """
+        会員ごとのLTVとRFMセグメントの分析
+
+        build_member_features の結果を member_features に保持し（API からのセグメント別の
+        一覧に使う）、セグメントごとの人数・売上とその割合、平均値を返す。
+        """
+        features = self.build_member_features()
+        self.member_features = features
+        if features is None:
+            return {}
+
+        total_ltv = float(features['ltv'].sum())
+        grouped = features.groupby('segment', observed=False).agg(
+            customers=('ltv', 'size'), revenue=('ltv', 'sum'), average_ltv=('ltv', 'mean'),
+            average_visits_per_month=('visits_per_month', 'mean'), average_recency_days=('recency_days', 'mean'))
+        segments = []
+        for segment, row in grouped.iterrows():
+            segments.append({
+                'segment': segment,
+                'customers': int(row['customers']),
+                'share': round(row['customers'] / len(features) * 100, 2),
+                'revenue': int(row['revenue']),
+                'revenue_share': round(row['revenue'] / total_ltv * 100, 2) if total_ltv > 0 else 0,
+                'average_ltv': round(float(row['average_ltv']), 0) if row['customers'] else 0,
+                'average_visits_per_month': round(float(row['average_visits_per_month']), 2) if row['customers'] else 0,
+                'average_recency_days': round(float(row['average_recency_days']), 1) if row['customers'] else 0,
+            })
+
+        return {
+            'reference_date': self.reference_date.strftime('%Y-%m-%d'),
+            'customers': len(features),
+            'total_ltv': int(total_ltv),
+            'average_ltv': round(total_ltv / len(features), 0),
+            'average_visits_per_month': round(float(features['visits_per_month'].mean()), 2),
+            'segments': segments,
+            'memory_bytes': int(features.memory_usage(deep=True).sum()),
+        }
+
+    def analyze_conversion(self) -> Dict:
+        """
+        体験 → 契約 → 初回支払いの転換ファネル
+
+        体験の予約（使用チケットに「体験」を含むか、予約方法がトライアル予約）のうち会員ごとに
+        最初のものを起点とし、その日以降で最初のプラン契約日（なければ適用開始日）と、
+        契約日以降で最初の有料の売上（体験以外で金額が0より大きいもの）を、メンバーIDごとの
+        as-of 結合（merge_asof, direction='forward'）で対応づける。
+        体験の月・ルーム・予約方法ごとの転換率と、転換までの日数の分布を返す。
+        基準日より後のデータは使わない。
+        """
+        if self.reservation_data is None:
+            return {}
+
+        reference_date = self.reference_date
+        data = self.reservation_data
+        member_col = self.reservation_cols['member_id']
+        ticket_col = self.reservation_cols['ticket_name']
+        room_col = self.reservation_cols['room']
+        date_col = '予約日時' if '予約日時' in data.columns else self.reservation_cols['reservation_datetime']
+        unknown = pd.Series('不明', index=data.index)
+
+        tickets = data[ticket_col].astype(str) if ticket_col in data.columns else unknown
+        methods = data['予約方法'].fillna('不明').astype(str) if '予約方法' in data.columns else unknown
+        is_trial = tickets.str.contains('体験', regex=False) | methods.eq('トライアル予約')
+        trials = pd.DataFrame({
+            'member': pd.to_numeric(data[member_col], errors='coerce'),
+            'trial_at': data[date_col],
+            'room': data[room_col].fillna('不明').astype(str) if room_col in data.columns else unknown,
+            'method': methods,
+        })[is_trial].dropna(subset=['member', 'trial_at'])
+        trials = trials[trials['trial_at'] <= reference_date]
+        if trials.empty:
+            return {}
+        trials['member'] = trials['member'].astype(np.int64)
+        # 会員ごとの最初の体験（同じ日の契約も拾えるよう日付単位で結合する）
+        trials = trials.sort_values('trial_at').drop_duplicates('member')
+        trials['trial_day'] = trials['trial_at'].dt.normalize()
+        trials['month'] = trials['trial_at'].dt.strftime('%Y-%m')
+
+        # 契約: 体験日以降で最初の契約日
+        contracts = pd.DataFrame(columns=['member', 'contract_at'])
+        if self.member_data is not None:
+            members = self.member_data
+            contract_col = self.member_cols.get('contract_date')
+            start_col = self.member_cols['plan_start_date']
+            contract_at = members[contract_col] if contract_col in members.columns else pd.Series(pd.NaT, index=members.index)
+            if start_col in members.columns:
+                contract_at = contract_at.fillna(members[start_col])
+            contracts = pd.DataFrame({
+                'member': pd.to_numeric(members[self.member_cols['member_id']], errors='coerce'),
+                'contract_at': contract_at,
+            }).dropna()
+            contracts = contracts[contracts['contract_at'] <= reference_date]
+        contracts = contracts.astype({'member': np.int64, 'contract_at': 'datetime64[ns]'}).sort_values('contract_at')
+        funnel = pd.merge_asof(trials.sort_values('trial_day'), contracts, left_on='trial_day', right_on='contract_at',
+                               by='member', direction='forward')
+
+        # 初回支払い: 契約日以降で最初の有料の売上
+        funnel['paid_at'] = pd.NaT
+        contracted = funnel['contract_at'].notna()
+        if self.sales_data is not None and contracted.any():
+            sales = self.sales_data
+            amount_col = self.sales_cols['amount']
+            item_col = self.sales_cols['item_name']
+            sale_at = sales[self.sales_cols['transaction_datetime']]
+            items = sales[item_col].astype(str) if item_col in sales.columns else pd.Series('', index=sales.index)
+            is_paid = (sales[amount_col].fillna(0) > 0) & ~items.str.contains('体験', regex=False) & (sale_at <= reference_date)
+            paid = pd.DataFrame({
+                'member': pd.to_numeric(sales[self.sales_cols['member_id']], errors='coerce'),
+                'sale_at': sale_at,
+            })[is_paid].dropna()
+            paid = paid.astype({'member': np.int64}).sort_values('sale_at')
+            converted = funnel.loc[contracted, ['member', 'contract_at']].sort_values('contract_at')
+            converted = pd.merge_asof(converted.reset_index(), paid, left_on='contract_at', right_on='sale_at',
+                                      by='member', direction='forward').set_index('index')
+            funnel.loc[converted.index, 'paid_at'] = converted['sale_at']
+
+        funnel['contracted'] = contracted
+        funnel['paid'] = funnel['paid_at'].notna()
+        funnel['days_to_contract'] = (funnel['contract_at'] - funnel['trial_day']).dt.days
+        funnel['days_to_paid'] = (funnel['paid_at'].dt.normalize() - funnel['contract_at'].dt.normalize()).dt.days
+
+        def rate(count, total):
+            return round(count / total * 100, 2) if total else 0
+
+        def median(values):
+            return None if pd.isna(values) else round(float(values), 1)
+
+        def breakdown(key):
+            grouped = funnel.groupby(key, sort=True).agg(
+                trials=('member', 'size'), contracted=('contracted', 'sum'), paid=('paid', 'sum'),
+                median_days_to_contract=('days_to_contract', 'median'))
+            return [{
+                'name': str(name),
+                'trials': int(row['trials']),
+                'contracted': int(row['contracted']),
+                'paid': int(row['paid']),
+                'contract_rate': rate(row['contracted'], row['trials']),
+                'paid_rate': rate(row['paid'], row['trials']),
+                'median_days_to_contract': median(row['median_days_to_contract']),
+            } for name, row in grouped.iterrows()]
+
+        total = len(funnel)
+        stage_counts = [('体験予約', total), ('契約', int(funnel['contracted'].sum())), ('初回支払い', int(funnel['paid'].sum()))]
+        return {
+            'reference_date': reference_date.strftime('%Y-%m-%d'),
+            'stages': [{'stage': stage, 'count': count, 'rate': rate(count, total)} for stage, count in stage_counts],
+            'by_month': breakdown('month'),
+            'by_room': breakdown('room'),
+            'by_method': breakdown('method'),
+            'time_to_contract': _day_histogram(funnel['days_to_contract']),
+            'time_to_paid': _day_histogram(funnel['days_to_paid']),
+            'median_days_to_contract': median(funnel['days_to_contract'].median()),
+            'median_days_to_paid': median(funnel['days_to_paid'].median()),
+        }
@@ -0,0 +1,144 @@
+"""
+時系列の間引き（サーバー側）
+
+日別の稼働率や売上を数年分そのまま送ると、グラフ1本で数千点になり、レスポンスも描画も重くなる。
+表示幅（ピクセル）より多い点は見た目に影響しないため、幅に合わせて点を選んでから返す。
+
+- lttb:   Largest-Triangle-Three-Buckets。隣り合う点と作る三角形の面積が最大の点を
+          区間ごとに1点選ぶ。折れ線の形を保ったまま幅と同じ点数まで減らす
+- minmax: 区間ごとの最小値と最大値を残す。スパイクを必ず残したい場合に使う（先頭・末尾を含めて最大で幅と同じ点数）
+
+点数が幅以下の系列はそのまま返す。
+"""
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+METHODS = ["lttb", "minmax"]
+DEFAULT_METHOD = "lttb"
+DEFAULT_WIDTH = 800
+MIN_WIDTH = 100
+MAX_WIDTH = 4000
+# 幅はこの単位に切り上げてキャッシュのキーをまとめる（数ピクセルの違いで作り直さない）
+WIDTH_STEP = 100
+
+
+def normalize_width(width: Optional[int]) -> int:
+    """表示幅を MIN_WIDTH〜MAX_WIDTH の WIDTH_STEP 単位に丸める"""
+    width = int(width or DEFAULT_WIDTH)
+    width = min(max(width, MIN_WIDTH), MAX_WIDTH)
+    return -(-width // WIDTH_STEP) * WIDTH_STEP
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    LTTB で残す点のインデックスを返す（x は昇順）
+
+    各区間の平均は累積和でまとめて求め、区間ごとの面積の計算も配列演算で行う。
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    # 区間 i は [bounds[i], bounds[i + 1])。先頭と末尾の点は必ず残す
+    bounds = (np.floor(np.arange(threshold - 1) * every) + 1).astype(np.int64)
+    bounds[-1] = n - 1
+
+    cum_x = np.concatenate(([0.0], np.cumsum(x)))
+    cum_y = np.concatenate(([0.0], np.cumsum(y)))
+    sizes = np.diff(bounds)
+    mean_x = (cum_x[bounds[1:]] - cum_x[bounds[:-1]]) / sizes
+    mean_y = (cum_y[bounds[1:]] - cum_y[bounds[:-1]]) / sizes
+
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    buckets = threshold - 2
+    for i in range(buckets):
+        start, end = bounds[i], bounds[i + 1]
+        if i + 1 < buckets:
+            next_x, next_y = mean_x[i + 1], mean_y[i + 1]
+        else:
+            next_x, next_y = x[-1], y[-1]
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    return indices
+
+
+def minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """x の範囲を等分した区間ごとに最小値・最大値の点を残し、インデックスを返す（x は昇順）"""
+    n = len(x)
+    if n <= buckets * 2 or buckets < 1:
+        return np.arange(n)
+
+    span = x[-1] - x[0]
+    if span <= 0:
+        return np.array([int(np.argmin(y)), int(np.argmax(y))])
+    bucket = np.minimum(((x - x[0]) / span * buckets).astype(np.int64), buckets - 1)
+    grouped = pd.Series(y).groupby(bucket)
+    picked = np.concatenate(([0, n - 1], grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy()))
+    return np.unique(picked)
+
+
+def downsample(x: np.ndarray, y: np.ndarray, width: int, method: str = DEFAULT_METHOD) -> np.ndarray:
+    """幅 width に合わせて残す点のインデックスを返す"""
+    if method == "lttb":
+        return lttb(x, y, width)
+    if method == "minmax":
+        return minmax(x, y, (width - 2) // 2)
+    raise ValueError(f"未対応の間引き方法です: {method}（対応: {', '.join(METHODS)}）")
+
+
+def end_mask(index: pd.DatetimeIndex, end: str) -> np.ndarray:
+    """
+    期間の終わり end までの点を示すマスク
+
+    時刻を含まない end（YYYY-MM-DD / YYYY-MM）はその日（月）の終わりまでを含める。
+    00:00 で比べると、枠ごとの系列で終了日の 10:00 や 18:00 の点が落ちてしまうため。
+    """
+    if ":" in end:
+        return index <= pd.Timestamp(end)
+    return index < (pd.Period(end) + 1).start_time
+
+
+def downsample_frame(frame: Optional[pd.DataFrame], start: Optional[str] = None, end: Optional[str] = None,
+                     width: Optional[int] = DEFAULT_WIDTH, method: str = DEFAULT_METHOD) -> Dict:
+    """
+    日付インデックスのDataFrame（列 = 系列）を期間で絞り込み、系列ごとに間引く
+
+    Returns:
+        {"series": {系列名: {"x": [YYYY-MM-DD...], "y": [...]}}, "points", "original_points",
+         "method", "width", "range": [開始, 終了]}
+        枠ごとの系列など時刻を含むインデックスの場合、x は YYYY-MM-DDTHH:MM になる。
+    """
+    width = normalize_width(width)
+    result = {"series": {}, "points": 0, "original_points": 0, "method": method, "width": width,
+              "range": [start, end]}
+    if frame is None or frame.empty:
+        return result
+
+    frame = frame.sort_index()
+    # 時刻まで持つ系列は時刻を落とすと同じ x に複数の点が重なるため、日時で返す
+    x_format = "%Y-%m-%d" if (frame.index == frame.index.normalize()).all() else "%Y-%m-%dT%H:%M"
+    if start:
+        frame = frame[frame.index >= pd.Timestamp(start)]
+    if end:
+        frame = frame[end_mask(frame.index, end)]
+
+    for name in frame.columns:
+        column = frame[name].dropna()
+        if column.empty:
+            continue
+        x = column.index.asi8.astype(np.float64)
+        y = column.to_numpy(dtype=np.float64)
+        keep = downsample(x, y, width, method)
+        result["series"][str(name)] = {
+            "x": column.index[keep].strftime(x_format).tolist(),
+            "y": np.round(y[keep], 2).tolist(),
+        }
+        result["points"] += len(keep)
+        result["original_points"] += len(column)
+    return result
@@ -39,6 +39,21 @@ const API_PATHS = {
   dashboard: `${BASE_URL}/api/dashboard`,
   uploadCSV: `${BASE_URL}/api/upload-csv`,
   resetDashboard: `${BASE_URL}/api/reset-dashboard`,
+  staticDashboard: `${BASE_URL}/dashboard-data/latest.json`,
+};
+
+// 事前に書き出されたダッシュボードデータ（run_processor.py publish / watch）。閲覧時はまずこちらを読む
+const fetchStaticDashboard = async () => {
+  const latest = await fetch(API_PATHS.staticDashboard, { cache: 'no-cache' });
+  if (!latest.ok) {
+    throw new Error('静的ダッシュボードデータがありません');
+  }
+  const { dashboard } = await latest.json();
+  const response = await fetch(`${BASE_URL}${dashboard}`);
+  if (!response.ok) {
+    throw new Error('静的ダッシュボードデータの取得に失敗しました');
+  }
+  return response.json();
 };
 
 // デバッグログを追加
@@ -347,21 +362,26 @@ const Dashboard = () => {
     setShowMonthlyDetail(true);
   };
 
-  // APIからデータを取得する
+  // 書き出し済みの静的データを読み、ない場合だけAPIから取得する（通常の閲覧ではpandasを使わない）
   useEffect(() => {
     const fetchData = async () => {
       try {
         setIsLoading(true);
-        const response = await fetch(API_PATHS.dashboard);
-        if (!response.ok) {
-          throw new Error('APIからのデータ取得に失敗しました');
+        setDashboardData(await fetchStaticDashboard());
+      } catch (staticError) {
+        console.warn('静的データがないためAPIから取得します:', staticError);
+        try {
+          const response = await fetch(API_PATHS.dashboard);
+          if (!response.ok) {
+            throw new Error('APIからのデータ取得に失敗しました');
+          }
+          const data = await response.json();
+          setDashboardData(data);
+        } catch (error) {
+          console.error('APIエラー:', error);
+          // どちらも取得できない場合はダミーデータを使用
+          setDashboardData(generateDummyData());
         }
-        const data = await response.json();
-        setDashboardData(data);
-      } catch (error) {
-        console.error('APIエラー:', error);
-        // エラー時はダミーデータを使用
-        setDashboardData(generateDummyData());
       } finally {
         setIsLoading(false);
       }
@@ -370,7 +390,7 @@ const Dashboard = () => {
     fetchData();
   }, []);
 
-  // CSVアップロード成功時の処理
+  // CSVアップロード成功時の処理（取り込んだデータは静的データにまだ含まれないためAPIから取得する）
   const handleUploadSuccess = () => {
     // データを再取得（遅延を入れる）
     setIsLoading(true);
@@ -1338,8 +1358,10 @@ const Dashboard = () => {
                           data={[
                             { name: "会員", value: dashboardData.finance?.salesByType?.会員 || 850000 },
                             { name: "ビジター", value: dashboardData.finance?.salesByType?.ビジター || 250000 },
-                            { name: "トライアル", value: dashboardData.finance?.salesByType?.トライアル || 150000 }
-                          ]}
+                            { name: "トライアル", value: dashboardData.finance?.salesByType?.トライアル || 150000 },
+                            { name: "退会会員", value: dashboardData.finance?.salesByType?.退会会員 || 0 },
+                            { name: "その他", value: dashboardData.finance?.salesByType?.その他 || 0 }
+                          ].filter(entry => entry.value > 0)}
                           cx="50%"
                           cy="50%"
                           innerRadius={60}
@@ -1352,6 +1374,8 @@ const Dashboard = () => {
                           <Cell key="会員" fill={COLORS.primary} />
                           <Cell key="ビジター" fill={COLORS.accent1} />
                           <Cell key="トライアル" fill={COLORS.accent2} />
+                          <Cell key="退会会員" fill={COLORS.secondary} />
+                          <Cell key="その他" fill={COLORS.gray} />
                         </Pie>
                         <Legend />
                         <Tooltip formatter={(value) => `¥${value.toLocaleString()}`} />
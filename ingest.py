@@ -0,0 +1,484 @@
+"""
+アップロードされたCSVの取り込みパイプライン
+
+エクスポートの種類（member / member_delete / reservation / frame / sales）ごとに
+parse → validate → normalize → aggregate → persist の5段階で処理する。
+
+- parse:     展開済みのストリームを1回だけ pandas.read_csv で読む
+- validate:  別名の列を実データの列名（SaunaDataProcessor の *_cols）に揃え、必須列を確認する
+- normalize: SaunaDataProcessor の prepare_*_partition / set_member_tables で前処理する
+- aggregate: 取り込み済みのデータに反映し、影響する分析だけを再計算してダッシュボードを組み立てる
+- persist:   前処理済みのデータを uploads/tables に保存する（再起動時に restore で読み戻す）
+
+月別のテーブルはデータに含まれる暦月ごとのパーティションとして保持し、アップロードに含まれる
+月のパーティションだけを置き換える（複数月のエクスポートも月ごとに分けて保存する）。
+
+時系列グラフ用の間引いた系列（timeseries）は、依存する分析のバージョンをキーにキャッシュする。
+"""
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import dashboard_builder
+import downsample
+import metrics
+import sniffer
+from data_layer import VersionedCache
+from data_processor import SaunaDataProcessor
+from run_processor import ANALYSIS_METHODS, ANALYSIS_STAGES, file_month
+from watcher import PARTITIONED_TABLES, affected_analyses, classify_file
+
+INGEST_STAGES = ["parse", "validate", "normalize", "aggregate", "persist"]
+
+# 分析 → 結果が反映されるダッシュボードのセクション（labels は常に更新する）
+ANALYSIS_SECTIONS = {
+    "member_status": ["metrics", "members"],
+    "reservations": ["members"],
+    "occupancy": ["utilization"],
+    "sales": ["finance"],
+    "cohorts": [],  # ダッシュボードには含めず /api/cohorts で返す
+    "survival": [],  # 同じく /api/survival で返す
+    "member_value": [],  # 同じく /api/member-value で返す
+    "conversion": [],  # 同じく /api/conversion で返す
+}
+# 分析の主となるテーブル（未取り込みなら結果が空になるためセクションを更新しない）
+ANALYSIS_PRIMARY_TABLE = {
+    "member_status": "member",
+    "reservations": "reservation",
+    "occupancy": "frame",
+    "sales": "sales",
+    "cohorts": "member",
+    "survival": "member",
+    "member_value": "sales",
+    "conversion": "reservation",
+}
+
+
+class IngestError(Exception):
+    """アップロードされたCSVを取り込めない（メッセージはそのままレスポンスの detail に使う）"""
+
+
+def check_timeseries(name: str, method: str) -> None:
+    """時系列の名前と間引き方法を確認する（未対応なら IngestError）"""
+    if name not in dashboard_builder.TIMESERIES:
+        raise IngestError(f"未対応の系列です: {name}（対応: {', '.join(dashboard_builder.TIMESERIES)}）")
+    if method not in downsample.METHODS:
+        raise IngestError(f"未対応の間引き方法です: {method}（対応: {', '.join(downsample.METHODS)}）")
+
+
+# ---------------------------------------------------------------------------
+# 種類別のパイプライン
+# ---------------------------------------------------------------------------
+class IngestPipeline:
+    """1種類のエクスポートの取り込み手順。種類ごとにサブクラスで列と集計内容を定める"""
+
+    data_type = ""
+    table = ""
+    label = ""
+    columns_attr = ""
+    required_keys: List[str] = []
+    date_key = ""
+    # 旧フォーマットなどの別名 → 実データの列名
+    aliases: Dict[str, str] = {}
+
+    def __init__(self, processor: SaunaDataProcessor):
+        self.processor = processor
+
+    @property
+    def columns(self) -> Dict[str, Optional[str]]:
+        return getattr(self.processor, self.columns_attr)
+
+    def required_columns(self) -> List[str]:
+        return [self.columns[key] for key in self.required_keys if self.columns.get(key)]
+
+    def parse(self, stream, encoding: str = "utf-8") -> pd.DataFrame:
+        return pd.read_csv(stream, encoding=encoding)
+
+    def validate(self, df: pd.DataFrame) -> pd.DataFrame:
+        renames = {alias: column for alias, column in self.aliases.items()
+                   if alias in df.columns and column not in df.columns}
+        if renames:
+            df = df.rename(columns=renames)
+        missing = [col for col in self.required_columns() if col not in df.columns]
+        if missing:
+            raise IngestError(f"{self.label}に必要なカラムが見つかりません: {', '.join(missing)}")
+        if df.empty:
+            raise IngestError(f"{self.label}にデータ行がありません")
+        return df
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        prepared = getattr(self.processor, f"prepare_{self.table}_partition")(df)
+        if prepared is None:
+            raise IngestError(f"{self.label}の前処理に失敗しました")
+        return prepared
+
+    def dates(self, df: pd.DataFrame) -> pd.Series:
+        col = self.columns.get(self.date_key)
+        if col and col in df.columns and pd.api.types.is_datetime64_any_dtype(df[col]):
+            return df[col].dropna()
+        return pd.Series([], dtype="datetime64[ns]")
+
+    def split(self, df: pd.DataFrame, filename: str) -> Dict[str, pd.DataFrame]:
+        """
+        データに含まれる暦月ごとに分ける（{YYYY-MM: その月の行}）
+
+        パーティションは月単位で置き換えるため、月の重なるファイル（月別ファイルと複数月の
+        エクスポートなど）を続けて取り込んでも同じ月の行が二重に残らない。
+        日付のない行はファイル名の年月（なければデータの最初の月）に入れる。
+        日付の列がない場合はファイル名を1つのパーティションにする。
+        """
+        stem = os.path.splitext(os.path.basename(filename or "upload"))[0]
+        dates = self.dates(df)
+        if dates.empty:
+            if stem.startswith(f"{self.table}_"):
+                stem = stem[len(self.table) + 1:]
+            return {stem: df}
+
+        months = pd.Series(None, index=df.index, dtype=object)
+        months.loc[dates.index] = dates.dt.strftime("%Y-%m")
+        months = months.fillna(file_month(os.path.basename(filename or "")) or months.dropna().min())
+        return {month: part for month, part in df.groupby(months, sort=True)}
+
+    def persist_name(self, key: str) -> str:
+        # 1か月分は data/ と同じ名前（frame_2023_05.csv）にして run_processor からも読めるようにする
+        if re.fullmatch(r"\d{4}-\d{2}", key):
+            key = key.replace("-", "_")
+        return f"{self.table}_{key}.csv"
+
+    def summarize(self, df: pd.DataFrame) -> Dict:
+        summary = {"rows": int(len(df))}
+        dates = self.dates(df)
+        if not dates.empty:
+            summary["date_range"] = {"from": dates.min().strftime("%Y-%m-%d"),
+                                     "to": dates.max().strftime("%Y-%m-%d")}
+        return summary
+
+
+class MemberPipeline(IngestPipeline):
+    data_type = "member"
+    table = "member"
+    label = "会員データ"
+    columns_attr = "member_cols"
+    required_keys = ["member_id", "gender", "age", "trial_datetime", "plan_start_date", "plan_end_date"]
+    date_key = "plan_start_date"
+
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        # 会員データは前処理（日付変換と削除済み会員の除外）を取り込み時にまとめて行う
+        return df
+
+    def split(self, df: pd.DataFrame, filename: str) -> Dict[str, pd.DataFrame]:
+        return {self.table: df}
+
+    def persist_name(self, key: str) -> str:
+        return f"{self.table}.csv"
+
+
+class MemberDeletePipeline(MemberPipeline):
+    data_type = "member_delete"
+    table = "member_delete"
+    label = "削除済み会員データ"
+    required_keys = ["member_id"]
+
+
+class ReservationPipeline(IngestPipeline):
+    data_type = "reservation"
+    table = "reservation"
+    label = "予約データ"
+    columns_attr = "reservation_cols"
+    required_keys = ["reservation_id", "member_id", "ticket_name", "reservation_datetime", "status"]
+    date_key = "reservation_datetime"
+
+    def dates(self, df: pd.DataFrame) -> pd.Series:
+        if "予約日時" in df.columns:
+            return df["予約日時"].dropna()
+        return super().dates(df)
+
+    def summarize(self, df: pd.DataFrame) -> Dict:
+        summary = super().summarize(df)
+        status_col = self.columns["status"]
+        summary["status_counts"] = {str(k): int(v) for k, v in df[status_col].value_counts().items()}
+        return summary
+
+
+class FramePipeline(IngestPipeline):
+    """レッスン枠（稼働率）データ。旧アップロード形式（date, room, occupancy）も受け付ける"""
+
+    data_type = "frame"
+    table = "frame"
+    label = "レッスン枠データ"
+    columns_attr = "frame_cols"
+    required_keys = ["space_name", "lesson_datetime"]
+    date_key = "lesson_datetime"
+    aliases = {"ルームコード": "ルーム名", "room": "ルーム名",
+               "日付": "レッスン日", "date": "レッスン日", "occupancy": "稼働率"}
+
+    def validate(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = super().validate(df)
+        rate_col = self.columns["occupancy_rate"]
+        capacity_col = self.columns["capacity"]
+        count_col = self.columns["reservation_count"]
+
+        if rate_col not in df.columns:
+            if capacity_col not in df.columns or count_col not in df.columns:
+                raise IngestError(f"{self.label}に稼働率、または{count_col}と{capacity_col}のカラムが必要です")
+            # 稼働率がない場合は予約数 / スペース数から計算する（スペース数0は稼働率0）
+            capacity = pd.to_numeric(df[capacity_col], errors="coerce")
+            count = pd.to_numeric(df[count_col], errors="coerce")
+            df[rate_col] = np.where(capacity > 0, count / capacity.where(capacity > 0) * 100, 0.0)
+        if capacity_col not in df.columns:
+            df[capacity_col] = np.nan
+        return df
+
+    def summarize(self, df: pd.DataFrame) -> Dict:
+        summary = super().summarize(df)
+        rate_col = self.columns["occupancy_rate"]
+        stats = df.groupby(self.columns["space_name"])[rate_col].agg(["mean", "min", "max"]).dropna()
+        summary["total_lessons"] = summary["rows"]
+        summary["room_occupancy"] = {
+            str(room): {"avg": float(row["mean"]), "min": float(row["min"]), "max": float(row["max"])}
+            for room, row in stats.iterrows()
+        }
+        return summary
+
+
+class SalesPipeline(IngestPipeline):
+    data_type = "sales"
+    table = "sales"
+    label = "売上データ"
+    columns_attr = "sales_cols"
+    required_keys = ["transaction_id", "member_id", "transaction_datetime", "amount"]
+    date_key = "transaction_datetime"
+
+    def summarize(self, df: pd.DataFrame) -> Dict:
+        summary = super().summarize(df)
+        amounts = pd.to_numeric(df[self.columns["amount"]], errors="coerce")
+        summary["total_sales"] = int(amounts.sum())
+        summary["monthly_sales"] = {str(k): int(v) for k, v in amounts.groupby(df["month"]).sum().items()}
+        return summary
+
+
+PIPELINES = {cls.data_type: cls for cls in
+             [MemberPipeline, MemberDeletePipeline, ReservationPipeline, FramePipeline, SalesPipeline]}
+
+
+# ---------------------------------------------------------------------------
+# 取り込み済みデータ
+# ---------------------------------------------------------------------------
+class IngestStore:
+    """
+    アップロードで取り込んだデータを保持し、分析結果とダッシュボードを差分更新する
+
+    パーティションの入れ替え・再計算・ダッシュボードの組み立ては lock の中で行う。
+    """
+
+    def __init__(self, persist_dir: Optional[str] = None, processor: Optional[SaunaDataProcessor] = None):
+        self.persist_dir = persist_dir
+        self.processor = processor or SaunaDataProcessor()
+        self.partitions: Dict[str, Dict[str, pd.DataFrame]] = {t: {} for t in PARTITIONED_TABLES}
+        self.members: Dict[str, Optional[pd.DataFrame]] = {"member": None, "member_delete": None}
+        self.results: Dict[str, Dict] = {}
+        # 分析ごとのバージョン（再計算するたびに1つ上げる）と、それをキーにした時系列のキャッシュ
+        self.versions: Dict[str, int] = {analysis: 0 for analysis in ANALYSIS_STAGES}
+        self.cache = VersionedCache(name="timeseries")
+        self.lock = threading.Lock()
+
+    def pipeline(self, data_type: str) -> IngestPipeline:
+        if data_type not in PIPELINES:
+            raise IngestError(f"未対応のデータ種別です: {data_type}（対応: {', '.join(PIPELINES)}）")
+        return PIPELINES[data_type](self.processor)
+
+    def ingest(self, stream, data_type: str, filename: str = "", upload_size: int = 0,
+               competitors: Optional[Dict] = None, encoding: str = "utf-8") -> Dict:
+        """
+        1ファイルを取り込み、結果の要約・再計算した分析・更新対象のセクション・ダッシュボードを返す
+
+        encoding は sniffer で判定した文字コード（sniffer.read_encoding の戻り値）。
+        """
+        pipeline = self.pipeline(data_type)
+        stages = metrics.StageTimer(data_type)
+        started = time.perf_counter()
+
+        stages.stage("parse")
+        df = pipeline.parse(stream, encoding)
+        stages.stop()
+        metrics.record_ingest(data_type, upload_size, len(df), time.perf_counter() - started)
+
+        stages.stage("validate")
+        df = pipeline.validate(df)
+        stages.stage("normalize")
+        df = pipeline.normalize(df)
+        parts = pipeline.split(df, filename)
+        summary = pipeline.summarize(df)
+
+        with self.lock:
+            stages.stage("aggregate")
+            self._apply(pipeline.table, parts)
+            analyses = self._recompute({pipeline.table})
+            sections = self._sections(analyses)
+            dashboard = dashboard_builder.build_dashboard(self.processor, self.results, competitors)
+
+            stages.stage("persist")
+            saved_paths = [self._persist(pipeline, key, part) for key, part in parts.items()]
+
+        durations = stages.record()
+        return {
+            "data_type": data_type,
+            "partitions": list(parts),
+            "files": [path for path in saved_paths if path],
+            "summary": summary,
+            "analyses": analyses,
+            "sections": sections,
+            "dashboard": dashboard,
+            "timings": {stage: round(seconds, 4) for stage, seconds in durations.items()},
+        }
+
+    def _apply(self, table: str, parts: Dict[str, pd.DataFrame]) -> None:
+        """パーティション（月）単位で置き換える。会員データは parts の唯一の値で置き換える"""
+        if table in self.partitions:
+            self.partitions[table].update(parts)
+            partitions = self.partitions[table]
+            getattr(self.processor, f"set_{table}_partitions")([partitions[k] for k in sorted(partitions)])
+            return
+
+        self.members[table] = next(iter(parts.values()))
+        if self.members["member"] is not None:
+            self.processor.member_delete_data = None
+            self.processor.set_member_tables(self.members["member"].copy(), self.members["member_delete"])
+
+    def _recompute(self, tables) -> List[str]:
+        """変更されたテーブルに依存し、主テーブルが取り込み済みの分析だけを再計算する"""
+        analyses = [a for a in affected_analyses(set(tables), list(ANALYSIS_STAGES))
+                    if getattr(self.processor, f"{ANALYSIS_PRIMARY_TABLE[a]}_data") is not None]
+        for analysis in analyses:
+            self.results[analysis] = getattr(self.processor, ANALYSIS_METHODS[analysis])()
+            self.versions[analysis] += 1
+        return analyses
+
+    def timeseries(self, name: str, start: Optional[str] = None, end: Optional[str] = None,
+                   width: Optional[int] = downsample.DEFAULT_WIDTH, method: str = downsample.DEFAULT_METHOD) -> Optional[Dict]:
+        """
+        取り込み済みデータの時系列 name を期間で絞り込み、表示幅に合わせて間引いた結果を返す
+
+        全期間の系列と間引いた結果は、依存する分析のバージョンが変わるまで使い回す。
+        系列の元になるデータが取り込まれていない場合は None。
+        """
+        check_timeseries(name, method)
+        width = downsample.normalize_width(width)
+
+        with self.lock:
+            version = tuple(self.versions[a] for a in dashboard_builder.TIMESERIES[name])
+            frame = self.cache.get_or_compute(
+                ("timeseries", name, version), lambda: dashboard_builder.build_timeseries(self.processor, name))
+            if frame is None or frame.empty:
+                return None
+            return self.cache.get_or_compute(
+                ("downsampled", name, version, start, end, width, method),
+                lambda: downsample.downsample_frame(frame, start, end, width, method))
+
+    def member_status_series(self, dates: List[str]) -> Optional[Dict]:
+        """
+        取り込み済みデータで、基準日ごとの会員数（active / trial / former / visitor）を返す
+
+        基準日の並びごとに、会員ステータスの分析のバージョンが変わるまで使い回す。
+        戻り値は {"version", "series"}（version は series を計算したときのバージョン）。
+        会員データが取り込まれていない場合は None。
+        """
+        try:
+            days = pd.DatetimeIndex(pd.to_datetime(dates)).normalize()
+        except (ValueError, TypeError) as e:
+            raise IngestError(f"基準日を日付として解釈できません: {e}")
+        key_dates = tuple(days.strftime("%Y-%m-%d"))
+
+        with self.lock:
+            if self.processor.member_data is None:
+                return None
+            version = self.versions["member_status"]
+            series = self.cache.get_or_compute(
+                ("member_status_series", version, key_dates),
+                lambda: dashboard_builder.member_status_series(self.processor, list(key_dates)))
+        return {"version": version, "series": series}
+
+    @staticmethod
+    def _sections(analyses: List[str]) -> List[str]:
+        sections = ["labels"]
+        for analysis in analyses:
+            sections += [s for s in ANALYSIS_SECTIONS[analysis] if s not in sections]
+        return sections
+
+    def _persist(self, pipeline: IngestPipeline, key: str, df: pd.DataFrame) -> Optional[str]:
+        if not self.persist_dir:
+            return None
+        os.makedirs(self.persist_dir, exist_ok=True)
+        path = os.path.join(self.persist_dir, pipeline.persist_name(key))
+        tmp_path = f"{path}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return path
+
+    def reset(self) -> int:
+        """
+        取り込み済みのデータ・分析結果と、保存済みのテーブルを消す（消したファイル数を返す）
+
+        バージョンは0に戻さずに上げるため、リセット前の値がキャッシュから返ることはない。
+        """
+        with self.lock:
+            reference_date = self.processor.reference_date
+            self.processor = SaunaDataProcessor()
+            self.processor.reference_date = reference_date
+            self.partitions = {t: {} for t in PARTITIONED_TABLES}
+            self.members = {"member": None, "member_delete": None}
+            self.results = {}
+            for analysis in self.versions:
+                self.versions[analysis] += 1
+            self.cache.clear()
+
+            removed = 0
+            if self.persist_dir and os.path.isdir(self.persist_dir):
+                for name in os.listdir(self.persist_dir):
+                    if classify_file(name) or name.endswith(".tmp"):
+                        os.remove(os.path.join(self.persist_dir, name))
+                        removed += 1
+            return removed
+
+    def restore(self, competitors: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        保存済みのデータを読み戻し、全分析を再計算したダッシュボードを返す（保存がなければNone）
+        """
+        if not self.persist_dir or not os.path.isdir(self.persist_dir):
+            return None
+        # 月の重なる古い形式のファイルがあっても、後から保存したものが優先されるよう更新順に読む
+        names = sorted((n for n in os.listdir(self.persist_dir) if classify_file(n)),
+                       key=lambda n: os.path.getmtime(os.path.join(self.persist_dir, n)))
+        if not names:
+            return None
+
+        with self.lock:
+            legacy = []
+            for name in names:
+                pipeline = self.pipeline(classify_file(name))
+                path = os.path.join(self.persist_dir, name)
+                with open(path, "rb") as f:
+                    encoding = sniffer.read_encoding(sniffer.sniff(f, name))
+                df = pipeline.normalize(pipeline.parse(path, encoding))
+                parts = pipeline.split(df, name)
+                self._apply(pipeline.table, parts)
+                if [pipeline.persist_name(key) for key in parts] != [name]:
+                    legacy.append((pipeline, name))
+            # 複数月をまとめて保存した古い形式のファイルは、月別のファイルに保存し直す
+            for pipeline, name in legacy:
+                os.remove(os.path.join(self.persist_dir, name))
+            for pipeline in {p.table: p for p, _ in legacy}.values():
+                for key, part in self.partitions[pipeline.table].items():
+                    self._persist(pipeline, key, part)
+            analyses = self._recompute({classify_file(n) for n in names})
+            print(f"取り込み済みデータを復元しました: {len(names)}ファイル, 分析={analyses}")
+            return {
+                "analyses": analyses,
+                "sections": self._sections(analyses),
+                "dashboard": dashboard_builder.build_dashboard(self.processor, self.results, competitors),
+            }
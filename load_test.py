@@ -0,0 +1,400 @@
+"""
+HTTP負荷試験スクリプト
+
+ローカルで起動した server.py / api.py に対して、ダッシュボード取得（/api/dashboard）、
+CSVアップロード（/api/upload-csv）、静的ファイル取得を指定した比率で混ぜたリクエストを
+並列に送り、エンドポイントごとのスループット・レイテンシ（p50/p95/p99）・エラー率を集計する。
+
+標準ライブラリのみで動作し、外部ネットワークには接続しない。
+アップロード用のCSVは synthetic_data.py で生成した予約枠データを使う。
+
+使用例:
+    python load_test.py --spawn server --concurrency 16 --duration 30
+    python load_test.py --base-url http://127.0.0.1:8000 --mix dashboard=80,upload=5,static=15
+"""
+import argparse
+import contextlib
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+DEFAULT_MIX = "dashboard=70,upload=10,static=20"
+DEFAULT_STATIC_DIR = os.path.join("frontend", "build")
+
+# 再利用中のKeep-Alive接続がサーバー側で閉じられていたときに発生する例外
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class Scenario:
+    """1種類のリクエスト（メソッド・パス・ボディ）を表す"""
+
+    def __init__(self, name: str, method: str, paths: List[str], body: bytes = b"",
+                 headers: Optional[Dict[str, str]] = None, check_body: bool = False):
+        self.name = name
+        self.method = method
+        self.paths = paths
+        self.body = body
+        self.headers = headers or {}
+        # True の場合、HTTP 200 でも JSON の status が「エラー」なら失敗として集計する
+        self.check_body = check_body
+
+    def pick_path(self, rng: random.Random) -> str:
+        return self.paths[0] if len(self.paths) == 1 else rng.choice(self.paths)
+
+
+def build_multipart(fields: Dict[str, str], file_field: str, filename: str, content: bytes,
+                    content_type: str = "text/csv") -> Tuple[bytes, str]:
+    """multipart/form-data のボディとContent-Typeを組み立てる"""
+    boundary = f"----sauna-load-test-{uuid.uuid4().hex}"
+    buf = io.BytesIO()
+    for name, value in fields.items():
+        buf.write(f"--{boundary}\r\n".encode())
+        buf.write(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        buf.write(f"{value}\r\n".encode())
+    buf.write(f"--{boundary}\r\n".encode())
+    buf.write(f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'.encode())
+    buf.write(f"Content-Type: {content_type}\r\n\r\n".encode())
+    buf.write(content)
+    buf.write(f"\r\n--{boundary}--\r\n".encode())
+    return buf.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def static_asset_paths(static_dir: str = DEFAULT_STATIC_DIR) -> List[str]:
+    """Reactビルドの asset-manifest.json から配信対象の静的ファイルのパスを取得する"""
+    manifest_path = os.path.join(static_dir, "asset-manifest.json")
+    paths = ["/"]
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        paths += ["/" + entry.lstrip("/") for entry in manifest.get("entrypoints", [])]
+    paths += ["/manifest.json", "/favicon.ico"]
+    return paths
+
+
+def default_upload_csv() -> Tuple[str, bytes]:
+    """アップロード用の予約枠CSV（合成データ1か月分）を生成する"""
+    from synthetic_data import generate_dataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_dataset(tmp, factor=1, months=1, seed=0)
+        name = next(n for n in sorted(os.listdir(tmp)) if n.startswith("frame_"))
+        with open(os.path.join(tmp, name), "rb") as f:
+            return name, f.read()
+
+
+def build_scenarios(upload_file: Optional[str], data_type: str, static_dir: str) -> Dict[str, Scenario]:
+    if upload_file:
+        with open(upload_file, "rb") as f:
+            upload_name, upload_content = os.path.basename(upload_file), f.read()
+    else:
+        upload_name, upload_content = default_upload_csv()
+    body, content_type = build_multipart({"data_type": data_type}, "file", upload_name, upload_content)
+    return {
+        "dashboard": Scenario("dashboard", "GET", ["/api/dashboard"]),
+        "upload": Scenario("upload", "POST", ["/api/upload-csv"], body, {"Content-Type": content_type},
+                           check_body=True),
+        "static": Scenario("static", "GET", static_asset_paths(static_dir)),
+    }
+
+
+def body_error(payload: bytes) -> Optional[str]:
+    """APIはアップロード失敗もHTTP 200で {"status": "エラー"} として返すため、ボディから判定する"""
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return "不正なJSONレスポンス"
+    if isinstance(data, dict) and data.get("status") == "エラー":
+        return f"エラー: {data.get('detail') or data.get('message')}"
+    return None
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """"dashboard=70,upload=10,static=20" 形式の比率指定を解析する"""
+    mix = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """ソート済みリストのパーセンタイル（線形補間）"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+class LoadTester:
+    """スレッドごとにKeep-Alive接続を持ち、比率に従ってリクエストを送り続ける"""
+
+    def __init__(self, base_url: str, scenarios: Dict[str, Scenario], mix: Dict[str, float],
+                 concurrency: int = 8, duration: float = 30.0, max_requests: Optional[int] = None,
+                 timeout: float = 30.0, seed: int = 0):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.https = parsed.scheme == "https"
+        unknown = set(mix) - set(scenarios)
+        if unknown:
+            raise ValueError(f"未知のシナリオが指定されました: {', '.join(sorted(unknown))}")
+        self.scenarios = scenarios
+        self.names = [name for name, weight in mix.items() if weight > 0]
+        self.weights = [mix[name] for name in self.names]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = max_requests
+        self.timeout = timeout
+        self.seed = seed
+        # (シナリオ名, ステータス, レイテンシ秒, 受信バイト数, エラー内容)
+        self.samples: List[Tuple[str, int, float, int, Optional[str]]] = []
+        self.reconnects: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._issued = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _next_ticket(self) -> bool:
+        """max_requests 指定時に送信数を制限する"""
+        if self.max_requests is None:
+            return True
+        with self._lock:
+            if self._issued >= self.max_requests:
+                return False
+            self._issued += 1
+            return True
+
+    def _send(self, conn: http.client.HTTPConnection, scenario: Scenario,
+              path: str) -> Tuple[int, int, bool, Optional[str]]:
+        conn.request(scenario.method, path, body=scenario.body or None, headers=scenario.headers)
+        response = conn.getresponse()
+        payload = response.read()
+        error = None if response.status < 400 else f"HTTP {response.status}"
+        if error is None and scenario.check_body:
+            error = body_error(payload)
+        return response.status, len(payload), response.will_close, error
+
+    def _worker(self, index: int, deadline: float) -> None:
+        rng = random.Random(self.seed + index)
+        conn = self._connect()
+        reused = False
+        local = []
+        reconnects: Dict[str, int] = defaultdict(int)
+        while time.perf_counter() < deadline and self._next_ticket():
+            name = rng.choices(self.names, weights=self.weights)[0]
+            scenario = self.scenarios[name]
+            path = scenario.pick_path(rng)
+            started = time.perf_counter()
+            try:
+                try:
+                    status, size, will_close, error = self._send(conn, scenario, path)
+                except STALE_CONNECTION_ERRORS:
+                    if not reused:
+                        raise
+                    # Keep-Alive接続がサーバー側で切断されていた場合は、一般的なHTTPクライアントと
+                    # 同様に1回だけ再接続して再送する（回数は reconnects として別集計）
+                    reconnects[name] += 1
+                    conn.close()
+                    conn = self._connect()
+                    status, size, will_close, error = self._send(conn, scenario, path)
+                elapsed = time.perf_counter() - started
+                local.append((name, status, elapsed, size, error))
+                reused = True
+                if will_close:
+                    conn.close()
+                    conn = self._connect()
+                    reused = False
+            except (OSError, http.client.HTTPException) as e:
+                elapsed = time.perf_counter() - started
+                local.append((name, 0, elapsed, 0, f"{type(e).__name__}: {e}"))
+                conn.close()
+                conn = self._connect()
+                reused = False
+        conn.close()
+        with self._lock:
+            self.samples.extend(local)
+            for name, count in reconnects.items():
+                self.reconnects[name] += count
+
+    def run(self) -> Dict:
+        started = time.perf_counter()
+        deadline = started + self.duration if self.duration else float("inf")
+        threads = [threading.Thread(target=self._worker, args=(i, deadline), daemon=True)
+                   for i in range(self.concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> Dict:
+        grouped: Dict[str, List] = defaultdict(list)
+        for sample in self.samples:
+            grouped[sample[0]].append(sample)
+        grouped["total"] = list(self.samples)
+
+        endpoints = {}
+        for name, samples in grouped.items():
+            latencies = sorted(s[2] for s in samples)
+            errors = [s for s in samples if s[4] is not None]
+            error_kinds: Dict[str, int] = defaultdict(int)
+            for s in errors:
+                error_kinds[s[4]] += 1
+            endpoints[name] = {
+                "requests": len(samples),
+                "errors": len(errors),
+                "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+                "throughput_rps": round(len(samples) / elapsed, 2) if elapsed > 0 else 0.0,
+                "latency_ms": {
+                    "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                    "p50": round(percentile(latencies, 50) * 1000, 2),
+                    "p95": round(percentile(latencies, 95) * 1000, 2),
+                    "p99": round(percentile(latencies, 99) * 1000, 2),
+                    "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+                },
+                "bytes_received": sum(s[3] for s in samples),
+                "reconnects": (sum(self.reconnects.values()) if name == "total" else self.reconnects.get(name, 0)),
+                "error_kinds": dict(error_kinds),
+            }
+        return {
+            "target": f"{'https' if self.https else 'http'}://{self.host}:{self.port}",
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "mix": dict(zip(self.names, self.weights)),
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: Dict) -> None:
+    print(f"\n対象: {report['target']}  並列数: {report['concurrency']}  実行時間: {report['elapsed_seconds']}秒")
+    print(f"{'エンドポイント':<12}{'件数':>8}{'rps':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'エラー率':>10}{'再接続':>8}")
+    for name, entry in report["endpoints"].items():
+        lat = entry["latency_ms"]
+        print(f"{name:<12}{entry['requests']:>8}{entry['throughput_rps']:>10.1f}{lat['p50']:>10.1f}"
+              f"{lat['p95']:>10.1f}{lat['p99']:>10.1f}{entry['error_rate'] * 100:>9.2f}%{entry['reconnects']:>8}")
+        for kind, count in entry["error_kinds"].items():
+            print(f"    {kind}: {count}件")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(target: str, port: int, log_path: str, workdir: str) -> subprocess.Popen:
+    """負荷試験用に server.py または api.py をサブプロセスで起動する
+
+    合成データのアップロードでリポジトリの uploads/ を上書きしないよう、作業ディレクトリは workdir にする。
+    分析データ（data/）は絶対パスで読み込み、静的ファイルはビルド済みディレクトリへのリンクを置く。
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PORT=str(port),
+               SAUNA_DATA_DIR=os.path.abspath(os.environ.get("SAUNA_DATA_DIR", os.path.join(repo_dir, "data"))))
+    build_dir = os.path.join(repo_dir, "frontend", "build")
+    if os.path.isdir(build_dir):
+        os.makedirs(os.path.join(workdir, "frontend"), exist_ok=True)
+        os.symlink(build_dir, os.path.join(workdir, "frontend", "build"), target_is_directory=True)
+    if target == "server":
+        cmd = [sys.executable, os.path.join(repo_dir, "server.py")]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "api:app", "--app-dir", repo_dir,
+               "--host", "127.0.0.1", "--port", str(port)]
+    log = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(cmd, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(host: str, port: int, path: str, timeout: float = 60.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"サーバーが {timeout}秒以内に起動しませんでした: {host}:{port}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ダッシュボードAPIとサーバーの負荷試験を実行します")
+    parser.add_argument("--base-url", default=None, help="対象URL（省略時は --spawn で起動したサーバー）")
+    parser.add_argument("--spawn", choices=["server", "api", "none"], default="none",
+                        help="負荷試験用にサーバーを起動する（server.py / api.py）")
+    parser.add_argument("--concurrency", type=int, default=8, help="並列数")
+    parser.add_argument("--duration", type=float, default=30.0, help="実行時間（秒）")
+    parser.add_argument("--requests", type=int, default=None, help="総リクエスト数の上限")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="シナリオの比率（例: dashboard=70,upload=10,static=20）")
+    parser.add_argument("--upload-file", default=None, help="アップロードに使うCSV（省略時は合成データ）")
+    parser.add_argument("--data-type", default="occupancy", help="アップロード時の data_type")
+    parser.add_argument("--static-dir", default=DEFAULT_STATIC_DIR, help="Reactビルドのディレクトリ")
+    parser.add_argument("--timeout", type=float, default=30.0, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="シナリオ選択の乱数シード")
+    parser.add_argument("--output", default=None, help="結果JSONの出力先")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if args.spawn == "api":
+        # api.py 単体には静的ファイルの配信がない
+        mix.pop("static", None)
+    scenarios = build_scenarios(args.upload_file, args.data_type, args.static_dir)
+
+    process = None
+    workdir = None
+    base_url = args.base_url
+    try:
+        if args.spawn != "none":
+            port = _free_port()
+            log_path = os.path.join(tempfile.gettempdir(), f"load_test_{args.spawn}_{port}.log")
+            workdir = tempfile.mkdtemp(prefix=f"load_test_{args.spawn}_")
+            process = spawn_server(args.spawn, port, log_path, workdir)
+            base_url = base_url or f"http://127.0.0.1:{port}"
+            print(f"{args.spawn} を起動しました（ポート {port}、作業ディレクトリ: {workdir}、ログ: {log_path}）")
+            wait_until_ready("127.0.0.1", port, "/api/dashboard")
+        if not base_url:
+            parser.error("--base-url か --spawn のどちらかを指定してください")
+
+        tester = LoadTester(base_url, scenarios, mix, concurrency=args.concurrency, duration=args.duration,
+                            max_requests=args.requests, timeout=args.timeout, seed=args.seed)
+        report = tester.run()
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Prometheus形式のメトリクスを収集・出力する軽量モジュール
+
+外部ライブラリに依存せず、api.py / server.py から共通のレジストリを参照する。
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windowsなど
+    resource = None
+
+# レイテンシ用のデフォルトバケット（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(labelnames, labelvalues)]
+    if extra:
+        pairs += [f'{k}="{_escape(v)}"' for k, v in extra.items()]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, float] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ラベルが一致しません（期待値: {self.labelnames}, 実際: {tuple(labels)}）")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError("カウンタは減算できません")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """任意に増減するゲージ（関数を渡すと出力時に値を取得する）"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 function: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._function = function
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    """累積バケット形式のヒストグラム"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [各バケットの件数..., +Infの件数], 合計値, 件数 を保持する
+        self._series: Dict[Tuple, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """withブロックの所要時間を記録する"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get(self, **labels) -> float:
+        """観測回数を返す"""
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(float(bound))})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+            lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """メトリクスを登録し、Prometheusのテキスト形式で出力する"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"メトリクス {metric.name} は既に登録されています")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def get_process_rss_bytes() -> float:
+    """プロセスの常駐メモリ量（RSS）をバイト単位で返す"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return float(resident_pages * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is not None:
+        # /procが無い環境では最大RSSで代用（Linux: KB, macOS: バイト）
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(maxrss if os.uname().sysname == "Darwin" else maxrss * 1024)
+    return 0.0
+
+
+# 共通レジストリ
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "sauna_http_request_duration_seconds",
+    "ルート別のHTTPリクエスト処理時間",
+    ("app", "method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "sauna_http_requests_in_flight",
+    "処理中のHTTPリクエスト数",
+    ("app",),
+)
+UPLOAD_BYTES = REGISTRY.counter(
+    "sauna_upload_bytes_total",
+    "アップロードされたCSVの累計バイト数",
+    ("data_type",),
+)
+INGESTED_ROWS = REGISTRY.counter(
+    "sauna_ingested_rows_total",
+    "取り込んだCSVの累計行数",
+    ("data_type",),
+)
+INGEST_ROWS_PER_SECOND = REGISTRY.gauge(
+    "sauna_ingest_rows_per_second",
+    "直近のアップロードにおけるCSV読み込み速度（行/秒）",
+    ("data_type",),
+)
+INGEST_STAGE_DURATION = REGISTRY.histogram(
+    "sauna_ingest_stage_duration_seconds",
+    "アップロード処理の段階別所要時間（parse, convert, aggregate, persist）",
+    ("data_type", "stage"),
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "sauna_cache_requests_total",
+    "キャッシュ参照回数（result=hit/miss）",
+    ("cache", "result"),
+)
+SNAPSHOT_VERSION = REGISTRY.gauge(
+    "sauna_snapshot_version",
+    "ダッシュボードデータのスナップショットバージョン",
+)
+PROCESS_RSS = REGISTRY.gauge(
+    "sauna_process_resident_memory_bytes",
+    "プロセスの常駐メモリ量（RSS）",
+    function=get_process_rss_bytes,
+)
+
+
+class _CacheHitRatio(Gauge):
+    """キャッシュ別のヒット率を参照回数から算出するゲージ"""
+
+    def samples(self) -> List[str]:
+        with CACHE_REQUESTS._lock:
+            values = dict(CACHE_REQUESTS._values)
+        caches = sorted({cache for cache, _ in values})
+        lines = []
+        for cache in caches:
+            hits = values.get((cache, "hit"), 0.0)
+            total = hits + values.get((cache, "miss"), 0.0)
+            ratio = hits / total if total else 0.0
+            lines.append(f"{self.name}{_format_labels(('cache',), (cache,))} {_format_value(ratio)}")
+        return lines
+
+
+CACHE_HIT_RATIO = REGISTRY.register(_CacheHitRatio(
+    "sauna_cache_hit_ratio",
+    "キャッシュ別のヒット率",
+    ("cache",),
+))
+
+
+def record_cache_access(cache: str, hit: bool) -> None:
+    """キャッシュの参照結果を記録する"""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def bump_snapshot_version() -> int:
+    """ダッシュボードデータ更新時にスナップショットバージョンを進める"""
+    SNAPSHOT_VERSION.inc()
+    return int(SNAPSHOT_VERSION.get())
+
+
+class StageTimer:
+    """
+    処理段階の切り替わりを記録し、段階ごとの所要時間をヒストグラムへ記録する
+
+    同じ段階に複数回入った場合は合算し、record()で1リクエスト1回として記録する。
+
+    使用例:
+        stages = StageTimer("occupancy")
+        stages.stage("parse")
+        ...
+        stages.stage("convert")
+        ...
+        stages.record()
+    """
+
+    def __init__(self, data_type: str, histogram: Histogram = INGEST_STAGE_DURATION):
+        self.data_type = data_type
+        self.histogram = histogram
+        self.durations: Dict[str, float] = {}
+        self._current: Optional[str] = None
+        self._started = 0.0
+
+    def stage(self, name: str) -> None:
+        """現在の段階を終了し、次の段階の計測を始める"""
+        self.stop()
+        self._current = name
+        self._started = time.perf_counter()
+
+    def stop(self) -> None:
+        """現在の段階の計測を終了する"""
+        if self._current is None:
+            return
+        elapsed = time.perf_counter() - self._started
+        self.durations[self._current] = self.durations.get(self._current, 0.0) + elapsed
+        self._current = None
+
+    def record(self) -> Dict[str, float]:
+        """計測した段階別の所要時間をヒストグラムへ記録する"""
+        self.stop()
+        for stage, elapsed in self.durations.items():
+            self.histogram.observe(elapsed, data_type=self.data_type, stage=stage)
+        return dict(self.durations)
+
+
+def record_ingest(data_type: str, size_bytes: int, rows: int, elapsed: float) -> None:
+    """アップロード1件分のバイト数・行数・取り込み速度を記録する"""
+    UPLOAD_BYTES.inc(size_bytes, data_type=data_type)
+    INGESTED_ROWS.inc(rows, data_type=data_type)
+    if elapsed > 0:
+        INGEST_ROWS_PER_SECOND.set(rows / elapsed, data_type=data_type)
+
+
+class MetricsMiddleware:
+    """
+    ルート別レイテンシと処理中リクエスト数を計測するASGIミドルウェア
+
+    server.pyがrequest._sendへ直接応答を流す転送処理と両立させるため、
+    BaseHTTPMiddlewareではなく素のASGIミドルウェアとして実装する。
+    """
+
+    def __init__(self, app, app_name: str = "api"):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message.get("status", 200)
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(app=self.app_name)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # パスパラメータによるラベル数の増加を避けるため、ルートのテンプレートを使う
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                app=self.app_name,
+                method=scope.get("method", ""),
+                route=route_path,
+                status=str(status),
+            )
+            HTTP_REQUESTS_IN_FLIGHT.dec(app=self.app_name)
+
+
+def instrument_app(app, app_name: str) -> None:
+    """FastAPIアプリにルート別レイテンシと処理中リクエスト数の計測を追加する"""
+    app.add_middleware(MetricsMiddleware, app_name=app_name)
+
+
+def render_latest() -> str:
+    """現在のメトリクスをPrometheusのテキスト形式で返す"""
+    return REGISTRY.render()
+
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4"
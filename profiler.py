@@ -0,0 +1,301 @@
+"""
+オンデマンドのサンプリングプロファイラ
+
+API呼び出しやrun_processor.pyの1回の実行を対象に、指定スレッドのスタックを
+一定間隔で採取し、フレームグラフ互換の折りたたみ形式（folded stacks）で保存する。
+pandasの処理はAPI呼び出し単位（DataFrame.groupby など）で所要時間を集計する。
+
+API側は環境変数 SAUNA_PROFILE_TOKEN が設定されている場合のみ有効になり、
+ヘッダー X-Profile-Token またはクエリ ?profile=<トークン> を付けたリクエストだけを計測する。
+イベントループのスレッドはそのリクエストのタスクを実行している間だけ採取し、
+run_in_threadpool（このモジュールのもの）でスレッドに渡した処理はそのワーカースレッドも採取する。
+"""
+import asyncio
+import contextvars
+import hmac
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+PROFILE_TOKEN_ENV = "SAUNA_PROFILE_TOKEN"
+PROFILE_DIR = os.environ.get("SAUNA_PROFILE_DIR", "profiles")
+PROFILE_HEADER = "x-profile-token"
+PROFILE_QUERY = "profile"
+
+# 計測中のリクエストのプロファイラ（run_in_threadpool がワーカースレッドを登録するのに使う）
+_REQUEST_PROFILER: contextvars.ContextVar = contextvars.ContextVar("sauna_request_profiler", default=None)
+
+# デフォルトのサンプリング間隔（秒）
+DEFAULT_INTERVAL = 0.005
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _pandas_operation(frame) -> Optional[str]:
+    """フレームがpandas内部であれば「DataFrame.groupby」のような操作名を返す"""
+    module = frame.f_globals.get("__name__", "")
+    if module != "pandas" and not module.startswith("pandas."):
+        return None
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name)
+
+
+class SamplingProfiler:
+    """
+    指定スレッドのスタックを一定間隔で採取するプロファイラ
+
+    task を指定した場合、最初のスレッド（イベントループ）はそのタスクの実行中だけ採取する。
+    add_thread で登録したスレッドは登録中ずっと採取する。
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = DEFAULT_INTERVAL,
+                 task: Optional[asyncio.Task] = None):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.task = task
+        self.loop = task.get_loop() if task is not None else None
+        self.worker_threads: Counter = Counter()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.pandas_samples: Counter = Counter()
+        self.ticks = 0
+        self.elapsed = 0.0
+        self.saved_paths: Optional[Tuple[str, str]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="sauna-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def add_thread(self, thread_id: int) -> None:
+        self.worker_threads[thread_id] += 1
+
+    def remove_thread(self, thread_id: int) -> None:
+        self.worker_threads[thread_id] -= 1
+        if self.worker_threads[thread_id] <= 0:
+            del self.worker_threads[thread_id]
+
+    def _sample(self) -> None:
+        self.ticks += 1
+        frames = sys._current_frames()
+        # イベントループのスレッドは、同時に処理している他のリクエストのタスクを除く
+        if self.task is None or asyncio.current_task(self.loop) is self.task:
+            self._record(frames.get(self.thread_id))
+        for thread_id in list(self.worker_threads):
+            self._record(frames.get(thread_id))
+
+    def _record(self, frame) -> None:
+        if frame is None:
+            return
+        labels: List[str] = []
+        pandas_op = None
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            op = _pandas_operation(frame)
+            if op is not None:
+                # ルート側に最も近いpandasフレーム（＝呼び出し元から見た操作）を採用
+                pandas_op = op
+            frame = frame.f_back
+        labels.reverse()
+        self.stacks[";".join(labels)] += 1
+        if pandas_op is not None:
+            self.pandas_samples[pandas_op] += 1
+
+    @property
+    def seconds_per_sample(self) -> float:
+        return self.elapsed / self.ticks if self.ticks else self.interval
+
+    def folded(self) -> str:
+        """flamegraph.pl / speedscope で読み込める折りたたみ形式を返す"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def pandas_timings(self, limit: int = 20) -> List[Dict]:
+        """pandasの操作ごとの推定所要時間を返す"""
+        per_sample = self.seconds_per_sample
+        return [
+            {"operation": op, "seconds": round(count * per_sample, 4), "samples": count}
+            for op, count in self.pandas_samples.most_common(limit)
+        ]
+
+    def top_functions(self, limit: int = 20) -> List[Dict]:
+        """スタックの末端（自己時間）が長い関数を返す"""
+        self_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack.rsplit(";", 1)[-1]] += count
+        per_sample = self.seconds_per_sample
+        return [
+            {"function": func, "seconds": round(count * per_sample, 4), "samples": count}
+            for func, count in self_counts.most_common(limit)
+        ]
+
+    def summary(self, label: str = "") -> Dict:
+        return {
+            "label": label,
+            "elapsed_seconds": round(self.elapsed, 4),
+            "interval_seconds": self.interval,
+            "samples": self.ticks,
+            "pandas_operations": self.pandas_timings(),
+            "top_functions": self.top_functions(),
+        }
+
+    def save(self, path: str, label: str = "") -> Tuple[str, str]:
+        """折りたたみスタック（.folded）と集計結果（.json）を保存する"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        base = path[:-len(".folded")] if path.endswith(".folded") else path
+        folded_path = base + ".folded"
+        summary_path = base + ".json"
+        with open(folded_path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(label), f, ensure_ascii=False, indent=2)
+        self.saved_paths = (folded_path, summary_path)
+        return self.saved_paths
+
+
+def default_profile_path(label: str, directory: str = PROFILE_DIR) -> str:
+    """ラベルと時刻からプロファイルの保存先を生成する"""
+    safe_label = re.sub(r"[^0-9A-Za-z_.-]+", "_", label).strip("_") or "profile"
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join(directory, f"{timestamp}_{uuid.uuid4().hex[:6]}_{safe_label}.folded")
+
+
+@contextmanager
+def profile_block(label: str, path: Optional[str] = None, interval: float = DEFAULT_INTERVAL):
+    """withブロック内の処理を現在のスレッドについてプロファイルし、ファイルに保存する"""
+    profiler = SamplingProfiler(interval=interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.save(path or default_profile_path(label), label)
+
+
+def get_profile_token() -> str:
+    return os.environ.get(PROFILE_TOKEN_ENV, "")
+
+
+def is_valid_token(candidate: Optional[str]) -> bool:
+    """トークンが設定済みかつ一致する場合のみTrueを返す"""
+    token = get_profile_token()
+    if not token or not candidate:
+        return False
+    return hmac.compare_digest(candidate.encode(), token.encode())
+
+
+def _request_token(scope) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == PROFILE_HEADER.encode():
+            return value.decode("latin-1")
+    query = scope.get("query_string", b"")
+    if query and PROFILE_QUERY.encode() in query:
+        values = parse_qs(query.decode("latin-1")).get(PROFILE_QUERY)
+        if values:
+            return values[0]
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    トークン付きのリクエストだけをプロファイルするASGIミドルウェア
+
+    トークン未設定時・フラグ無しのリクエストはヘッダーを確認するだけで素通しする。
+    プロファイル結果のファイル名はレスポンスヘッダー X-Profile-File で返す。
+    """
+
+    def __init__(self, app, app_name: str = "api"):
+        self.app = app
+        self.app_name = app_name
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not get_profile_token():
+            await self.app(scope, receive, send)
+            return
+
+        if not is_valid_token(_request_token(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{self.app_name}_{scope.get('method', '')}_{scope.get('path', '')}"
+        path = default_profile_path(label)
+        profile_name = os.path.basename(path)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-file", profile_name.encode()))
+                message["headers"] = headers
+            await send(message)
+
+        # async処理はイベントループのスレッドで実行されるため、このリクエストのタスクの実行中だけ
+        # このスレッドを採取する。run_in_threadpool で渡した処理はワーカースレッド側で採取する
+        profiler = SamplingProfiler(task=asyncio.current_task()).start()
+        token = _REQUEST_PROFILER.set(profiler)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _REQUEST_PROFILER.reset(token)
+            profiler.stop()
+            folded_path, _ = profiler.save(path, label)
+            print(f"プロファイルを保存しました: {folded_path}")
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """
+    starlette.concurrency.run_in_threadpool と同じ。計測中のリクエストから呼ばれた場合は、
+    処理を実行するワーカースレッドを実行中だけプロファイラの採取対象に加える
+    """
+    from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+    profiler = _REQUEST_PROFILER.get()
+    if profiler is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+
+    def traced(*call_args, **call_kwargs):
+        thread_id = threading.get_ident()
+        profiler.add_thread(thread_id)
+        try:
+            return func(*call_args, **call_kwargs)
+        finally:
+            profiler.remove_thread(thread_id)
+
+    return await _run_in_threadpool(traced, *args, **kwargs)
+
+
+def resolve_profile_file(name: str, directory: str = PROFILE_DIR) -> Optional[str]:
+    """保存済みプロファイルのパスを返す（ディレクトリ外の参照は拒否）"""
+    if os.path.basename(name) != name or not name.endswith((".folded", ".json")):
+        return None
+    path = os.path.join(directory, name)
+    return path if os.path.isfile(path) else None
+
+
+def profiling_enabled() -> bool:
+    return bool(get_profile_token())
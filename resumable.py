@@ -0,0 +1,203 @@
+"""
+再開可能な分割アップロード
+
+大きなエクスポートを不安定な回線から送れるよう、ファイルを番号付きのチャンクに分けて送る。
+
+1. POST   /api/uploads                          セッション作成（ファイル名・サイズ・チャンクサイズ）
+2. PUT    /api/uploads/{upload_id}/chunks/{n}   n番目のチャンクを送る（何度送り直してもよい）
+3. GET    /api/uploads/{upload_id}              受信済みのチャンクと、先頭から連続して受信済みのバイト数
+4. POST   /api/uploads/{upload_id}/complete     結合して取り込みを開始する
+   DELETE /api/uploads/{upload_id}              中止
+
+チャンクとセッション情報は LocalUploadBackend がローカルのファイルシステムに保存するため、
+サーバーを再起動しても途中から再開できる。結合はチャンクファイルを順に書き写すだけで、
+ファイル全体をメモリに載せることはない。
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+MB = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 5 * MB
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * MB
+# 最後の更新からこの秒数が過ぎたセッションは次のセッション作成時に削除する
+SESSION_TTL_SECONDS = int(os.environ.get("SAUNA_UPLOAD_SESSION_TTL", 24 * 60 * 60))
+UPLOAD_SESSION_DIR = os.environ.get("SAUNA_UPLOAD_SESSION_DIR", os.path.join("uploads", "sessions"))
+
+SESSION_FILE = "session.json"
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+COPY_CHUNK_SIZE = 1 * MB
+
+
+class UploadSessionError(Exception):
+    """セッションの操作に失敗した（status_code はそのままレスポンスに使う）"""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class LocalUploadBackend:
+    """ローカルのディレクトリにセッションごとのチャンクを保存する"""
+
+    def __init__(self, root: str = UPLOAD_SESSION_DIR, ttl_seconds: int = SESSION_TTL_SECONDS):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # セッション
+    # ------------------------------------------------------------------
+    def _session_dir(self, upload_id: str) -> str:
+        if not UPLOAD_ID_PATTERN.match(upload_id or ""):
+            raise UploadSessionError("アップロードIDが不正です", 404)
+        return os.path.join(self.root, upload_id)
+
+    def _chunk_path(self, upload_id: str, index: int) -> str:
+        return os.path.join(self._session_dir(upload_id), f"{index:06d}.part")
+
+    def _write_session(self, session: Dict) -> None:
+        path = os.path.join(self._session_dir(session["upload_id"]), SESSION_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def load(self, upload_id: str) -> Dict:
+        path = os.path.join(self._session_dir(upload_id), SESSION_FILE)
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadSessionError("アップロードセッションが見つかりません（期限切れの可能性があります）", 404)
+
+    def create(self, filename: str, size: int, data_type: str = "auto",
+               chunk_size: int = DEFAULT_CHUNK_SIZE, sha256: Optional[str] = None) -> Dict:
+        if size <= 0:
+            raise UploadSessionError("ファイルサイズを指定してください")
+        chunk_size = min(max(int(chunk_size or DEFAULT_CHUNK_SIZE), MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+        self.purge_expired()
+
+        upload_id = uuid.uuid4().hex
+        os.makedirs(self._session_dir(upload_id))
+        now = time.time()
+        session = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename or "upload.csv"),
+            "data_type": data_type or "auto",
+            "size": int(size),
+            "chunk_size": chunk_size,
+            "total_chunks": -(-int(size) // chunk_size),
+            "sha256": sha256,
+            "created_at": now,
+            "updated_at": now,
+        }
+        self._write_session(session)
+        return session
+
+    def delete(self, upload_id: str) -> None:
+        shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def purge_expired(self) -> List[str]:
+        """期限切れのセッションを削除する"""
+        removed = []
+        cutoff = time.time() - self.ttl_seconds
+        for upload_id in os.listdir(self.root):
+            if not UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            try:
+                if self.load(upload_id)["updated_at"] < cutoff:
+                    self.delete(upload_id)
+                    removed.append(upload_id)
+            except UploadSessionError:
+                self.delete(upload_id)
+                removed.append(upload_id)
+        return removed
+
+    # ------------------------------------------------------------------
+    # チャンク
+    # ------------------------------------------------------------------
+    def expected_chunk_size(self, session: Dict, index: int) -> int:
+        if not 0 <= index < session["total_chunks"]:
+            raise UploadSessionError(f"チャンク番号は 0〜{session['total_chunks'] - 1} で指定してください")
+        if index == session["total_chunks"] - 1:
+            return session["size"] - session["chunk_size"] * index
+        return session["chunk_size"]
+
+    def open_chunk(self, upload_id: str, index: int):
+        """チャンクの書き込み先（一時ファイル）を開く。commit_chunk で確定する"""
+        fd, tmp_path = tempfile.mkstemp(dir=self._session_dir(upload_id), prefix=f".{index:06d}-", suffix=".tmp")
+        return os.fdopen(fd, "wb"), tmp_path
+
+    def commit_chunk(self, session: Dict, index: int, tmp_path: str, size: int) -> None:
+        expected = self.expected_chunk_size(session, index)
+        if size != expected:
+            os.remove(tmp_path)
+            raise UploadSessionError(f"チャンク{index}のサイズが一致しません（受信 {size} / 期待 {expected} バイト）")
+        os.replace(tmp_path, self._chunk_path(session["upload_id"], index))
+        with self._lock:
+            session = self.load(session["upload_id"])
+            session["updated_at"] = time.time()
+            self._write_session(session)
+
+    def received_chunks(self, upload_id: str) -> List[int]:
+        names = os.listdir(self._session_dir(upload_id))
+        return sorted(int(n[:-len(".part")]) for n in names if n.endswith(".part") and n[:-len(".part")].isdigit())
+
+    def status(self, upload_id: str) -> Dict:
+        session = self.load(upload_id)
+        received = self.received_chunks(upload_id)
+        received_set = set(received)
+        contiguous = 0
+        while contiguous in received_set:
+            contiguous += 1
+        missing = [i for i in range(session["total_chunks"]) if i not in received_set]
+        return {
+            **session,
+            "received": received,
+            "missing": missing,
+            "received_bytes": sum(self.expected_chunk_size(session, i) for i in received),
+            # 先頭から連続して受信済みのバイト数（ここから送り直せばよい）
+            "offset": min(contiguous * session["chunk_size"], session["size"]),
+            "complete": not missing,
+        }
+
+    # ------------------------------------------------------------------
+    # 結合
+    # ------------------------------------------------------------------
+    def assemble(self, upload_id: str, directory: str) -> Dict:
+        """
+        全チャンクを順に書き写して1つのファイルにし、{path, size, sha256} を返す
+
+        チャンクが揃っていない場合と、作成時に指定された SHA-256 と一致しない場合はエラー。
+        """
+        status = self.status(upload_id)
+        if status["missing"]:
+            raise UploadSessionError(f"未受信のチャンクがあります: {status['missing'][:20]}", 409)
+
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(dir=directory, prefix=".assembled-", suffix=".tmp")
+        with os.fdopen(fd, "wb") as out:
+            for index in range(status["total_chunks"]):
+                with open(self._chunk_path(upload_id, index), "rb") as chunk:
+                    for block in iter(lambda: chunk.read(COPY_CHUNK_SIZE), b""):
+                        digest.update(block)
+                        out.write(block)
+            size = out.tell()
+
+        sha256 = digest.hexdigest()
+        if status.get("sha256") and status["sha256"].lower() != sha256:
+            os.remove(path)
+            raise UploadSessionError("結合したファイルのSHA-256が一致しません。アップロードをやり直してください", 422)
+        return {"path": path, "size": size, "sha256": sha256}
@@ -1,63 +1,333 @@
+"""
+サウナダッシュボードのデータ処理CLI
+
+サブコマンド:
+    ingest   CSVを読み込み、前処理済みのテーブルをJSON/Parquetで保存する
+    analyze  分析を実行して結果を表示する（--json でJSON出力）。サブコマンド省略時もこれを実行
+    export   分析結果をステージごとにJSON/Parquetファイルへ書き出す
+    bench    指定ステージを繰り返し実行して所要時間を計測する
+    watch    CSVの追加・更新を監視し、変わった部分だけ再計算してスナップショットを公開する
+    publish  ダッシュボード用の事前圧縮JSONをReactのビルドディレクトリへ書き出す
+
+例:
+    python run_processor.py analyze --stages occupancy sales --since 2024-01 --jobs 4
+    python run_processor.py export --format parquet --out output/analysis
+    python run_processor.py bench --synthetic 10 --repeat 3
+    python run_processor.py watch --snapshot-dir output/snapshot
+    python run_processor.py publish --build-dir frontend/build
+"""
 from data_processor import SaunaDataProcessor
 import pandas as pd
+import numpy as np
+import argparse
+import json
+import math
+import multiprocessing
 import os
 import re
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+import profiler
 
-def main():
-    # SaunaDataProcessorのインスタンスを作成
-    processor = SaunaDataProcessor()
+DATA_DIR = 'data'
+MB = 1024 * 1024
+
+# 読み込みステージ（テーブル）。--stages では load_member のように指定する
+LOAD_STAGES = ['member', 'reservation', 'frame', 'sales']
+
+# 分析ステージと、それぞれが必要とするテーブル
+ANALYSIS_STAGES = {
+    'member_status': ['member', 'reservation'],
+    'reservations': ['reservation', 'member'],
+    'occupancy': ['frame', 'reservation'],
+    'sales': ['sales', 'member', 'reservation'],
+    'cohorts': ['member'],
+    'survival': ['member'],
+    'member_value': ['sales', 'reservation'],
+    'conversion': ['reservation', 'member', 'sales'],
+}
+
+ANALYSIS_METHODS = {
+    'member_status': 'analyze_member_status',
+    'reservations': 'analyze_reservations',
+    'occupancy': 'analyze_occupancy',
+    'sales': 'analyze_sales',
+    'cohorts': 'analyze_cohorts',
+    'survival': 'analyze_survival',
+    'member_value': 'analyze_member_value',
+    'conversion': 'analyze_conversion',
+}
+
+# ファイル名末尾の年月（reservation_2024_01.csv / sales_2024_1.csv）
+MONTH_PATTERN = re.compile(r'_(\d{4})_(\d{1,2})\.csv$')
 
-    print("サウナダッシュボードデータ処理を開始します...")
 
-    # データディレクトリ内のファイルを検索
-    data_dir = 'data'
+# ---------------------------------------------------------------------------
+# ファイル検出
+# ---------------------------------------------------------------------------
+def file_month(filename: str) -> Optional[str]:
+    """ファイル名から対象月（YYYY-MM）を取り出す"""
+    match = MONTH_PATTERN.search(filename)
+    if not match:
+        return None
+    return f"{match.group(1)}-{int(match.group(2)):02d}"
+
+
+def in_month_range(month: Optional[str], since: Optional[str], until: Optional[str]) -> bool:
+    if month is None:
+        return True
+    if since and month < since:
+        return False
+    if until and month > until:
+        return False
+    return True
+
+
+def discover_files(data_dir: str, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, List[str]]:
+    """データディレクトリ内のCSVを種類ごとに分類する（月別ファイルは --since/--until で絞り込む）"""
+    files = {'member': [], 'member_delete': [], 'reservation': [], 'frame': [], 'sales': []}
     if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-        print(f"{data_dir}ディレクトリが存在しないため作成しました。")
-
-    # 利用可能なCSVファイルを確認
-    csv_files = [f for f in os.listdir(data_dir) if f.endswith('.csv')]
-    print(f"データディレクトリ内のCSVファイル: {len(csv_files)}個")
-
-    # 会員データファイルを検索
-    member_files = [f for f in csv_files if f.startswith('member')]
-    if member_files:
-        member_path = os.path.join(data_dir, [f for f in member_files if 'delete' not in f][0]) if [f for f in member_files if 'delete' not in f] else None
-        member_delete_path = os.path.join(data_dir, [f for f in member_files if 'delete' in f][0]) if [f for f in member_files if 'delete' in f] else None
-
-        if member_path:
-            print(f"会員データファイル: {member_path}")
-            if member_delete_path:
-                print(f"退会会員データファイル: {member_delete_path}")
-                processor.load_member_data(member_path, member_delete_path)
-            else:
-                print("退会会員データファイルが見つからないため、会員データのみ読み込みます。")
-                processor.load_member_data(member_path)
-
-            # 会員ステータスの分析
-            print("会員データを分析しています...")
-            member_stats = processor.analyze_member_status()
-            print("\n会員分析結果:")
-            print(f"体験会員数: {member_stats.get('trial_count', 'N/A')}")
-            print(f"現会員数: {member_stats.get('current_members', 'N/A')}")
-            print(f"退会会員数: {member_stats.get('former_members', 'N/A')}")
-            print(f"性別分布: {member_stats.get('gender_distribution', 'N/A')}")
-            if 'age_distribution' in member_stats:
-                print(f"年齢分布: 平均{member_stats['age_distribution'].get('mean', 'N/A')}歳")
+        return files
+
+    for name in sorted(os.listdir(data_dir)):
+        if not name.endswith('.csv'):
+            continue
+        path = os.path.join(data_dir, name)
+        if name.startswith('member'):
+            files['member_delete' if 'delete' in name else 'member'].append(path)
+            continue
+        for table in ('reservation', 'frame', 'sales'):
+            if table in name and in_month_range(file_month(name), since, until):
+                files[table].append(path)
+                break
+
+    # 月順に並べる（sales_2024_1.csv と sales_2024_10.csv の順序を正しくする）
+    for table in ('reservation', 'frame', 'sales'):
+        files[table].sort(key=lambda p: file_month(os.path.basename(p)) or os.path.basename(p))
+    return files
+
+
+# ---------------------------------------------------------------------------
+# ステージ実行
+# ---------------------------------------------------------------------------
+def resolve_stages(stages: Optional[List[str]]):
+    """--stages の指定から実行する分析ステージと必要なテーブルを決める"""
+    if not stages:
+        return list(ANALYSIS_STAGES), list(LOAD_STAGES)
+
+    load_names = [f'load_{t}' for t in LOAD_STAGES]
+    unknown = [s for s in stages if s not in ANALYSIS_STAGES and s not in load_names]
+    if unknown:
+        raise ValueError(f"不明なステージです: {', '.join(unknown)}（指定可能: {', '.join(list(ANALYSIS_STAGES) + load_names)}）")
+
+    analyses = [s for s in ANALYSIS_STAGES if s in stages]
+    tables = {s[len('load_'):] for s in stages if s in load_names}
+    for analysis in analyses:
+        tables.update(ANALYSIS_STAGES[analysis])
+    return analyses, [t for t in LOAD_STAGES if t in tables]
+
+
+def _load_table(processor: SaunaDataProcessor, table: str, files: Dict[str, List[str]]) -> int:
+    """1テーブルを読み込み、読み込んだ行数を返す"""
+    if table == 'member':
+        if not files['member']:
+            return 0
+        member_delete_path = files['member_delete'][0] if files['member_delete'] else None
+        processor.load_member_data(files['member'][0], member_delete_path)
+        return len(processor.member_data)
+
+    paths = files[table]
+    if not paths:
+        return 0
+    getattr(processor, f'load_{table}_data')(paths)
+    data = getattr(processor, f'{table}_data')
+    return len(data) if data is not None else 0
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    value = func(*args)
+    return value, time.perf_counter() - started
+
+
+def load_tables(processor: SaunaDataProcessor, tables: List[str], files: Dict[str, List[str]],
+                jobs: int = 1) -> List[Dict]:
+    """テーブルを読み込む（テーブルごとに別属性なので --jobs でスレッド並列化できる）"""
+    timings = []
+    if jobs > 1 and len(tables) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {t: executor.submit(_timed, _load_table, processor, t, files) for t in tables}
+            for table, future in futures.items():
+                rows, seconds = future.result()
+                timings.append({'stage': f'load_{table}', 'seconds': round(seconds, 4), 'rows': rows,
+                                'files': len(files[table])})
+    else:
+        for table in tables:
+            rows, seconds = _timed(_load_table, processor, table, files)
+            timings.append({'stage': f'load_{table}', 'seconds': round(seconds, 4), 'rows': rows,
+                            'files': len(files[table])})
+    return timings
+
+
+# fork したワーカープロセスが参照する処理済みデータ
+_WORKER_PROCESSOR = None
+
+
+def _run_analysis_in_worker(stage: str):
+    return _timed(getattr(_WORKER_PROCESSOR, ANALYSIS_METHODS[stage]))
+
+
+def run_analyses(processor: SaunaDataProcessor, analyses: List[str], jobs: int = 1):
+    """
+    分析ステージを実行し、(結果, タイミング) を返す
+
+    分析はPythonレベルの処理が中心でスレッドでは並列化されないため、--jobs 指定時は
+    読み込み済みデータを fork で引き継いだプロセスプールで実行する。
+    """
+    global _WORKER_PROCESSOR
+    results, timings = {}, []
+
+    use_processes = (jobs > 1 and len(analyses) > 1
+                     and 'fork' in multiprocessing.get_all_start_methods())
+    if use_processes:
+        _WORKER_PROCESSOR = processor
+        try:
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=min(jobs, len(analyses)), mp_context=context) as executor:
+                futures = {stage: executor.submit(_run_analysis_in_worker, stage) for stage in analyses}
+                for stage, future in futures.items():
+                    results[stage], seconds = future.result()
+                    timings.append({'stage': stage, 'seconds': round(seconds, 4)})
+        finally:
+            _WORKER_PROCESSOR = None
     else:
-        print("会員データファイルが見つかりません。")
-
-    # 予約データファイルを検索
-    reservation_files = sorted([f for f in csv_files if 'reservation' in f])
-    if reservation_files:
-        reservation_paths = [os.path.join(data_dir, f) for f in reservation_files]
-        print(f"\n予約データファイル: {len(reservation_paths)}個見つかりました")
-        print("予約データを読み込んでいます...")
-        processor.load_reservation_data(reservation_paths)
-
-        # 予約データの分析
-        print("予約データを分析しています...")
-        reservation_stats = processor.analyze_reservations()
+        for stage in analyses:
+            results[stage], seconds = _timed(getattr(processor, ANALYSIS_METHODS[stage]))
+            timings.append({'stage': stage, 'seconds': round(seconds, 4)})
+    return results, timings
+
+
+def build_processor(args) -> SaunaDataProcessor:
+    processor = SaunaDataProcessor()
+    if getattr(args, 'reference_date', None):
+        processor.set_reference_date(args.reference_date)
+    return processor
+
+
+def data_dir_for(args) -> str:
+    """--synthetic 指定時はベンチマーク用の合成データを使う"""
+    if getattr(args, 'synthetic', None):
+        from benchmark import DEFAULT_DATA_DIR, prepare_dataset
+        path, manifest = prepare_dataset(args.synthetic, 1, 24, 42, DEFAULT_DATA_DIR)
+        if not getattr(args, 'reference_date', None):
+            args.reference_date = manifest['reference_date']
+        return path
+    return args.data_dir
+
+
+# ---------------------------------------------------------------------------
+# 出力
+# ---------------------------------------------------------------------------
+def to_jsonable(value):
+    """分析結果（numpy型・Timestamp・NaNを含む）をJSONで扱える形に変換する"""
+    if isinstance(value, dict):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return None if pd.isna(value) else pd.Timestamp(value).isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+def flatten_result(result, prefix: str = '') -> pd.DataFrame:
+    """ネストした分析結果を (key, value, text) の表に展開する（Parquet出力用）"""
+    rows = []
+
+    def walk(value, key):
+        if isinstance(value, dict):
+            for k, v in value.items():
+                walk(v, f"{key}.{k}" if key else str(k))
+        elif isinstance(value, (list, tuple, set)):
+            rows.append((key, None, json.dumps(to_jsonable(list(value)), ensure_ascii=False)))
+        else:
+            value = to_jsonable(value)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                rows.append((key, float(value), None))
+            else:
+                rows.append((key, None, None if value is None else str(value)))
+
+    walk(result, prefix)
+    return pd.DataFrame(rows, columns=['key', 'value', 'text'])
+
+
+def _require_parquet():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise SystemExit(f"Parquet出力には pyarrow が必要です（pip install pyarrow）: {e}")
+
+
+def write_json(data, path: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(to_jsonable(data), f, ensure_ascii=False, indent=2)
+
+
+def print_timings(timings: List[Dict]) -> None:
+    print("\nステージ別の所要時間:")
+    for entry in timings:
+        rows = f"  {entry['rows']}行" if 'rows' in entry else ''
+        print(f"  {entry['stage']:<20} {entry['seconds']:>8.3f}秒{rows}")
+
+
+def print_memory_report(report: Dict) -> None:
+    print("\nメモリ使用量（テーブル別）:")
+    for table, entry in report['tables'].items():
+        load = report['load_stats'].get(f'load_{table}_data', {})
+        peak = f"  読み込み時ピークRSS {load['rss_peak_mb']:.1f}MB (+{load['peak_increase_mb']:.1f}MB)" if load else ''
+        print(f"  {table:<14} {entry['bytes'] / MB:>8.2f}MB  {entry['rows']:>8}行  {entry['bytes_per_row']:>8.1f}B/行"
+              f"  型変換後 {entry['projected_bytes'] / MB:>7.2f}MB{peak}")
+        for col in entry['columns'][:5]:
+            suggestion = f" → {col['suggested_dtype']} で -{col['savings_bytes'] / MB:.2f}MB" if col['suggested_dtype'] else ''
+            print(f"      {col['column']:<20} {col['dtype']:<15} {col['bytes'] / MB:>7.2f}MB{suggestion}")
+    print(f"  合計 {report['total_bytes'] / MB:.2f}MB → 型変換後 {report['projected_bytes'] / MB:.2f}MB"
+          f"（-{report['savings_bytes'] / MB:.2f}MB）")
+
+
+def report_memory(processor: SaunaDataProcessor, args) -> None:
+    """--memory-report 指定時、読み込み直後のメモリ使用量を表示（パス指定時はJSONにも保存）する"""
+    if getattr(args, 'memory_report', None) is None:
+        return
+    report = processor.memory_report()
+    print_memory_report(report)
+    if args.memory_report:
+        write_json(report, args.memory_report)
+        print(f"メモリレポートを保存しました: {args.memory_report}")
+
+
+def print_summary(results: Dict) -> None:
+    """分析結果を日本語で表示する"""
+    member_stats = results.get('member_status')
+    if member_stats is not None:
+        print("\n会員分析結果:")
+        print(f"体験会員数: {member_stats.get('trial_count', 'N/A')}")
+        print(f"現会員数: {member_stats.get('current_members', 'N/A')}")
+        print(f"退会会員数: {member_stats.get('former_members', 'N/A')}")
+        print(f"性別分布: {member_stats.get('gender_distribution', 'N/A')}")
+        if 'age_distribution' in member_stats:
+            print(f"年齢分布: 平均{member_stats['age_distribution'].get('mean', 'N/A')}歳")
+
+    reservation_stats = results.get('reservations')
+    if reservation_stats is not None:
         print("\n予約分析結果:")
         print(f"チケット種別分布: {reservation_stats.get('ticket_distribution', 'N/A')}")
         if 'monthly_stats' in reservation_stats:
@@ -68,81 +338,40 @@ def main():
             monthly_totals = {}
             for ticket_type, monthly_data in reservation_stats['monthly_stats'].items():
                 for month, count in monthly_data.items():
-                    if month in monthly_totals:
-                        monthly_totals[month] += count
-                    else:
-                        monthly_totals[month] = count
+                    monthly_totals[month] = monthly_totals.get(month, 0) + count
 
             print("\n月別予約総数:")
             for month, count in sorted(monthly_totals.items())[:10]:  # 最初の10ヶ月分だけ表示
                 print(f"{month}: {count}件")
-    else:
-        print("\n予約データファイルが見つかりません。")
-
-    # 予約枠データファイルを検索
-    frame_files = sorted([f for f in csv_files if 'frame' in f])
-    if frame_files:
-        frame_paths = [os.path.join(data_dir, f) for f in frame_files]
-        print(f"\n予約枠データファイル: {len(frame_paths)}個見つかりました")
-        print("予約枠データを読み込んでいます...")
-        processor.load_frame_data(frame_paths)
-
-        # 稼働率の分析
-        print("稼働率を分析しています...")
-        occupancy_stats = processor.analyze_occupancy()
+
+    occupancy_stats = results.get('occupancy')
+    if occupancy_stats is not None:
         print("\n稼働率分析結果:")
-        for room, stats in occupancy_stats.items():
+        print(f"全体の稼働率: {occupancy_stats.get('overall', 0):.1f}%")
+        weekday_jp = {
+            'Monday': '月曜日', 'Tuesday': '火曜日', 'Wednesday': '水曜日',
+            'Thursday': '木曜日', 'Friday': '金曜日', 'Saturday': '土曜日', 'Sunday': '日曜日'
+        }
+        # 稼働率はパーセント値（0〜100）
+        for room, stats in occupancy_stats.get('byRoom', {}).items():
             print(f"\n{room}の稼働率:")
-            print(f"月別平均稼働率: データあり")
-
-            # 最高稼働率と最低稼働率の月を表示
-            if 'monthly' in stats:
-                monthly = stats['monthly']
-                if monthly:
-                    max_month = max(monthly.items(), key=lambda x: x[1])
-                    min_month = min(monthly.items(), key=lambda x: x[1])
-                    print(f"最高稼働率: {max_month[0]} ({max_month[1]*100:.1f}%)")
-                    print(f"最低稼働率: {min_month[0]} ({min_month[1]*100:.1f}%)")
-
-            print(f"時間別平均稼働率: データあり")
-
-            # 最高稼働率の時間帯を表示
-            if 'hourly' in stats:
-                hourly = stats['hourly']
-                if hourly:
-                    max_hour = max(hourly.items(), key=lambda x: x[1])
-                    print(f"最も人気の時間帯: {max_hour[0]}時 ({max_hour[1]*100:.1f}%)")
-
-            print(f"曜日別平均稼働率: データあり")
-
-            # 曜日別稼働率を表示
-            if 'weekday' in stats:
-                weekday = stats['weekday']
-                if weekday:
-                    # 曜日を日本語に変換
-                    weekday_jp = {
-                        'Monday': '月曜日', 'Tuesday': '火曜日', 'Wednesday': '水曜日',
-                        'Thursday': '木曜日', 'Friday': '金曜日', 'Saturday': '土曜日', 'Sunday': '日曜日'
-                    }
-                    max_weekday = max(weekday.items(), key=lambda x: x[1])
-                    print(f"最も人気の曜日: {weekday_jp.get(max_weekday[0], max_weekday[0])} ({max_weekday[1]*100:.1f}%)")
-    else:
-        print("\n予約枠データファイルが見つかりません。")
-
-    # 売上データファイルを検索
-    sales_files = sorted([f for f in csv_files if 'sales' in f])
-    if sales_files:
-        sales_paths = [os.path.join(data_dir, f) for f in sales_files]
-        print(f"\n売上データファイル: {len(sales_paths)}個見つかりました")
-        print("売上データを読み込んでいます...")
-        processor.load_sales_data(sales_paths)
-
-        # 売上データの分析
-        print("売上データを分析しています...")
-        sales_stats = processor.analyze_sales()
+            monthly = {k: v for k, v in stats.get('monthly', {}).items() if pd.notna(v)}
+            if monthly:
+                max_month = max(monthly.items(), key=lambda x: x[1])
+                min_month = min(monthly.items(), key=lambda x: x[1])
+                print(f"最高稼働率: {max_month[0]} ({max_month[1]:.1f}%)")
+                print(f"最低稼働率: {min_month[0]} ({min_month[1]:.1f}%)")
+
+            weekday = {k: v for k, v in stats.get('weekday', {}).items() if pd.notna(v)}
+            if weekday:
+                max_weekday = max(weekday.items(), key=lambda x: x[1])
+                print(f"最も人気の曜日: {weekday_jp.get(max_weekday[0], max_weekday[0])} ({max_weekday[1]:.1f}%)")
+
+    sales_stats = results.get('sales')
+    if sales_stats is not None:
         print("\n売上分析結果:")
-        print(f"総売上: {sales_stats.get('total_sales', 'N/A'):,}円")
-        print(f"平均取引額: {sales_stats.get('average_transaction', 'N/A'):,.0f}円")
+        print(f"総売上: {sales_stats.get('total_sales', 0):,}円")
+        print(f"平均取引額: {sales_stats.get('average_transaction', 0):,.0f}円")
         if 'monthly_sales' in sales_stats:
             # 売上トップ5の月を表示
             top_months = sorted(sales_stats['monthly_sales'].items(), key=lambda x: x[1], reverse=True)[:5]
@@ -155,10 +384,307 @@ def main():
             print("\n直近の売上推移:")
             for month, sales in recent_months:
                 print(f"{month}: {sales:,}円")
-    else:
-        print("\n売上データファイルが見つかりません。")
 
+    cohort_stats = results.get('cohorts')
+    if cohort_stats:
+        print(f"\nコホート別継続率（基準月 {cohort_stats.get('reference_month')}）:")
+        for name, label in [('trial', 'トライアル受講月'), ('contract', 'プラン契約月')]:
+            table = cohort_stats.get(name)
+            if not table:
+                continue
+            print(f"{label}別: {len(table['cohorts'])}コホート")
+            for cohort, size, rates in list(zip(table['cohorts'], table['sizes'], table['retention']))[-6:]:
+                observed = [r for r in rates if r is not None]
+                print(f"{cohort}: {size}人, 0か月後 {observed[0]:.1f}% → 直近 {observed[-1]:.1f}%（{len(observed) - 1}か月後）")
+
+    survival_stats = results.get('survival')
+    if survival_stats:
+        overall = survival_stats['overall']
+        print(f"\n会員継続分析（基準日 {survival_stats.get('reference_date')}）:")
+        print(f"契約会員数: {overall['members']}人（退会 {overall['churned']}人, 継続中 {overall['censored']}人）")
+        for months in (3, 6, 12):
+            if months < len(overall['survival']):
+                print(f"{months}か月継続率: {overall['survival'][months]:.1f}%")
+        median = overall['median_months']
+        print(f"継続期間の中央値: {f'{median}か月' if median is not None else '未到達'}")
+        for plan, curve in survival_stats.get('by_plan', {}).items():
+            print(f"{plan}: {curve['members']}人, 退会 {curve['churned']}人")
+
+    value_stats = results.get('member_value')
+    if value_stats:
+        print(f"\n会員価値分析（基準日 {value_stats.get('reference_date')}）:")
+        print(f"利用者数: {value_stats['customers']}人, 平均LTV: {value_stats['average_ltv']:,.0f}円, "
+              f"月平均来店: {value_stats['average_visits_per_month']:.2f}回")
+        for segment in value_stats['segments']:
+            print(f"{segment['segment']}: {segment['customers']}人（{segment['share']:.1f}%）, "
+                  f"売上 {segment['revenue']:,}円（{segment['revenue_share']:.1f}%）")
+
+    conversion_stats = results.get('conversion')
+    if conversion_stats:
+        print(f"\n体験からの転換（基準日 {conversion_stats.get('reference_date')}）:")
+        print(" → ".join(f"{s['stage']} {s['count']}人（{s['rate']:.1f}%）" for s in conversion_stats['stages']))
+        print(f"契約までの日数の中央値: {conversion_stats['median_days_to_contract']}日, "
+              f"契約から初回支払いまで: {conversion_stats['median_days_to_paid']}日")
+        for entry in conversion_stats['by_room']:
+            print(f"{entry['name']}: 体験 {entry['trials']}人, 契約率 {entry['contract_rate']:.1f}%")
+
+
+# ---------------------------------------------------------------------------
+# サブコマンド
+# ---------------------------------------------------------------------------
+def cmd_ingest(args) -> int:
+    started = time.perf_counter()
+    _, tables = resolve_stages(args.stages)
+    if args.format == 'parquet':
+        _require_parquet()
+
+    files = discover_files(data_dir_for(args), args.since, args.until)
+    processor = build_processor(args)
+    timings = load_tables(processor, tables, files, args.jobs)
+    report_memory(processor, args)
+
+    os.makedirs(args.out, exist_ok=True)
+    for table in tables:
+        data = getattr(processor, f'{table}_data')
+        if data is None:
+            continue
+        write_started = time.perf_counter()
+        path = os.path.join(args.out, f'{table}.{args.format}')
+        if args.format == 'parquet':
+            # 混在型の列はParquetに書けないため文字列に揃える
+            data.astype({c: str for c in data.columns if data[c].dtype == object}).to_parquet(path, index=False)
+        else:
+            data.to_json(path, orient='records', force_ascii=False, date_format='iso', lines=True)
+        timings.append({'stage': f'write_{table}', 'seconds': round(time.perf_counter() - write_started, 4),
+                        'rows': len(data)})
+        print(f"{table}: {len(data)}行を保存しました -> {path}")
+    timings.append({'stage': 'total', 'seconds': round(time.perf_counter() - started, 4)})
+
+    write_json({'since': args.since, 'until': args.until, 'timings': timings},
+               os.path.join(args.out, 'ingest_report.json'))
+    print_timings(timings)
+    return 0
+
+
+def _analyze(args):
+    started = time.perf_counter()
+    analyses, tables = resolve_stages(args.stages)
+    files = discover_files(data_dir_for(args), args.since, args.until)
+    processor = build_processor(args)
+    load_timings = load_tables(processor, tables, files, args.jobs)
+    report_memory(processor, args)
+    results, analysis_timings = run_analyses(processor, analyses, args.jobs)
+    total = {'stage': 'total', 'seconds': round(time.perf_counter() - started, 4)}
+    return results, load_timings + analysis_timings + [total], processor
+
+
+def cmd_analyze(args) -> int:
+    if not args.json:
+        print("サウナダッシュボードデータ処理を開始します...")
+    results, timings, _ = _analyze(args)
+
+    if args.json:
+        document = {'results': results, 'timings': timings}
+        if args.out:
+            write_json(document, args.out)
+        else:
+            json.dump(to_jsonable(document), sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        return 0
+
+    print_summary(results)
+    print_timings(timings)
     print("\n分析が完了しました！")
+    return 0
+
+
+def cmd_export(args) -> int:
+    if args.format == 'parquet':
+        _require_parquet()
+    results, timings, _ = _analyze(args)
+
+    os.makedirs(args.out, exist_ok=True)
+    for stage, result in results.items():
+        path = os.path.join(args.out, f'{stage}.{args.format}')
+        if args.format == 'parquet':
+            flatten_result(result).to_parquet(path, index=False)
+        else:
+            write_json(result, path)
+        print(f"{stage}: {path}")
+
+    write_json({'since': args.since, 'until': args.until, 'stages': list(results), 'timings': timings},
+               os.path.join(args.out, 'manifest.json'))
+    print_timings(timings)
+    return 0
+
+
+def cmd_bench(args) -> int:
+    analyses, tables = resolve_stages(args.stages)
+    files = discover_files(data_dir_for(args), args.since, args.until)
+
+    runs: Dict[str, List[float]] = {}
+    rows: Dict[str, int] = {}
+    for _ in range(args.repeat):
+        processor = build_processor(args)
+        # 計測値を安定させるため、ステージは直列で実行する
+        load_timings = load_tables(processor, tables, files, jobs=1)
+        _, analysis_timings = run_analyses(processor, analyses, jobs=1)
+        for entry in load_timings + analysis_timings:
+            runs.setdefault(entry['stage'], []).append(entry['seconds'])
+            if 'rows' in entry:
+                rows[entry['stage']] = entry['rows']
+
+    report = {
+        'repeat': args.repeat,
+        'stages': {
+            stage: {
+                'median_seconds': round(statistics.median(values), 4),
+                'min_seconds': round(min(values), 4),
+                'max_seconds': round(max(values), 4),
+                **({'rows': rows[stage]} if stage in rows else {}),
+            }
+            for stage, values in runs.items()
+        },
+    }
+    if args.out:
+        write_json(report, args.out)
+        print(f"計測結果を保存しました: {args.out}")
+    print("\nステージ別の所要時間（中央値）:")
+    for stage, entry in report['stages'].items():
+        print(f"  {stage:<20} {entry['median_seconds']:>8.3f}秒 (最小 {entry['min_seconds']:.3f} / 最大 {entry['max_seconds']:.3f})")
+    return 0
+
+
+def load_competitors() -> Dict:
+    """競合データ（api.py で管理している固定データ）"""
+    try:
+        from api import initialize_competitors_data
+        return initialize_competitors_data()
+    except Exception as e:
+        print(f"警告: 競合データを読み込めませんでした: {e}")
+        return {}
+
+
+def cmd_publish(args) -> int:
+    from static_export import export_dashboard
+
+    results, timings, processor = _analyze(args)
+    started = time.perf_counter()
+    latest = export_dashboard(processor, results, args.build_dir, load_competitors(), args.keep)
+    timings.append({'stage': 'publish', 'seconds': round(time.perf_counter() - started, 4)})
+    print(f"ダッシュボードデータを書き出しました: {latest['dashboard']}（月別 {len(latest['months'])}件）")
+    print_timings(timings)
+    return 0
+
+
+def cmd_watch(args) -> int:
+    # watcher は run_processor の定義を使うため、ここで遅延インポートする
+    from watcher import DataWatcher
+
+    analyses, _ = resolve_stages(args.stages)
+    data_watcher = DataWatcher(
+        data_dir_for(args), args.snapshot_dir, analyses=analyses,
+        reference_date=args.reference_date, since=args.since, until=args.until,
+        mode=args.mode, interval=args.interval, static_build_dir=args.static_build_dir,
+    )
+    data_watcher.run(once=args.once)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="サウナダッシュボードのデータ処理を実行します")
+    parser.add_argument(
+        "--profile", nargs="?", const="", default=None, metavar="OUTPUT",
+        help="処理全体をプロファイルし、フレームグラフ用の折りたたみスタック(.folded)と集計(.json)を保存する"
+    )
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--data-dir", default=DATA_DIR, help="CSVのあるディレクトリ")
+    common.add_argument("--since", default=None, metavar="YYYY-MM", help="この月以降の月別ファイルだけを読み込む")
+    common.add_argument("--until", default=None, metavar="YYYY-MM", help="この月以前の月別ファイルだけを読み込む")
+    common.add_argument("--stages", nargs="+", default=None,
+                        help=f"実行するステージ（{', '.join(list(ANALYSIS_STAGES) + [f'load_{t}' for t in LOAD_STAGES])}）")
+    common.add_argument("--jobs", type=int, default=1, help="独立したステージを並列実行する数")
+    common.add_argument("--reference-date", default=None, help="会員ステータス判定の基準日（YYYY-MM-DD）")
+    common.add_argument("--synthetic", type=int, default=None, metavar="FACTOR",
+                        help="data/ の代わりに指定倍率の合成データを使う")
+    common.add_argument("--memory-report", nargs="?", const="", default=None, metavar="OUTPUT",
+                        help="読み込み後のテーブル別・列別メモリ使用量と型変換による削減見込みを表示する"
+                             "（OUTPUT 指定時はJSONにも保存。正確なピークRSSには --jobs 1 を使う）")
+
+    subparsers = parser.add_subparsers(dest="command")
+
+    ingest = subparsers.add_parser("ingest", parents=[common], help="CSVを読み込んでテーブルを保存する")
+    ingest.add_argument("--format", choices=["json", "parquet"], default="parquet", help="出力形式")
+    ingest.add_argument("--out", default=os.path.join("output", "ingest"), help="出力ディレクトリ")
+    ingest.set_defaults(func=cmd_ingest)
+
+    analyze = subparsers.add_parser("analyze", parents=[common], help="分析を実行して結果を表示する")
+    analyze.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    analyze.add_argument("--out", default=None, help="JSONの出力先（省略時は標準出力）")
+    analyze.set_defaults(func=cmd_analyze)
+
+    export = subparsers.add_parser("export", parents=[common], help="分析結果をファイルに書き出す")
+    export.add_argument("--format", choices=["json", "parquet"], default="json", help="出力形式")
+    export.add_argument("--out", default=os.path.join("output", "analysis"), help="出力ディレクトリ")
+    export.set_defaults(func=cmd_export)
+
+    bench = subparsers.add_parser("bench", parents=[common], help="ステージの所要時間を計測する")
+    bench.add_argument("--repeat", type=int, default=3, help="繰り返し回数")
+    bench.add_argument("--out", default=None, help="計測結果JSONの出力先")
+    bench.set_defaults(func=cmd_bench)
+
+    watch = subparsers.add_parser("watch", parents=[common], help="CSVの変更を監視してスナップショットを更新する")
+    watch.add_argument("--snapshot-dir", default=os.environ.get("SAUNA_SNAPSHOT_DIR", os.path.join("output", "snapshot")),
+                       help="スナップショットの出力先（APIの SAUNA_SNAPSHOT_DIR と揃える）")
+    watch.add_argument("--mode", choices=["auto", "inotify", "poll"], default="auto", help="変更の検知方法")
+    watch.add_argument("--interval", type=float, default=1.0, help="ポーリング間隔（秒）")
+    watch.add_argument("--once", action="store_true", help="スナップショットを1回作成して終了する")
+    watch.add_argument("--static-build-dir", default=None, metavar="BUILD_DIR",
+                       help="更新のたびに静的配信用のJSONもこのビルドディレクトリへ書き出す")
+    watch.set_defaults(func=cmd_watch)
+
+    publish = subparsers.add_parser("publish", parents=[common], help="ダッシュボード用の静的JSONを書き出す")
+    publish.add_argument("--build-dir", default=os.path.join("frontend", "build"), help="Reactのビルドディレクトリ")
+    publish.add_argument("--keep", type=int, default=3, help="残しておく過去バージョンの数")
+    publish.set_defaults(func=cmd_publish)
+
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+
+    # サブコマンド省略時は従来どおり全ステージを分析して表示する
+    if args.command is None:
+        profile = args.profile
+        args = parser.parse_args(["analyze"])
+        args.profile = profile
+
+    for month in (args.since, args.until):
+        if month and not re.fullmatch(r'\d{4}-\d{2}', month):
+            parser.error(f"月は YYYY-MM 形式で指定してください: {month}")
+    if args.since and args.until and args.since > args.until:
+        parser.error("--since は --until 以前の月を指定してください")
+    try:
+        resolve_stages(args.stages)
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.profile is None:
+        sys.exit(args.func(args))
+
+    with profiler.profile_block("run_processor", args.profile or None) as prof:
+        status = args.func(args)
+
+    folded_path, summary_path = prof.saved_paths
+    print(f"\nプロファイルを保存しました: {folded_path}")
+    print(f"集計結果: {summary_path}")
+    print("pandas処理の所要時間（上位10件）:")
+    for item in prof.pandas_timings(limit=10):
+        print(f"  {item['operation']}: {item['seconds']:.3f}秒")
+    sys.exit(status)
 
 if __name__ == "__main__":
     main()
@@ -3,8 +3,9 @@ import sys
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, HTMLResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, HTMLResponse, Response
 import api  # 既存のAPIモジュールをインポート
+import metrics
 
 # Streamlitコマンドの検出（--server.portなどの引数がある場合）
 if any('--server.port' in arg for arg in sys.argv):
@@ -105,6 +106,9 @@ app.add_middleware(
     allow_headers=["*"],  # すべてのヘッダーを許可
 )
 
+# ルート別レイテンシと処理中リクエスト数を計測（最後に追加して最も外側に置く）
+metrics.instrument_app(app, "server")
+
 # APIのCORS設定も更新
 api.app.add_middleware(
     CORSMiddleware,
@@ -193,6 +197,36 @@ async def read_index():
         """
         return HTMLResponse(content=html_content)
 
+# Prometheus形式のメトリクス（SPAのフォールバックより先に定義する）
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=metrics.render_latest(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+# 事前書き出ししたダッシュボードデータ（run_processor.py publish の出力）を提供
+# バージョン付きのファイルは内容が変わらないため長期キャッシュし、latest.json だけは毎回確認させる
+@app.get("/dashboard-data/{path:path}")
+async def read_dashboard_data(path: str, request: Request):
+    data_dir = os.path.realpath(os.path.join(static_dir, "dashboard-data"))
+    file_path = os.path.realpath(os.path.join(data_dir, path))
+    if not file_path.startswith(data_dir + os.sep) or not path.endswith(".json") or not os.path.isfile(file_path):
+        return JSONResponse({"error": f"ファイルが見つかりません: {path}"}, status_code=404)
+
+    headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Vary": "Accept-Encoding",
+        "Cache-Control": ("no-cache" if path == "latest.json"
+                          else "public, max-age=31536000, immutable"),
+    }
+
+    # クライアントが対応していれば事前圧縮版をそのまま返す
+    accept_encoding = request.headers.get("accept-encoding", "")
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accept_encoding and os.path.isfile(file_path + suffix):
+            headers["Content-Encoding"] = encoding
+            return FileResponse(file_path + suffix, media_type="application/json", headers=headers)
+
+    return FileResponse(file_path, media_type="application/json", headers=headers)
+
 # 静的ファイルを提供
 @app.get("/{path:path}")
 async def read_static(path: str, request: Request):
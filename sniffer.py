@@ -0,0 +1,170 @@
+"""
+CSVの先頭だけを読んでエクスポートの種類を判定する
+
+BOM・見出し行・数行のサンプルだけを読むため、ファイルサイズに関係なく一定時間で終わる。
+見出しの列名を下表の必須列と照合し、member / member_delete / reservation / frame / sales の
+いずれかを返す（列名は SaunaDataProcessor の *_cols と同じ実データの名前）。
+
+アップロードの事前確認（api.py の /api/upload-preview）と data_type="auto" の振り分け、
+upload_helper.py の送信前表示で使う。gzip / zstd 圧縮されたファイルもそのまま渡せる。
+"""
+import codecs
+import csv
+import io
+import os
+from typing import BinaryIO, Dict, List, Optional
+
+import compression
+
+READ_CHUNK_SIZE = 16 * 1024
+# 見出しが極端に長い場合でもこれ以上は読まない
+SNIFF_MAX_BYTES = 256 * 1024
+SAMPLE_ROWS = 5
+ENCODINGS = ["utf-8", "cp932"]
+DELIMITERS = [",", "\t", ";"]
+
+# 種類ごとの必須列（data_processor.py の load_*_data が確認する列に合わせる）
+SIGNATURES: Dict[str, List[str]] = {
+    "member": ["メンバーID", "性別", "年齢", "トライアル 受講日時", "プラン契約適用開始日", "プラン契約適用終了日"],
+    "reservation": ["予約ID", "メンバーID", "使用チケット", "受講日", "予約ステータス"],
+    "frame": ["ルーム名", "レッスン日", "スペース数", "総予約数"],
+    "sales": ["売上ID", "メンバーID", "精算日時", "合計金額"],
+}
+# 旧形式の列名（ingest.py の各パイプラインの aliases で正式な列名に読み替えられるもの）
+ALIAS_SIGNATURES: Dict[str, List[List[str]]] = {
+    "frame": [["date", "room", "occupancy"]],
+}
+# 会員一覧にだけあり、削除済み会員の出力にはない列
+MEMBER_ONLY_COLUMNS = ["初回契約プラン", "在籍期間", "個人情報取扱に関する同意日時"]
+
+DATA_TYPE_LABELS = {
+    "member": "会員データ",
+    "member_delete": "削除済み会員データ",
+    "reservation": "予約データ",
+    "frame": "レッスン枠（稼働率）データ",
+    "sales": "売上データ",
+}
+
+
+def _decode_head(raw: bytes, eof: bool):
+    """先頭のバイト列を文字列にする（途中で切れた多バイト文字は捨てる）"""
+    bom = raw.startswith(codecs.BOM_UTF8)
+    if bom:
+        raw = raw[len(codecs.BOM_UTF8):]
+    for encoding in ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            return decoder.decode(raw, final=eof), encoding, bom
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("utf-8", errors="replace"), "unknown", bom
+
+
+def _detect_delimiter(header_line: str) -> str:
+    counts = {d: header_line.count(d) for d in DELIMITERS}
+    delimiter = max(counts, key=counts.get)
+    return delimiter if counts[delimiter] else ","
+
+
+def detect_data_type(columns: List[str], filename: Optional[str] = None) -> Dict:
+    """
+    列名から種類を判定する
+
+    必須列がすべて揃う種類のうち、必須列の最も多いもの（より特徴的なもの）を選ぶ。
+    会員データは会員一覧にだけある列の有無、またはファイル名で削除済みかどうかを見分ける。
+    """
+    present = set(c.strip() for c in columns)
+    scores = {}
+    for data_type, required in SIGNATURES.items():
+        # 旧形式の列名がある種類は、最も一致率の高い組み合わせで評価する
+        variants = [required] + ALIAS_SIGNATURES.get(data_type, [])
+        required = max(variants, key=lambda cols: sum(c in present for c in cols) / len(cols))
+        matched = [c for c in required if c in present]
+        scores[data_type] = {"matched": len(matched), "required": len(required),
+                             "missing": [c for c in required if c not in present]}
+
+    candidates = [t for t, s in scores.items() if not s["missing"]]
+    if candidates:
+        data_type = max(candidates, key=lambda t: scores[t]["required"])
+        confidence = 1.0
+    else:
+        # 一部だけ一致する場合は最も近い種類を参考として返す
+        data_type = None
+        best = max(scores, key=lambda t: scores[t]["matched"] / scores[t]["required"])
+        confidence = round(scores[best]["matched"] / scores[best]["required"], 2)
+
+    if data_type == "member":
+        name = os.path.basename(filename or "")
+        if "delete" in name or not any(c in present for c in MEMBER_ONLY_COLUMNS):
+            data_type = "member_delete"
+
+    closest = data_type or (best if confidence else None)
+    missing = scores["member" if closest == "member_delete" else closest]["missing"] if closest else []
+    return {
+        "data_type": data_type,
+        "label": DATA_TYPE_LABELS.get(data_type),
+        "confidence": confidence,
+        "closest": closest,
+        "missing_columns": missing,
+    }
+
+
+def read_encoding(preview: Dict) -> str:
+    """sniff の結果から pandas.read_csv に渡す文字コードを返す（BOM付きは utf-8-sig、判定できなければ utf-8）"""
+    if preview.get("bom"):
+        return "utf-8-sig"
+    return preview["encoding"] if preview.get("encoding") in ENCODINGS else "utf-8"
+
+
+def sniff(fileobj: BinaryIO, filename: Optional[str] = None, sample_rows: int = SAMPLE_ROWS) -> Dict:
+    """
+    ファイルの先頭だけを読み、種類・文字コード・区切り文字・列名・サンプル行を返す
+
+    読み込み位置は呼び出し前の位置に戻す。読むのは最大 SNIFF_MAX_BYTES バイトまで。
+    """
+    position = fileobj.tell()
+    try:
+        stream, encoding_name = compression.open_decompressed(fileobj, filename)
+        raw = b""
+        eof = False
+        rows: List[List[str]] = []
+        text, encoding, bom = "", "utf-8", False
+        while len(raw) < SNIFF_MAX_BYTES:
+            chunk = stream.read(READ_CHUNK_SIZE)
+            if not chunk:
+                eof = True
+            raw += chunk
+            text, encoding, bom = _decode_head(raw, eof)
+            delimiter = _detect_delimiter(text.split("\n", 1)[0])
+            rows = list(csv.reader(io.StringIO(text, newline=""), delimiter=delimiter))
+            # 最後の行は途中で切れている可能性があるため、1行余分に読めたら十分
+            if eof or len(rows) > sample_rows + 1:
+                break
+    finally:
+        fileobj.seek(position)
+
+    if not eof and rows:
+        rows = rows[:-1]
+    if not rows:
+        return {"data_type": None, "label": None, "confidence": 0.0, "closest": None,
+                "missing_columns": [], "columns": [], "sample": [], "encoding": encoding,
+                "bom": bom, "delimiter": ",", "compression": encoding_name, "bytes_read": len(raw)}
+
+    columns = [c.strip() for c in rows[0]]
+    sample = [dict(zip(columns, row)) for row in rows[1:sample_rows + 1]]
+    result = detect_data_type(columns, filename)
+    result.update({
+        "columns": columns,
+        "sample": sample,
+        "encoding": encoding,
+        "bom": bom,
+        "delimiter": delimiter,
+        "compression": encoding_name,
+        "bytes_read": len(raw),
+    })
+    return result
+
+
+def sniff_path(path: str, sample_rows: int = SAMPLE_ROWS) -> Dict:
+    with open(path, "rb") as f:
+        return sniff(f, os.path.basename(path), sample_rows)
@@ -14,6 +14,12 @@ document.addEventListener('DOMContentLoaded', function() {
   // フォームがない場合は処理を中止
   if (!uploadForm) return;
 
+  // このサイズを超えるファイルは分割アップロード（/api/uploads）で送る
+  const RESUMABLE_THRESHOLD = 8 * 1024 * 1024;
+  const CHUNK_SIZE = 5 * 1024 * 1024;
+  // 1つのチャンクの送信を試みる回数
+  const CHUNK_RETRIES = 3;
+
   // ファイル選択時の処理
   fileInput.addEventListener('change', function() {
     if (fileInput.files.length > 0) {
@@ -76,10 +82,125 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   });
 
+  // 進捗バーを更新
+  function setProgress(ratio) {
+    if (uploadProgress) uploadProgress.style.width = `${Math.round(ratio * 100)}%`;
+  }
+
+  // JSONレスポンスを読み、エラーなら例外にする
+  function readJson(response) {
+    return response.text().then(text => {
+      let data;
+      try {
+        data = JSON.parse(text);
+      } catch (e) {
+        throw new Error(`サーバーエラー (${response.status}): ${text}`);
+      }
+      if (!response.ok || data.status === 'エラー') {
+        throw new Error(data.detail || `サーバーエラー (${response.status})`);
+      }
+      return data;
+    });
+  }
+
+  // 分割アップロード
+  // セッションIDを localStorage に残すため、途中で失敗しても同じファイルを選び直せば
+  // サーバーが受信済みのチャンクは送らずに続きから再開する
+  function uploadResumable(file, dataType, onProgress) {
+    const stateKey = `sauna-upload:${file.name}:${file.size}:${file.lastModified}:${dataType}`;
+
+    function createSession() {
+      return fetch('/api/uploads', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({filename: file.name, size: file.size, data_type: dataType, chunk_size: CHUNK_SIZE})
+      })
+      .then(readJson)
+      .then(session => {
+        localStorage.setItem(stateKey, session.upload_id);
+        return session;
+      });
+    }
+
+    function resumeOrCreate() {
+      const uploadId = localStorage.getItem(stateKey);
+      if (!uploadId) return createSession();
+      return fetch(`/api/uploads/${uploadId}`)
+        .then(response => response.ok ? readJson(response) : createSession())
+        .then(session => {
+          console.log('分割アップロード再開:', {uploadId: session.upload_id, received: session.received.length});
+          return session;
+        });
+    }
+
+    function putChunk(session, index, attempt) {
+      const start = index * session.chunk_size;
+      const blob = file.slice(start, Math.min(start + session.chunk_size, file.size));
+      return fetch(`/api/uploads/${session.upload_id}/chunks/${index}`, {
+        method: 'PUT',
+        headers: {'Content-Type': 'application/octet-stream'},
+        body: blob
+      })
+      .then(readJson)
+      .catch(error => {
+        if (attempt >= CHUNK_RETRIES) throw error;
+        console.warn(`チャンク${index}の送信に失敗しました（再試行 ${attempt}/${CHUNK_RETRIES}）:`, error);
+        return new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt))
+          .then(() => putChunk(session, index, attempt + 1));
+      });
+    }
+
+    return resumeOrCreate().then(session => {
+      let received = session.received.length;
+      onProgress(received / session.total_chunks);
+
+      // 未受信のチャンクを順に送る
+      const sendAll = session.missing.reduce((previous, index) => previous.then(() =>
+        putChunk(session, index, 1).then(() => {
+          received += 1;
+          // 結合と取り込みの分を残しておく
+          onProgress(0.95 * received / session.total_chunks);
+        })
+      ), Promise.resolve());
+
+      return sendAll
+        .then(() => fetch(`/api/uploads/${session.upload_id}/complete`, {method: 'POST'}))
+        .then(readJson)
+        .then(data => {
+          localStorage.removeItem(stateKey);
+          onProgress(1);
+          return data;
+        });
+    });
+  }
+
   // 単一ファイルアップロード処理
   function uploadSingleFile(file, dataType) {
     console.log('単一ファイルアップロード開始:', {file: file.name, type: dataType});
 
+    if (file.size > RESUMABLE_THRESHOLD) {
+      uploadResumable(file, dataType, setProgress)
+        .then(data => {
+          console.log('分割アップロード成功:', data);
+          alert(`ファイル「${file.name}」が正常にアップロードされました`);
+
+          // フォームリセット
+          uploadForm.reset();
+          selectedFilename.textContent = 'なし';
+          uploadError.textContent = '';
+        })
+        .catch(error => {
+          console.error('分割アップロードエラー:', error);
+          uploadError.textContent = `${error.message || 'アップロード中にエラーが発生しました'}（もう一度アップロードすると続きから再開します）`;
+        })
+        .finally(() => {
+          // ボタン復活
+          uploadButton.disabled = false;
+          uploadButton.textContent = 'アップロード';
+        });
+      return;
+    }
+
     // FormDataオブジェクトを作成
     const formData = new FormData();
     formData.append('file', file);
@@ -147,6 +268,12 @@ document.addEventListener('DOMContentLoaded', function() {
   function uploadMultipleFiles(files, dataType) {
     console.log('複数ファイルアップロード開始:', {filesCount: files.length, type: dataType});
 
+    // 大きなファイルを含む場合は1ファイルずつ分割アップロードで送る
+    if (Array.from(files).some(file => file.size > RESUMABLE_THRESHOLD)) {
+      uploadFilesResumable(Array.from(files), dataType);
+      return;
+    }
+
     // FormDataオブジェクトを作成
     const formData = new FormData();
     for (let i = 0; i < files.length; i++) {
@@ -221,6 +348,38 @@ document.addEventListener('DOMContentLoaded', function() {
     });
   }
 
+  // 複数ファイルを1つずつ分割アップロードで送る
+  function uploadFilesResumable(files, dataType) {
+    const results = [];
+    const sendAll = files.reduce((previous, file, i) => previous.then(() =>
+      uploadResumable(file, dataType, ratio => setProgress((i + ratio) / files.length))
+        .then(data => results.push({filename: file.name, status: '成功', data: data}))
+        .catch(error => results.push({filename: file.name, status: 'エラー', detail: error.message}))
+    ), Promise.resolve());
+
+    sendAll
+      .then(() => {
+        const errors = results.filter(r => r.status === 'エラー');
+        let message = `${files.length}個中${files.length - errors.length}個のファイルが正常にアップロードされました`;
+        if (errors.length > 0) {
+          message += `\n${errors.length}個のファイルでエラーが発生しました`;
+        }
+        alert(message);
+
+        // フォームリセット
+        uploadForm.reset();
+        selectedFilename.textContent = 'なし';
+        uploadError.textContent = errors.length > 0
+          ? `一部のファイルでエラーが発生（もう一度アップロードすると続きから再開します）: ${errors.map(e => `${e.filename}: ${e.detail}`).join('\n')}`
+          : '';
+      })
+      .finally(() => {
+        // ボタン復活
+        uploadButton.disabled = false;
+        uploadButton.textContent = 'アップロード';
+      });
+  }
+
   // シンプルアップロード（フォールバック用）
   function useSimpleUpload(file) {
     const simpleFormData = new FormData();
@@ -0,0 +1,115 @@
+"""
+ダッシュボードデータの静的書き出し
+
+分析結果をダッシュボード全体・セクション別・月別のJSONに変換し、Reactのビルド
+ディレクトリ（frontend/build/dashboard-data/）へバージョンごとに書き出す。
+各ファイルは gzip（brotli がインストールされていれば .br も）で事前圧縮しておき、
+server.py が Accept-Encoding に応じてそのまま返す。閲覧時には pandas を一切使わず、
+分析ワーカーが止まっていても最後に書き出したデータで画面を表示できる。
+
+    frontend/build/dashboard-data/
+        latest.json                       # 最新バージョンへの参照（キャッシュしない）
+        <version>/dashboard.json(.gz)     # DashboardData 全体
+        <version>/sections/<name>.json    # セクション別
+        <version>/months/<YYYY-MM>.json   # 月別の切り出し
+
+バージョンは内容のハッシュなので、同じデータを再度書き出しても新しいバージョンは作られない。
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Optional
+
+from dashboard_builder import DASHBOARD_SECTIONS, build_dashboard, build_month_slices
+from run_processor import to_jsonable
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DATA_DIRNAME = "dashboard-data"
+LATEST_FILE = "latest.json"
+DEFAULT_BUILD_DIR = os.path.join("frontend", "build")
+DEFAULT_KEEP_VERSIONS = 3
+
+
+def _serialize(data) -> bytes:
+    return json.dumps(to_jsonable(data), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_precompressed(path: str, payload: bytes) -> None:
+    """JSON本体と事前圧縮版（.gz / .br）を書き出す"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(payload)
+    # mtime=0 にして同じ内容なら同じバイト列になるようにする
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(payload, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(payload))
+
+
+def _prune_versions(data_dir: str, keep: int, current: str) -> None:
+    """古いバージョンを削除する（配信中のページが参照している可能性があるため直近 keep 件は残す）"""
+    versions = [
+        name for name in os.listdir(data_dir)
+        if os.path.isdir(os.path.join(data_dir, name)) and not name.startswith(".")
+    ]
+    versions.sort(key=lambda name: os.path.getmtime(os.path.join(data_dir, name)), reverse=True)
+    for name in versions[keep:]:
+        if name != current:
+            shutil.rmtree(os.path.join(data_dir, name), ignore_errors=True)
+
+
+def export_dashboard(processor, results: Dict, build_dir: str = DEFAULT_BUILD_DIR,
+                     competitors: Optional[Dict] = None, keep: int = DEFAULT_KEEP_VERSIONS) -> Dict:
+    """
+    分析結果を静的JSONとして書き出し、latest.json の内容を返す
+
+    バージョンのディレクトリは一時ディレクトリに書いてから名前を変えるため、
+    配信中に書きかけのファイルが見えることはない。
+    """
+    dashboard = build_dashboard(processor, results, competitors)
+    slices = build_month_slices(dashboard, results)
+
+    documents = {"dashboard.json": _serialize(dashboard)}
+    for section in DASHBOARD_SECTIONS:
+        documents[f"sections/{section}.json"] = _serialize(dashboard.get(section, {}))
+    for month, data in slices.items():
+        documents[f"months/{month}.json"] = _serialize(data)
+
+    digest = hashlib.sha256()
+    for name in sorted(documents):
+        digest.update(name.encode("utf-8"))
+        digest.update(documents[name])
+    version = digest.hexdigest()[:12]
+
+    data_dir = os.path.join(build_dir, STATIC_DATA_DIRNAME)
+    version_dir = os.path.join(data_dir, version)
+    if not os.path.isdir(version_dir):
+        tmp_dir = os.path.join(data_dir, f".{version}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        for name, payload in documents.items():
+            write_precompressed(os.path.join(tmp_dir, name), payload)
+        os.replace(tmp_dir, version_dir)
+
+    base = f"/{STATIC_DATA_DIRNAME}/{version}"
+    latest = {
+        "version": version,
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "dashboard": f"{base}/dashboard.json",
+        "sections": {section: f"{base}/sections/{section}.json" for section in DASHBOARD_SECTIONS},
+        "months": {month: f"{base}/months/{month}.json" for month in slices},
+    }
+    tmp_latest = os.path.join(data_dir, f".{LATEST_FILE}.{os.getpid()}.tmp")
+    with open(tmp_latest, "w", encoding="utf-8") as f:
+        json.dump(latest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_latest, os.path.join(data_dir, LATEST_FILE))
+
+    _prune_versions(data_dir, keep, version)
+    return latest
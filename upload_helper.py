@@ -1,20 +1,257 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""
+CSVファイルをAPIサーバーにアップロードする
 
+使用方法:
+    python3 upload_helper.py [ファイルパス] [データタイプ(optional)] [ポート番号(optional)]
+    python3 upload_helper.py sync [ディレクトリ] [--data-type auto] [--workers 4] ...
+
+データタイプを省略した場合（auto）はサーバーがCSVの見出しから種類を判定する。
+
+sync はディレクトリ内のCSVの内容ハッシュをサーバーに問い合わせ、未取り込みのものだけを
+keep-alive のコネクションプールで並列にアップロードする（失敗時は間隔を空けて再試行）。
+
+環境変数 UPLOAD_COMPRESSION（sync では --compress）に gzip / zstd を指定すると、
+CSVを圧縮して report.csv.gz / report.csv.zst として送る（サーバー側で展開しながら読み込む）。
+
+送信するサイズが分割サイズ（環境変数 UPLOAD_CHUNK_SIZE_MB、sync では --chunk-size、既定 8MB）を
+超えるファイルは、分割アップロード（/api/uploads）でチャンクごとに送る。途中で失敗しても
+セッションIDを .upload_sessions.json に残すため、同じコマンドをもう一度実行すれば
+未受信のチャンクだけを送り直して続きから再開する。
+"""
+
+import argparse
+import fnmatch
+import gzip
+import hashlib
 import os
 import requests
+import shutil
 import sys
 import json
-import pandas as pd  # データの前処理用にpandasをインポート
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import sniffer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+UPLOAD_PATH = "/api/upload-csv"
+CHECK_PATH = "/api/uploads/check"
+DEFAULT_PATTERN = "*.csv"
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+COMPRESSIONS = ["none", "gzip", "zstd"]
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+# 圧縮後の本文がこのサイズを超えるまではメモリ上に置き、超えたら一時ファイルに書き出す
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# 分割アップロード
+SESSIONS_PATH = "/api/uploads"
+DEFAULT_CHUNK_SIZE_MB = 8
+UPLOAD_STATE_PATH = os.environ.get("UPLOAD_STATE_PATH", ".upload_sessions.json")
+# 未受信のチャンクを問い合わせて送り直す回数
+CHUNK_ROUNDS = 3
+_state_lock = threading.Lock()
+
+def file_fingerprint(file_path):
+    """ファイル内容のSHA-256（サーバー側の取り込み済み判定と同じ方式）"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(FINGERPRINT_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def create_session(pool_size=4, retries=3, backoff=0.5):
+    """
+    keep-alive で接続を使い回すセッションを作成する
+
+    接続エラーと 429/5xx は backoff × 2^n 秒の間隔で retries 回まで再試行する。
+    アップロード（POST）も同じ内容を送り直すだけなので再試行の対象に含める。
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "POST", "PUT"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def print_room_summary(result):
+    """サーバーが返したルーム別稼働率を表示する"""
+    for room, stats in (result.get("room_occupancy") or {}).items():
+        print(f"{room}の平均稼働率: {stats.get('avg', 0):.1f}% (最小 {stats.get('min', 0):.1f}% / 最大 {stats.get('max', 0):.1f}%)")
+
+def compress_file(file_path, compression):
+    """
+    ファイルを少しずつ読みながら圧縮し、先頭に巻き戻した一時ファイルを返す
+
+    フィンガープリントは圧縮前の内容で計算するため、圧縮の有無で取り込み済み判定は変わらない。
+    """
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("zstd圧縮には zstandard パッケージが必要です（pip install zstandard）")
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    with open(file_path, "rb") as src:
+        if compression == "gzip":
+            # mtime=0 で同じ内容なら同じ圧縮結果にする
+            with gzip.GzipFile(fileobj=spooled, mode="wb", compresslevel=6, mtime=0) as dst:
+                shutil.copyfileobj(src, dst, FINGERPRINT_CHUNK_SIZE)
+        else:
+            zstandard.ZstdCompressor(level=3).copy_stream(src, spooled)
+    spooled.seek(0)
+    return spooled
+
+def post_csv(session, url, file_path, data_type, timeout=60, compression="none"):
+    """1ファイルをアップロードし、(ステータスコード, レスポンスJSON) を返す"""
+    if compression in COMPRESSION_SUFFIXES:
+        name = os.path.basename(file_path) + COMPRESSION_SUFFIXES[compression]
+        content_type = "application/gzip" if compression == "gzip" else "application/zstd"
+        with compress_file(file_path, compression) as f:
+            files = {"file": (name, f, content_type)}
+            response = session.post(url, files=files, data={"data_type": data_type}, timeout=timeout)
+    else:
+        with open(file_path, "rb") as f:
+            files = {"file": (os.path.basename(file_path), f, "text/csv")}
+            response = session.post(url, files=files, data={"data_type": data_type}, timeout=timeout)
+    try:
+        return response.status_code, response.json()
+    except ValueError:
+        return response.status_code, {"status": "エラー", "detail": response.text}
+
+def load_upload_state():
+    try:
+        with open(UPLOAD_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_upload_state(key, upload_id):
+    """再開用にセッションIDを記録する（upload_id が None なら削除）"""
+    with _state_lock:
+        state = load_upload_state()
+        if upload_id is None:
+            if key not in state:
+                return
+            state.pop(key)
+        else:
+            state[key] = upload_id
+        tmp_path = f"{UPLOAD_STATE_PATH}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, UPLOAD_STATE_PATH)
+
+def _response_json(response):
+    try:
+        return response.json()
+    except ValueError:
+        return {"status": "エラー", "detail": response.text}
+
+def open_upload_body(file_path, compression="none"):
+    """送信する本文（圧縮する場合は圧縮後の一時ファイル）と送信時のファイル名を返す"""
+    if compression in COMPRESSION_SUFFIXES:
+        return compress_file(file_path, compression), os.path.basename(file_path) + COMPRESSION_SUFFIXES[compression]
+    return open(file_path, "rb"), os.path.basename(file_path)
+
+def post_csv_resumable(session, base_url, file_path, data_type, chunk_size, timeout=60, compression="none"):
+    """
+    分割アップロードで1ファイルを送り、(ステータスコード, レスポンスJSON) を返す
+
+    前回途中で終わったセッションが残っていれば、受信済みのチャンクを問い合わせて続きから送る。
+    """
+    body, name = open_upload_body(file_path, compression)
+    with body:
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: body.read(FINGERPRINT_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        size = body.tell()
+        sha256 = digest.hexdigest()
+        state_key = f"{base_url}|{sha256}|{chunk_size}|{data_type}"
+
+        status = None
+        upload_id = load_upload_state().get(state_key)
+        if upload_id:
+            response = session.get(f"{base_url}{SESSIONS_PATH}/{upload_id}", timeout=timeout)
+            if response.status_code == 200:
+                status = response.json()
+                print(f"  再開: {file_path} ({len(status['received'])}/{status['total_chunks']}チャンク受信済み)")
+        if status is None:
+            response = session.post(f"{base_url}{SESSIONS_PATH}", timeout=timeout, json={
+                "filename": name, "size": size, "data_type": data_type,
+                "chunk_size": chunk_size, "sha256": sha256,
+            })
+            if response.status_code != 201:
+                return response.status_code, _response_json(response)
+            status = response.json()
+            upload_id = status["upload_id"]
+            save_upload_state(state_key, upload_id)
 
-def upload_csv(file_path, data_type="occupancy", port=8000):
+        # サーバーが決めたチャンクサイズに合わせて、未受信のチャンクだけを送る
+        for _ in range(CHUNK_ROUNDS):
+            if not status["missing"]:
+                break
+            for index in status["missing"]:
+                body.seek(index * status["chunk_size"])
+                chunk = body.read(status["chunk_size"])
+                try:
+                    response = session.put(f"{base_url}{SESSIONS_PATH}/{upload_id}/chunks/{index}",
+                                           data=chunk, timeout=timeout,
+                                           headers={"Content-Type": "application/octet-stream"})
+                except requests.exceptions.RequestException as e:
+                    print(f"  チャンク{index}の送信に失敗しました（後で送り直します）: {e}")
+                    continue
+                if response.status_code == 404:
+                    save_upload_state(state_key, None)
+                    return response.status_code, _response_json(response)
+            response = session.get(f"{base_url}{SESSIONS_PATH}/{upload_id}", timeout=timeout)
+            if response.status_code != 200:
+                return response.status_code, _response_json(response)
+            status = response.json()
+
+        if status["missing"]:
+            return 409, {"status": "エラー", "upload_id": upload_id,
+                         "detail": f"{len(status['missing'])}個のチャンクを送信できませんでした（再実行すると続きから再開します）"}
+
+    response = session.post(f"{base_url}{SESSIONS_PATH}/{upload_id}/complete", timeout=max(timeout, 300))
+    result = _response_json(response)
+    if response.status_code == 200:
+        save_upload_state(state_key, None)
+    return response.status_code, result
+
+def send_csv(session, base_url, file_path, data_type, timeout=60, compression="none", chunk_size=None):
+    """分割サイズを超えるファイルは分割アップロード、それ以外は1リクエストで送る"""
+    if chunk_size and os.path.getsize(file_path) > chunk_size:
+        return post_csv_resumable(session, base_url, file_path, data_type, chunk_size,
+                                  timeout=timeout, compression=compression)
+    return post_csv(session, f"{base_url}{UPLOAD_PATH}", file_path, data_type,
+                    timeout=timeout, compression=compression)
+
+def chunk_size_from_env():
+    """環境変数 UPLOAD_CHUNK_SIZE_MB の分割サイズ（バイト、0 なら分割しない）"""
+    return int(float(os.environ.get("UPLOAD_CHUNK_SIZE_MB", DEFAULT_CHUNK_SIZE_MB)) * 1024 * 1024)
+
+def upload_csv(file_path, data_type="auto", port=8000, session=None, compression=None, chunk_size=None):
     """
     CSVファイルをAPIサーバーにアップロードする
 
     Args:
         file_path: アップロードするCSVファイルのパス
-        data_type: データの種類（occupancy, sales, memberのいずれか）
+        data_type: データの種類（auto の場合はサーバーが見出しから判定）
         port: APIサーバーのポート番号
+        session: 使い回す requests.Session（省略時は新規作成）
+        compression: none / gzip / zstd（省略時は環境変数 UPLOAD_COMPRESSION、未設定なら none）
+        chunk_size: これを超えるファイルは分割アップロードする（省略時は環境変数 UPLOAD_CHUNK_SIZE_MB）
 
     Returns:
         レスポンスのJSON
@@ -24,84 +261,190 @@ def upload_csv(file_path, data_type="occupancy", port=8000):
         print(f"エラー: ファイル {file_path} が見つかりません")
         return None
 
-    # APIエンドポイントURL
-    url = f"http://localhost:{port}/api/upload-csv"
+    # APIサーバーのURL
+    base_url = f"http://localhost:{port}"
+
+    if compression is None:
+        compression = os.environ.get("UPLOAD_COMPRESSION", "none")
+    if chunk_size is None:
+        chunk_size = chunk_size_from_env()
 
     # 使用するポート番号を表示
     print(f"使用ポート: {port}")
-
-    # CSVファイルの分析（レッスンデータかどうかを確認）
-    try:
-        df = pd.read_csv(file_path)
-        columns = df.columns.tolist()
-        print(f"CSVファイルの列名: {columns}")
-
-        # レッスンフォーマット検出
-        is_lesson_format = any("レッスン日" in col for col in columns) and any("ルーム名" in col for col in columns)
-        if is_lesson_format:
-            print("レッスン予約フォーマットを検出しました")
-
-            # ルーム別の予約状況を出力
-            for room in df["ルーム名"].unique():
-                room_data = df[df["ルーム名"] == room]
-                print(f"{room}の予約: {len(room_data)}件")
-
-                # 稼働率の状況
-                if "稼働率" in columns:
-                    occupancy_sum = 0
-                    try:
-                        # 稼働率が数値でない場合の処理
-                        occupancy_values = []
-                        for val in room_data["稼働率"]:
-                            if isinstance(val, str) and '%' in val:
-                                occupancy_values.append(float(val.replace('%', '')))
-                            elif isinstance(val, (int, float)):
-                                occupancy_values.append(float(val))
-                        if occupancy_values:
-                            avg_occupancy = sum(occupancy_values) / len(occupancy_values)
-                            print(f"{room}の平均稼働率: {avg_occupancy:.1f}%")
-                    except Exception as e:
-                        print(f"稼働率計算エラー: {str(e)}")
-    except Exception as e:
-        print(f"CSVファイル分析エラー: {str(e)}")
-
-    # リクエストのパラメータ
-    files = {"file": open(file_path, "rb")}
-    data = {"data_type": data_type}
-
-    print(f"アップロード中: {file_path} (タイプ: {data_type})")
+    if data_type == "auto":
+        detected = sniffer.sniff_path(file_path)
+        print(f"判定結果: {detected['label'] or '不明'} ({detected['data_type']})")
+    print(f"アップロード中: {file_path} (タイプ: {data_type}, 圧縮: {compression})")
 
     # POSTリクエストを送信
     try:
-        response = requests.post(url, files=files, data=data)
-        if response.status_code == 200:
-            print("アップロード成功！")
-            try:
-                result = response.json()
-                print(json.dumps(result, indent=2, ensure_ascii=False))
-                return result
-            except json.JSONDecodeError:
-                print(f"警告: レスポンスのJSONパースに失敗しました。レスポンス本文: {response.text}")
-                return {"error": "レスポンスのJSONパースに失敗しました"}
+        if session is None:
+            with create_session(pool_size=1) as own_session:
+                status_code, result = send_csv(own_session, base_url, file_path, data_type,
+                                               compression=compression, chunk_size=chunk_size)
         else:
-            print(f"エラー: ステータスコード {response.status_code}")
-            try:
-                error_detail = response.json()
-                print(json.dumps(error_detail, indent=2, ensure_ascii=False))
-            except:
-                print(f"レスポンス本文: {response.text}")
-            return {"error": f"エラーレスポンス: {response.status_code}"}
-    except requests.exceptions.RequestException as e:
+            status_code, result = send_csv(session, base_url, file_path, data_type,
+                                           compression=compression, chunk_size=chunk_size)
+    except (requests.exceptions.RequestException, ValueError) as e:
         print(f"エラー: {str(e)}")
         return {"error": str(e)}
 
+    if status_code == 200:
+        print("アップロード成功！")
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        print_room_summary(result)
+        return result
+
+    print(f"エラー: ステータスコード {status_code}")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return {"error": f"エラーレスポンス: {status_code}"}
+
+def find_csv_files(directory, pattern=DEFAULT_PATTERN):
+    """ディレクトリ以下を再帰的に探し、パターンに一致するファイルをパス順に返す"""
+    paths = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if fnmatch.fnmatch(name, pattern):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+def fetch_known_fingerprints(session, base_url, fingerprints, timeout=30):
+    """サーバーが取り込み済みのハッシュを問い合わせる（未対応のサーバーなら空集合）"""
+    if not fingerprints:
+        return set()
+    try:
+        response = session.post(f"{base_url}{CHECK_PATH}", json={"fingerprints": fingerprints}, timeout=timeout)
+    except requests.exceptions.RequestException as e:
+        print(f"警告: 取り込み済みファイルを確認できませんでした（すべて送信します）: {e}")
+        return set()
+    if response.status_code != 200:
+        print(f"警告: 取り込み済み確認に未対応のサーバーです（ステータス {response.status_code}）。すべて送信します")
+        return set()
+    return set(response.json().get("known", []))
+
+def sync_directory(directory, data_type="auto", base_url="http://localhost:8000",
+                   workers=4, retries=3, backoff=0.5, pattern=DEFAULT_PATTERN, dry_run=False,
+                   compression="none", chunk_size=None):
+    """
+    ディレクトリ内のCSVのうち、サーバーが未取り込みのものだけを並列にアップロードする
+
+    Returns:
+        集計結果の辞書（scanned, skipped, uploaded, failed, bytes, seconds, failures）
+        bytes は圧縮前のファイルサイズの合計
+        chunk_size を超えるファイルは分割アップロードで送る（None なら分割しない）
+    """
+    started = time.perf_counter()
+    paths = find_csv_files(directory, pattern)
+    print(f"{directory}: {len(paths)}件のファイルが見つかりました")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        fingerprints = dict(zip(paths, executor.map(file_fingerprint, paths)))
+
+    summary = {"scanned": len(paths), "skipped": 0, "uploaded": 0, "failed": 0,
+               "bytes": 0, "seconds": 0.0, "failures": []}
+
+    with create_session(pool_size=workers, retries=retries, backoff=backoff) as session:
+        known = fetch_known_fingerprints(session, base_url, sorted(set(fingerprints.values())))
+        pending = [p for p in paths if fingerprints[p] not in known]
+        summary["skipped"] = len(paths) - len(pending)
+        print(f"取り込み済み: {summary['skipped']}件、送信対象: {len(pending)}件")
+
+        if dry_run:
+            for path in pending:
+                # 見出しだけを読んで種類を表示する（ファイルサイズによらず一定時間）
+                detected = sniffer.sniff_path(path)["data_type"] if data_type == "auto" else data_type
+                print(f"  送信予定: {path} ({detected or '種類不明'})")
+            summary["seconds"] = round(time.perf_counter() - started, 3)
+            return summary
+
+        def upload_one(path):
+            file_started = time.perf_counter()
+            status_code, result = send_csv(session, base_url, path, data_type,
+                                           compression=compression, chunk_size=chunk_size)
+            return path, status_code, result, time.perf_counter() - file_started
+
+        # 同じ内容のファイルは1回だけ送る
+        unique_pending = list({fingerprints[p]: p for p in pending}.values())
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(upload_one, path): path for path in unique_pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    _, status_code, result, seconds = future.result()
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    summary["failed"] += 1
+                    summary["failures"].append({"path": path, "status_code": None, "detail": str(e)})
+                    print(f"  失敗: {path} ({e})")
+                    continue
+
+                if status_code == 200 and isinstance(result, dict) and result.get("status") == "成功":
+                    summary["uploaded"] += 1
+                    summary["bytes"] += os.path.getsize(path)
+                    print(f"  完了: {path} ({seconds:.2f}秒)")
+                else:
+                    summary["failed"] += 1
+                    detail = result.get("detail") if isinstance(result, dict) else result
+                    summary["failures"].append({"path": path, "status_code": status_code, "detail": detail})
+                    print(f"  失敗（{status_code}）: {path} ({seconds:.2f}秒)")
+
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+def print_sync_summary(summary):
+    seconds = summary["seconds"] or 1e-9
+    mb = summary["bytes"] / (1024 * 1024)
+    print("\n=== 同期結果 ===")
+    print(f"対象: {summary['scanned']}件 / スキップ: {summary['skipped']}件 / "
+          f"送信: {summary['uploaded']}件 / 失敗: {summary['failed']}件")
+    print(f"転送量: {mb:.2f}MB / 所要時間: {summary['seconds']:.2f}秒 / "
+          f"スループット: {mb / seconds:.2f}MB/秒, {summary['uploaded'] / seconds:.2f}ファイル/秒")
+    for failure in summary["failures"]:
+        print(f"  失敗: {failure.get('path', '')} {failure.get('detail', '')}")
+
+def sync_main(argv):
+    parser = argparse.ArgumentParser(prog="upload_helper.py sync",
+                                     description="ディレクトリ内の未取り込みCSVをまとめてアップロードします")
+    parser.add_argument("directory", help="CSVのあるディレクトリ（サブディレクトリも対象）")
+    parser.add_argument("--data-type", default="auto", help="データの種類（auto はサーバー側で見出しから判定）")
+    parser.add_argument("--url", default=None, help="APIサーバーのURL（省略時は http://localhost:PORT）")
+    parser.add_argument("--port", type=int, default=8000, help="APIサーバーのポート番号")
+    parser.add_argument("--pattern", default=DEFAULT_PATTERN, help="対象ファイル名のパターン（例: frame_*.csv）")
+    parser.add_argument("--workers", type=int, default=4, help="同時アップロード数")
+    parser.add_argument("--retries", type=int, default=3, help="失敗時の再試行回数")
+    parser.add_argument("--backoff", type=float, default=0.5, help="再試行間隔の基準秒数（指数的に延長）")
+    parser.add_argument("--dry-run", action="store_true", help="送信せずに対象ファイルを表示する")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=os.environ.get("UPLOAD_COMPRESSION", "none"),
+                        help="送信時の圧縮形式（zstd は zstandard パッケージが必要）")
+    parser.add_argument("--chunk-size", type=float, default=float(os.environ.get("UPLOAD_CHUNK_SIZE_MB", DEFAULT_CHUNK_SIZE_MB)),
+                        help="これを超えるファイルは分割アップロードする（MB、0 で分割しない）")
+    args = parser.parse_args(argv)
+
+    if args.compress == "zstd" and zstandard is None:
+        print("エラー: zstd圧縮には zstandard パッケージが必要です（pip install zstandard）")
+        return 1
+
+    if not os.path.isdir(args.directory):
+        print(f"エラー: ディレクトリ {args.directory} が見つかりません")
+        return 1
+
+    base_url = (args.url or f"http://localhost:{args.port}").rstrip("/")
+    summary = sync_directory(args.directory, args.data_type, base_url, args.workers,
+                             args.retries, args.backoff, args.pattern, args.dry_run, args.compress,
+                             int(args.chunk_size * 1024 * 1024))
+    print_sync_summary(summary)
+    return 1 if summary["failed"] else 0
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        sys.exit(sync_main(sys.argv[2:]))
+
     if len(sys.argv) < 2:
         print("使用方法: python3 upload_helper.py [ファイルパス] [データタイプ(optional)] [ポート番号(optional)]")
+        print("          python3 upload_helper.py sync [ディレクトリ] [--data-type TYPE] [--workers N] [--compress gzip] [--chunk-size MB]")
         sys.exit(1)
 
     file_path = sys.argv[1]
-    data_type = sys.argv[2] if len(sys.argv) > 2 else "occupancy"
+    data_type = sys.argv[2] if len(sys.argv) > 2 else "auto"
     port = int(sys.argv[3]) if len(sys.argv) > 3 else 8000  # デフォルトポートを8000に変更
 
     upload_csv(file_path, data_type, port)
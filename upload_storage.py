@@ -0,0 +1,198 @@
+"""
+アップロードされたファイルのディスクへの書き出し
+
+ファイルは CHUNK_SIZE ずつ読み、展開（.csv.gz / .csv.zst）・SHA-256 の計算・書き込みを
+スレッドプールで行うため、大きなファイルでもメモリは一定で、イベントループも止めない。
+保存名は展開後の内容の SHA-256（{種類}_{ハッシュ}.csv）にするため、同時に届いた
+同名ファイルが上書きし合うことはなく、同じ内容は1つのファイルにまとまる。
+
+サイズの上限は環境変数で変更できる（単位はバイト、展開後のサイズで判定）。
+- SAUNA_UPLOAD_MAX_FILE_BYTES:    1ファイルあたり（既定 100MB）
+- SAUNA_UPLOAD_MAX_REQUEST_BYTES: 1リクエストあたり（既定 500MB）
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import compression
+
+MB = 1024 * 1024
+CHUNK_SIZE = 1 * MB
+MAX_FILE_BYTES = int(os.environ.get("SAUNA_UPLOAD_MAX_FILE_BYTES", 100 * MB))
+MAX_REQUEST_BYTES = int(os.environ.get("SAUNA_UPLOAD_MAX_REQUEST_BYTES", 500 * MB))
+
+
+class UploadTooLarge(Exception):
+    """アップロードがサイズの上限を超えた"""
+
+    def __init__(self, limit: int, scope: str = "ファイル"):
+        super().__init__(f"{scope}のサイズが上限（{limit / MB:.1f}MB）を超えています")
+        self.limit = limit
+
+
+class UploadBudget:
+    """1リクエスト内の複数ファイルで共有する書き込み量の上限"""
+
+    def __init__(self, limit: int = MAX_REQUEST_BYTES):
+        self.limit = limit
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self, size: int) -> None:
+        with self._lock:
+            self.used += size
+            if self.used > self.limit:
+                raise UploadTooLarge(self.limit, "リクエスト")
+
+
+def safe_name(value: str, default: str = "upload") -> str:
+    """保存名に使える文字（英数字・_・-）だけを残す"""
+    return re.sub(r"[^A-Za-z0-9_-]", "", value or "") or default
+
+
+class _ChunkWriter:
+    """展開・ハッシュ計算・書き込みを1チャンクずつ行う（スレッドプールから呼ぶ）"""
+
+    def __init__(self, directory: str, encoding: Optional[str], max_bytes: int, budget: Optional[UploadBudget]):
+        self.decompressor = compression.make_decompressor(encoding) if encoding else None
+        if encoding and self.decompressor is None:
+            raise ValueError(f"{encoding}形式の展開には zstandard パッケージが必要です")
+        self.digest = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".tmp")
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes, final: bool = False) -> None:
+        if self.decompressor is not None:
+            chunk = self.decompressor.decompress(chunk)
+            if final:
+                chunk += self.decompressor.flush()
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(self.max_bytes)
+        if self.budget is not None:
+            self.budget.consume(len(chunk))
+        self.digest.update(chunk)
+        self.file.write(chunk)
+
+    def commit(self, path: str) -> None:
+        self.file.close()
+        if os.path.exists(path):
+            # 同じ内容のファイルが保存済み
+            os.remove(self.tmp_path)
+        else:
+            os.replace(self.tmp_path, path)
+
+    def discard(self) -> None:
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+async def save_upload(file, directory: str, prefix: str = "upload", max_bytes: int = MAX_FILE_BYTES,
+                      budget: Optional[UploadBudget] = None, chunk_size: int = CHUNK_SIZE) -> Dict:
+    """
+    UploadFile をチャンクごとにディスクへ書き出し、保存結果を返す
+
+    Returns:
+        {"path", "sha256", "size"（展開後）, "received_size"（受信したまま）, "encoding"}
+    """
+    os.makedirs(directory, exist_ok=True)
+    await file.seek(0)
+    encoding = await run_in_threadpool(compression.detect_encoding, file.file, file.filename)
+    writer = await run_in_threadpool(_ChunkWriter, directory, encoding, max_bytes, budget)
+
+    received = 0
+    try:
+        while True:
+            chunk = await file.read(chunk_size)
+            received += len(chunk)
+            await run_in_threadpool(writer.write, chunk, not chunk)
+            if not chunk:
+                break
+        sha256 = writer.digest.hexdigest()
+        path = os.path.join(directory, f"{safe_name(prefix)}_{sha256}.csv")
+        await run_in_threadpool(writer.commit, path)
+    except BaseException:
+        await run_in_threadpool(writer.discard)
+        raise
+
+    return {"path": path, "sha256": sha256, "size": writer.size,
+            "received_size": received, "encoding": encoding}
+
+
+class RequestSizeLimitMiddleware:
+    """
+    リクエスト本文が上限を超えたら 413 を返すASGIミドルウェア
+
+    Content-Length があれば受信前に判定し、なければ（chunked や展開後の本文）
+    受信しながら数えて、超えた時点で読み込みを打ち切る。
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES, path_prefix: str = "/api/upload"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def _reject(self, send) -> None:
+        body = json.dumps({
+            "status": "エラー",
+            "detail": str(UploadTooLarge(self.max_bytes, "リクエスト")),
+        }, ensure_ascii=False).encode("utf-8")
+        await send({"type": "http.response.start", "status": 413,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(body)).encode())]})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def receive_limited():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge(self.max_bytes, "リクエスト")
+            return message
+
+        async def send_checked(message):
+            # 本文の解析エラーとして別のステータスで応答されそうな場合も 413 に差し替える
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                if exceeded:
+                    await self._reject(send)
+                    return
+            elif exceeded:
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive_limited, send_checked)
+        except UploadTooLarge:
+            if not started:
+                await self._reject(send)
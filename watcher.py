@@ -0,0 +1,435 @@
+"""
+データディレクトリの監視と増分再計算（ウォッチモード）
+
+data/ のCSVが追加・更新・削除されるたびに、変わったファイル（月別パーティション）だけを
+読み直し、影響を受ける分析だけを再計算してスナップショットJSONを書き出す。
+APIは GET /api/snapshot で最新のスナップショットを返す。
+
+変更検知は Linux では inotify を使い、使えない環境ではファイルの更新時刻・サイズの
+ポーリングで代替する。
+
+使用例:
+    python run_processor.py watch                       # data/ を監視
+    python run_processor.py watch --mode poll --interval 2
+    python run_processor.py watch --once                # 1回だけ作成して終了
+"""
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+import metrics
+from data_processor import SaunaDataProcessor
+from run_processor import (ANALYSIS_METHODS, ANALYSIS_STAGES, LOAD_STAGES, file_month,
+                           in_month_range, to_jsonable)
+
+SNAPSHOT_DIR = os.environ.get("SAUNA_SNAPSHOT_DIR", os.path.join("output", "snapshot"))
+SNAPSHOT_FILE = "snapshot.json"
+
+# 月別に分割されたテーブル（1ファイル = 1パーティション）
+PARTITIONED_TABLES = ["reservation", "frame", "sales"]
+
+# 保存途中のファイルを読まないよう、サイズと更新時刻が落ち着くまで待つ時間（秒）
+DEFAULT_SETTLE_SECONDS = 0.5
+DEFAULT_POLL_INTERVAL = 1.0
+
+Signature = Tuple[int, int]
+
+
+def classify_file(name: str) -> Optional[str]:
+    """ファイル名からテーブルの種類を判定する（run_processor.discover_files と同じ規則）"""
+    if not name.endswith(".csv"):
+        return None
+    if name.startswith("member"):
+        return "member_delete" if "delete" in name else "member"
+    for table in PARTITIONED_TABLES:
+        if table in name:
+            return table
+    return None
+
+
+def affected_analyses(tables: Set[str], analyses: List[str]) -> List[str]:
+    """変更されたテーブルに依存する分析ステージを返す"""
+    tables = {"member" if t == "member_delete" else t for t in tables}
+    return [a for a in analyses if tables & set(ANALYSIS_STAGES[a])]
+
+
+# ---------------------------------------------------------------------------
+# パーティション管理
+# ---------------------------------------------------------------------------
+class PartitionStore:
+    """
+    ファイル単位で前処理済みのDataFrameを保持し、変わったファイルだけを読み直す
+
+    月別テーブルは保持しているパーティションを結合し直すだけなので、
+    過去分のCSVが増えても1回の更新で解析するのは変更されたファイルだけになる。
+    """
+
+    def __init__(self, data_dir: str, processor: SaunaDataProcessor,
+                 since: Optional[str] = None, until: Optional[str] = None):
+        self.data_dir = data_dir
+        self.processor = processor
+        self.since = since
+        self.until = until
+        self.signatures: Dict[str, Signature] = {}
+        self.partitions: Dict[str, Dict[str, Optional[pd.DataFrame]]] = {t: {} for t in PARTITIONED_TABLES}
+
+    def scan(self) -> Dict[str, Signature]:
+        """監視対象のCSVと (更新時刻, サイズ) の一覧"""
+        signatures = {}
+        if not os.path.isdir(self.data_dir):
+            return signatures
+        for name in os.listdir(self.data_dir):
+            table = classify_file(name)
+            if table is None:
+                continue
+            if table in PARTITIONED_TABLES and not in_month_range(file_month(name), self.since, self.until):
+                continue
+            path = os.path.join(self.data_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            signatures[path] = (stat.st_mtime_ns, stat.st_size)
+        return signatures
+
+    def refresh(self, signatures: Optional[Dict[str, Signature]] = None) -> Dict[str, List[str]]:
+        """
+        前回から変わったファイルを読み直し、{テーブル: 変更されたファイル} を返す
+
+        削除されたファイルもそのテーブルの変更として扱う。
+        """
+        current = self.scan() if signatures is None else signatures
+        changed = [p for p, sig in current.items() if self.signatures.get(p) != sig]
+        removed = [p for p in self.signatures if p not in current]
+
+        changes: Dict[str, List[str]] = {}
+        for path in changed + removed:
+            table = classify_file(os.path.basename(path))
+            changes.setdefault(table, []).append(path)
+
+        for table in PARTITIONED_TABLES:
+            if table not in changes:
+                continue
+            partitions = self.partitions[table]
+            for path in changes[table]:
+                if path in current:
+                    partitions[path] = getattr(self.processor, f"read_{table}_partition")(path)
+                else:
+                    partitions.pop(path, None)
+            self._publish_table(table)
+
+        if "member" in changes or "member_delete" in changes:
+            self._reload_members(current)
+
+        self.signatures = current
+        return changes
+
+    def _publish_table(self, table: str) -> None:
+        """保持しているパーティションを月順に結合してプロセッサへ渡す"""
+        partitions = self.partitions[table]
+        paths = sorted(partitions, key=lambda p: file_month(os.path.basename(p)) or os.path.basename(p))
+        if any(partitions[p] is not None for p in paths):
+            getattr(self.processor, f"set_{table}_partitions")([partitions[p] for p in paths])
+        else:
+            setattr(self.processor, f"{table}_data", None)
+
+    def _reload_members(self, current: Dict[str, Signature]) -> None:
+        """会員データはパーティション分割されていないため、ファイル全体を読み直す"""
+        members = sorted(p for p in current if classify_file(os.path.basename(p)) == "member")
+        deletes = sorted(p for p in current if classify_file(os.path.basename(p)) == "member_delete")
+        if not members:
+            self.processor.member_data = None
+            self.processor.member_delete_data = None
+            return
+        self.processor.member_delete_data = None
+        self.processor.load_member_data(members[0], deletes[0] if deletes else None)
+
+    def table_summary(self) -> Dict[str, Dict]:
+        summary = {}
+        for table in LOAD_STAGES:
+            data = getattr(self.processor, f"{table}_data")
+            files = (len(self.partitions[table]) if table in self.partitions
+                     else sum(1 for p in self.signatures if classify_file(os.path.basename(p)) == table))
+            summary[table] = {"rows": 0 if data is None else len(data), "files": files}
+        return summary
+
+
+# ---------------------------------------------------------------------------
+# 変更検知
+# ---------------------------------------------------------------------------
+class InotifyWatcher:
+    """inotify でディレクトリ内のCSVの作成・書き込み完了・移動・削除を待つ（Linuxのみ）"""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    EVENT_HEADER = struct.Struct("iIII")
+
+    def __init__(self, path: str):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify はこの環境では使用できません")
+
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 に失敗しました: {os.strerror(errno)}")
+
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"{path} を監視できません: {os.strerror(errno)}")
+
+    def wait(self, timeout: float) -> bool:
+        """CSVに関するイベントがあれば True を返す"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+
+        relevant = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + self.EVENT_HEADER.size <= len(data):
+                _, _, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace")
+                offset += length
+                if name.endswith(".csv"):
+                    relevant = True
+        return relevant
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """inotify が使えない環境向け。一定間隔で起き、変更の有無は PartitionStore 側で判定する"""
+
+    def __init__(self, interval: float = DEFAULT_POLL_INTERVAL):
+        self.interval = interval
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+def create_watcher(data_dir: str, mode: str = "auto", interval: float = DEFAULT_POLL_INTERVAL):
+    """mode: auto（inotifyを試してだめならポーリング） / inotify / poll"""
+    if mode == "poll":
+        return PollingWatcher(interval)
+    try:
+        return InotifyWatcher(data_dir)
+    except (OSError, AttributeError) as e:
+        if mode == "inotify":
+            raise
+        print(f"inotify を使用できないためポーリングで監視します（{interval}秒間隔）: {e}")
+        return PollingWatcher(interval)
+
+
+# ---------------------------------------------------------------------------
+# スナップショット
+# ---------------------------------------------------------------------------
+def snapshot_path(snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(snapshot_dir, SNAPSHOT_FILE)
+
+
+def write_snapshot(snapshot: Dict, snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    """読み込み中のAPIが書きかけのファイルを見ないよう、一時ファイルに書いてから置き換える"""
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = snapshot_path(snapshot_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(to_jsonable(snapshot), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+_snapshot_cache: Dict[str, Tuple[Signature, Dict]] = {}
+
+
+def load_published_snapshot(snapshot_dir: str = SNAPSHOT_DIR) -> Optional[Dict]:
+    """公開済みのスナップショットを返す（ファイルが変わっていなければ解析済みの内容を再利用）"""
+    path = snapshot_path(snapshot_dir)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _snapshot_cache.get(path)
+    if cached and cached[0] == signature:
+        metrics.record_cache_access("snapshot", True)
+        return cached[1]
+
+    metrics.record_cache_access("snapshot", False)
+    with open(path, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    _snapshot_cache[path] = (signature, snapshot)
+    return snapshot
+
+
+class DataWatcher:
+    """データディレクトリを監視し、変更のたびにスナップショットを更新する"""
+
+    def __init__(self, data_dir: str, snapshot_dir: str = SNAPSHOT_DIR,
+                 analyses: Optional[List[str]] = None, reference_date: Optional[str] = None,
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 mode: str = "auto", interval: float = DEFAULT_POLL_INTERVAL,
+                 settle: float = DEFAULT_SETTLE_SECONDS, static_build_dir: Optional[str] = None):
+        self.data_dir = data_dir
+        self.snapshot_dir = snapshot_dir
+        self.analyses = analyses or list(ANALYSIS_STAGES)
+        # 基準日の指定がなければ日付が変わるたびに当日へ進める
+        self.fixed_reference_date = reference_date
+        self.mode = mode
+        self.interval = interval
+        self.settle = settle
+        self.static_build_dir = static_build_dir
+        self.competitors = None
+
+        self.processor = SaunaDataProcessor()
+        if reference_date:
+            self.processor.set_reference_date(reference_date)
+        self.store = PartitionStore(data_dir, self.processor, since, until)
+        self.results: Dict[str, Dict] = {}
+        self.version = self._published_version()
+
+    def _published_version(self) -> int:
+        """再起動してもバージョンが戻らないよう、公開済みのスナップショットから引き継ぐ"""
+        try:
+            with open(snapshot_path(self.snapshot_dir), encoding="utf-8") as f:
+                return int(json.load(f).get("version", 0))
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    def _advance_reference_date(self) -> bool:
+        """基準日を当日に進め、日付が変わった場合は True を返す"""
+        if self.fixed_reference_date:
+            return False
+        today = pd.Timestamp.now().normalize()
+        if self.processor.reference_date.normalize() == today:
+            return False
+        self.processor.reference_date = today
+        return True
+
+    def _stable_signatures(self) -> Dict[str, Signature]:
+        """保存中のファイルを途中で読まないよう、一覧が変わらなくなるまで待つ"""
+        signatures = self.store.scan()
+        for _ in range(20):
+            time.sleep(self.settle)
+            latest = self.store.scan()
+            if latest == signatures:
+                break
+            signatures = latest
+        return signatures
+
+    def update(self, signatures: Optional[Dict[str, Signature]] = None, force: bool = False) -> Optional[Dict]:
+        """
+        変更を取り込み、影響を受けた分析だけを再計算してスナップショットを公開する
+
+        変更がなければ None を返す。
+        """
+        started = time.perf_counter()
+        changes = self.store.refresh(signatures)
+        load_seconds = time.perf_counter() - started
+
+        if force or self._advance_reference_date():
+            stale = list(self.analyses)
+        else:
+            stale = affected_analyses(set(changes), self.analyses)
+        if not stale:
+            return None
+
+        timings = [{"stage": "load", "seconds": round(load_seconds, 4),
+                    "files": sum(len(paths) for paths in changes.values())}]
+        for stage in stale:
+            stage_started = time.perf_counter()
+            self.results[stage] = getattr(self.processor, ANALYSIS_METHODS[stage])()
+            timings.append({"stage": stage, "seconds": round(time.perf_counter() - stage_started, 4)})
+        timings.append({"stage": "total", "seconds": round(time.perf_counter() - started, 4)})
+
+        self.version += 1
+        snapshot = {
+            "version": self.version,
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "reference_date": self.processor.reference_date.isoformat(),
+            "data_dir": self.data_dir,
+            "changed_files": sorted(os.path.basename(p) for paths in changes.values() for p in paths),
+            "updated": stale,
+            "tables": self.store.table_summary(),
+            "results": {stage: self.results[stage] for stage in self.analyses if stage in self.results},
+            "timings": timings,
+        }
+        write_snapshot(snapshot, self.snapshot_dir)
+        metrics.bump_snapshot_version()
+        if self.static_build_dir:
+            self._publish_static()
+        return snapshot
+
+    def _publish_static(self) -> None:
+        """静的配信用のJSONも更新する（失敗してもスナップショットの公開は続ける）"""
+        from run_processor import load_competitors
+        from static_export import export_dashboard
+
+        if self.competitors is None:
+            self.competitors = load_competitors()
+        try:
+            export_dashboard(self.processor, self.results, self.static_build_dir, self.competitors)
+        except Exception as e:
+            print(f"警告: 静的データの書き出しに失敗しました: {e}")
+
+    def run(self, once: bool = False, max_updates: Optional[int] = None) -> None:
+        print(f"{self.data_dir} の初回読み込みを行っています...")
+        snapshot = self.update(force=True)
+        self._report(snapshot)
+        if once:
+            return
+
+        watcher = create_watcher(self.data_dir, self.mode, self.interval)
+        print(f"{self.data_dir} を監視しています（{type(watcher).__name__}）。Ctrl+C で終了します")
+        updates = 0
+        try:
+            while max_updates is None or updates < max_updates:
+                # inotify でもイベントのない日付変更は拾えるよう、一定時間ごとに起きる
+                if not watcher.wait(timeout=60.0) and self.fixed_reference_date:
+                    continue
+                signatures = self.store.scan()
+                if signatures != self.store.signatures:
+                    signatures = self._stable_signatures()
+                snapshot = self.update(signatures)
+                if snapshot is not None:
+                    updates += 1
+                    self._report(snapshot)
+        except KeyboardInterrupt:
+            print("\n監視を終了します")
+        finally:
+            watcher.close()
+
+    def _report(self, snapshot: Optional[Dict]) -> None:
+        if snapshot is None:
+            return
+        total = snapshot["timings"][-1]["seconds"]
+        files = ", ".join(snapshot["changed_files"][:5])
+        if len(snapshot["changed_files"]) > 5:
+            files += f" ほか{len(snapshot['changed_files']) - 5}件"
+        print(f"[v{snapshot['version']}] {', '.join(snapshot['updated'])} を再計算しました"
+              f"（{total:.2f}秒、変更: {files or 'なし'}）")